@@ -0,0 +1,104 @@
+"""JWT authentication without the per-request user query.
+
+simplejwt's ``JWTAuthentication`` loads the ``User`` row on every request,
+before the view runs. ``TokenUserAuthentication`` only verifies the token
+and returns a ``TokenUser``: ``id``, ``pk`` and ``is_authenticated`` come
+from the token's ``user_id`` claim, which is all most views need (viewer
+flags, ``user_stats``, ``classify_comment``). The ``accounts.User`` is loaded
+the first time anything else is touched: a model field, an ORM filter on the
+object itself, a permission like ``IsAdminUser``. Filter on ``user_id=
+request.user.id`` rather than ``user=request.user`` to stay on the fast path.
+
+Loaded users are kept per process for ``TOKEN_USER_CACHE_SECONDS``, so a
+client sending requests that do need the user pays for the query about
+once a minute rather than on every request. Saving or deleting a user
+evicts it in this process; other processes pick the change up when their
+entry expires.
+
+A deactivated or deleted user still authenticates until their access token
+expires, but anything that loads the user then fails with a 401.
+"""
+import copy
+import threading
+import time
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.utils.functional import LazyObject
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .models import User
+
+
+class UserCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is None or entry[0] <= now:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None or not user.is_active:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            with self._lock:
+                if len(self._users) >= settings.TOKEN_USER_CACHE_SIZE:
+                    # Oldest insertion first
+                    self._users.pop(next(iter(self._users)))
+                self._users[user_id] = entry = (now + settings.TOKEN_USER_CACHE_SECONDS, user)
+        # Requests get their own copy, so a view editing its user can't leak into others
+        return copy.copy(entry[1])
+
+    def evict(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
+
+
+class TokenUser(LazyObject):
+    """The authenticated ``User``, loaded on first use of anything but its id."""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id):
+        super().__init__()
+        # LazyObject forwards attribute writes to the wrapped object
+        self.__dict__['id'] = user_id
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __bool__(self):
+        # LazyObject would load the user to answer; IsAuthenticated asks on every request
+        return True
+
+    def _setup(self):
+        self._wrapped = user_cache.get(self.id)
+
+
+class TokenUserAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        return TokenUser(User._meta.pk.to_python(user_id))
+
+
+def user_changed(sender, instance, **kwargs):
+    user_cache.evict(instance.pk)
+
+
+def connect_signals():
+    post_save.connect(user_changed, sender=User, dispatch_uid='token_user_changed')
+    post_delete.connect(user_changed, sender=User, dispatch_uid='token_user_deleted')
@@ -0,0 +1,205 @@
+"""In-memory username prefix index for typeahead.
+
+Every username is kept lowercased in one sorted list, with the user id,
+display name (only when it isn't already lowercase) and follower count in
+parallel arrays. A prefix is the
+contiguous slice ``bisect_left(prefix) .. bisect_left(prefix + '\\uffff')``,
+and the best ``MAX_RESULTS`` of a slice by follower count are memoized per
+prefix, so short prefixes that cover thousands of users are answered from a
+dict after the first request. Changing a user only evicts the memo entries
+for the prefixes of its own username.
+
+The index is built from one ``values_list`` query on first use (not in
+``AppConfig.ready``, which must not touch the database) and rebuilt every
+``USERNAME_INDEX_REFRESH_SECONDS`` so workers converge on writes made by
+other processes. One request thread rebuilds at a time while the others keep
+answering from the old index; only the very first build makes them wait.
+Within a process, ``post_save``/``post_delete`` receivers
+on ``User`` and ``Follow`` apply changes once the transaction commits.
+"""
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from heapq import nlargest
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from .models import User, Follow
+
+MAX_RESULTS = 20
+# Slices up to this size are ranked on the spot; larger ones go through the memo
+SCAN_LIMIT = 256
+
+
+class UsernameIndex:
+    def __init__(self, refresh_seconds):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        # Held while building, so an expired index is rebuilt by one thread rather than by every request
+        self._build_lock = threading.Lock()
+        self._built_at = None
+        self._build_seconds = 0.0
+        self._clear()
+
+    def _clear(self):
+        self._keys = []
+        self._names = []
+        self._ids = array('q')
+        self._followers = array('q')
+        self._key_of = {}
+        self._memo = {}
+
+    def clear(self):
+        """Drop everything; the next lookup rebuilds from the database."""
+        with self._lock:
+            self._clear()
+            self._built_at = None
+
+    def build(self):
+        started = time.perf_counter()
+        rows = sorted((username.lower(), username, user_id, followers or 0) for user_id, username, followers in
+                      User.objects.values_list('id', 'username', 'userprofile__followers_count').iterator())
+        with self._lock:
+            self._clear()
+            for key, username, user_id, followers in rows:
+                self._keys.append(key)
+                self._names.append(None if username == key else username)
+                self._ids.append(user_id)
+                self._followers.append(followers)
+                self._key_of[user_id] = key
+            self._built_at = time.monotonic()
+            self._build_seconds = time.perf_counter() - started
+
+    def _ensure_built(self):
+        built_at = self._built_at
+        if built_at is not None and time.monotonic() - built_at <= self.refresh_seconds:
+            return
+        if built_at is None:
+            # Nothing to answer from yet: wait for whoever is building
+            with self._build_lock:
+                if self._built_at is None:
+                    self.build()
+        elif self._build_lock.acquire(blocking=False):
+            try:
+                # Another thread may have finished a rebuild since we looked
+                if self._built_at == built_at:
+                    self.build()
+            finally:
+                self._build_lock.release()
+
+    def complete(self, prefix, limit=10):
+        """Up to ``limit`` users whose username starts with ``prefix``, most followed first."""
+        self._ensure_built()
+        prefix = prefix.lower()
+        limit = min(limit, MAX_RESULTS)
+        with self._lock:
+            top = self._memo.get(prefix)
+            if top is None:
+                lo = bisect_left(self._keys, prefix)
+                hi = bisect_left(self._keys, prefix + '\uffff', lo)
+                top = nlargest(MAX_RESULTS, range(lo, hi), key=lambda i: (self._followers[i], -self._ids[i]))
+                top = [(self._ids[i], self._names[i] or self._keys[i], self._followers[i]) for i in top]
+                if hi - lo > SCAN_LIMIT:
+                    self._memo[prefix] = top
+            return [{'id': user_id, 'username': username, 'followers_count': followers}
+                    for user_id, username, followers in top[:limit]]
+
+    def _position(self, user_id):
+        key = self._key_of.get(user_id)
+        if key is None:
+            return None
+        i = bisect_left(self._keys, key)
+        # Usernames are unique, but "Ann" and "ann" share a key
+        while self._ids[i] != user_id:
+            i += 1
+        return i
+
+    def _evict(self, key):
+        for end in range(len(key) + 1):
+            self._memo.pop(key[:end], None)
+
+    def upsert(self, user_id, username, followers=None):
+        with self._lock:
+            if self._built_at is None:
+                return
+            i = self._position(user_id)
+            if i is not None:
+                if followers is None:
+                    followers = self._followers[i]
+                self._remove_at(i)
+            key = username.lower()
+            i = bisect_left(self._keys, key)
+            self._keys.insert(i, key)
+            self._names.insert(i, None if username == key else username)
+            self._ids.insert(i, user_id)
+            self._followers.insert(i, followers or 0)
+            self._key_of[user_id] = key
+            self._evict(key)
+
+    def remove(self, user_id):
+        with self._lock:
+            i = self._position(user_id)
+            if i is not None:
+                self._remove_at(i)
+
+    def _remove_at(self, i):
+        key = self._keys.pop(i)
+        self._key_of.pop(self._ids[i], None)
+        del self._names[i], self._ids[i], self._followers[i]
+        self._evict(key)
+
+    def adjust_followers(self, user_id, delta):
+        with self._lock:
+            i = self._position(user_id)
+            if i is not None:
+                self._followers[i] = max(self._followers[i] + delta, 0)
+                self._evict(self._keys[i])
+
+    def metrics(self):
+        with self._lock:
+            # Approximate: the arrays store ints inline, the id objects keying _key_of aren't counted
+            strings = sum(map(sys.getsizeof, self._keys)) + sum(sys.getsizeof(name) for name in self._names if name)
+            containers = sum(sys.getsizeof(c) for c in (self._keys, self._names, self._ids, self._followers))
+            lookup = sys.getsizeof(self._key_of)
+            memo = sys.getsizeof(self._memo) + sum(
+                sys.getsizeof(top) + sum(map(sys.getsizeof, top)) for top in self._memo.values())
+            return {
+                'users': len(self._keys),
+                'memoized_prefixes': len(self._memo),
+                'memory_bytes': strings + containers + lookup + memo,
+                'build_seconds': round(self._build_seconds, 4),
+                'age_seconds': round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None,
+            }
+
+
+username_index = UsernameIndex(settings.USERNAME_INDEX_REFRESH_SECONDS)
+
+
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    transaction.on_commit(lambda: username_index.upsert(instance.pk, instance.username))
+
+
+def user_deleted(sender, instance, **kwargs):
+    # instance.pk is cleared once the delete finishes
+    user_id = instance.pk
+    transaction.on_commit(lambda: username_index.remove(user_id))
+
+
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: username_index.adjust_followers(instance.followee_id, 1))
+
+
+def follow_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: username_index.adjust_followers(instance.followee_id, -1))
+
+
+def connect_signals():
+    post_save.connect(user_saved, sender=User, dispatch_uid='autocomplete_user')
+    post_delete.connect(user_deleted, sender=User, dispatch_uid='autocomplete_user')
+    post_save.connect(follow_saved, sender=Follow, dispatch_uid='autocomplete_follow')
+    post_delete.connect(follow_deleted, sender=Follow, dispatch_uid='autocomplete_follow')
@@ -0,0 +1,25 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+class CounterFieldsMixin:
+    """Keeps denormalized counters out of regular ``save()`` calls.
+
+    Counters are only ever changed with ``adjust_counter`` (a single atomic
+    ``UPDATE``), so writing back a stale in-memory value on an unrelated
+    save would undo concurrent increments.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def adjust_counter(model, pk, field, delta):
+    """Atomically add ``delta`` to ``field`` on the ``model`` row with primary key ``pk``."""
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    Follow = UserProfile.followers.through
+
+    def count(fk, outer):
+        rows = (Follow.objects.filter(**{fk: OuterRef(outer)})
+                .order_by().values(fk).annotate(total=Count('pk')).values('total'))
+        return Coalesce(Subquery(rows), 0)
+
+    UserProfile.objects.using(schema_editor.connection.alias).update(
+        followers_count=count('userprofile', 'pk'), following_count=count('user', 'user_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
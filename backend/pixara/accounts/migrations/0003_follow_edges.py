@@ -0,0 +1,80 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def copy_follows(apps, schema_editor):
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    Follow = apps.get_model('accounts', 'Follow')
+    db = schema_editor.connection.alias
+    # The old table has no timestamp: every edge gets "now", and copying in
+    # id order keeps the (created_at, id) ordering equal to follow order
+    edges = (UserProfile.followers.through.objects.using(db)
+             .exclude(user_id=F('userprofile__user_id'))
+             .order_by('id')
+             .values_list('user_id', 'userprofile__user_id'))
+    batch = []
+    for follower_id, followee_id in edges.iterator(chunk_size=10000):
+        batch.append(Follow(follower_id=follower_id, followee_id=followee_id))
+        if len(batch) == 10000:
+            Follow.objects.using(db).bulk_create(batch)
+            batch = []
+    Follow.objects.using(db).bulk_create(batch)
+
+    # 0002 counted self-follows, which weren't copied: recount those users from their edges
+    self_followers = (UserProfile.followers.through.objects.using(db)
+                      .filter(user_id=F('userprofile__user_id'))
+                      .values_list('user_id', flat=True))
+
+    def count(fk):
+        rows = (Follow.objects.using(db).filter(**{fk: OuterRef('user_id')})
+                .order_by().values(fk).annotate(total=Count('pk')).values('total'))
+        return Coalesce(Subquery(rows), 0)
+
+    UserProfile.objects.using(db).filter(user_id__in=list(self_followers)).update(
+        followers_count=count('followee'), following_count=count('follower'))
+
+
+def copy_follows_back(apps, schema_editor):
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    Follow = apps.get_model('accounts', 'Follow')
+    Through = UserProfile.followers.through
+    db = schema_editor.connection.alias
+    profile_ids = dict(UserProfile.objects.using(db).values_list('user_id', 'id'))
+    Through.objects.using(db).bulk_create(
+        [Through(userprofile_id=profile_ids[followee_id], user_id=follower_id)
+         for follower_id, followee_id in Follow.objects.using(db).order_by('created_at', 'id')
+         .values_list('follower_id', 'followee_id') if followee_id in profile_ids],
+        batch_size=10000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_profile_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('followee', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower_edges', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='following_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['follower', '-created_at', '-id'], name='follow_follower_created_idx'), models.Index(fields=['followee', '-created_at', '-id'], name='follow_followee_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('follower', 'followee'), name='follow_unique_edge'), models.CheckConstraint(condition=models.Q(('follower', models.F('followee')), _negated=True), name='follow_not_self')],
+            },
+        ),
+        migrations.RunPython(copy_follows, copy_follows_back),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='followers',
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from .counters import CounterFieldsMixin
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
@@ -7,25 +8,48 @@ class User(AbstractUser):
     location = models.CharField(max_length=100, blank=True)
     interests = models.CharField(max_length=200, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    # Resized copies of profile_picture, filled in by posts/images.py
+    profile_picture_variants = models.JSONField(default=dict, blank=True)
     date_joined = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.username
 
 
-class UserProfile(models.Model):
+class UserProfile(CounterFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='userprofile')  # 🔁 changed from 'profile' to 'userprofile'
-    followers = models.ManyToManyField(User, related_name='following', blank=True)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    counter_fields = ('followers_count', 'following_count')
+
     def __str__(self):
         return f"{self.user.username}'s profile"
 
-    @property
-    def followers_count(self):
-        return self.followers.count()
 
-    @property
-    def following_count(self):
-        return self.user.following.count()
+class Follow(models.Model):
+    """A follower -> followee edge of the social graph.
+
+    Both directions have a ``(user, created_at, id)`` index, so "who follows
+    X" and "who does X follow", newest first, are range scans that never
+    touch ``UserProfile``. The composite indexes lead with the foreign keys,
+    so the default single-column FK indexes would only add write cost.
+    """
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following_edges', db_index=False)
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follower_edges', db_index=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='follow_unique_edge'),
+            models.CheckConstraint(condition=~models.Q(follower=models.F('followee')), name='follow_not_self'),
+        ]
+        indexes = [
+            models.Index(fields=['follower', '-created_at', '-id'], name='follow_follower_created_idx'),
+            models.Index(fields=['followee', '-created_at', '-id'], name='follow_followee_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} follows {self.followee_id}"
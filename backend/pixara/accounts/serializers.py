@@ -1,22 +1,29 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, UserProfile
+from posts.images import variant_urls
+from .models import User, UserProfile, Follow
 
 class UserSerializer(serializers.ModelSerializer):
     is_following = serializers.SerializerMethodField()
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = (
             'id', 'username', 'email', 'bio', 'location',
-            'interests', 'profile_picture', 'date_joined', 'is_following'
+            'interests', 'profile_picture', 'profile_picture_variants', 'date_joined', 'is_following'
         )
         read_only_fields = ('id', 'date_joined')
 
+    def get_profile_picture_variants(self, obj):
+        return variant_urls(obj.profile_picture_variants, obj.profile_picture.storage, self.context.get('request'))
+
     def get_is_following(self, obj):
+        if 'following_user_ids' in self.context:
+            return obj.id in self.context['following_user_ids']
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return UserProfile.objects.filter(user=obj, followers=request.user).exists()
+            return Follow.objects.filter(follower_id=request.user.id, followee=obj).exists()
         return False
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -65,11 +72,8 @@ class UserLoginSerializer(serializers.Serializer):
         return data
 
 class UserProfileSerializer(serializers.ModelSerializer):
-    followers_count = serializers.ReadOnlyField()
-    following_count = serializers.ReadOnlyField()
-
     class Meta:
         model = UserProfile
         fields = ('followers_count', 'following_count', 'created_at', 'updated_at')
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('followers_count', 'following_count', 'created_at', 'updated_at')
 
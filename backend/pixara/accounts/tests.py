@@ -1,3 +1,253 @@
-from django.test import TestCase
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import TokenUserAuthentication, user_cache
+from .autocomplete import UsernameIndex, username_index, SCAN_LIMIT
+from .models import User, UserProfile, Follow
 
-# Create your tests here.
+
+def make_user(username):
+    user = User.objects.create(username=username, email=f'{username}@example.com')
+    UserProfile.objects.get_or_create(user=user)
+    return user
+
+
+class FollowListTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer')
+        self.star = make_user('star')
+        self.fans = [make_user(f'fan{i}') for i in range(5)]
+        for fan in self.fans:
+            Follow.objects.create(follower=fan, followee=self.star)
+            Follow.objects.create(follower=self.star, followee=fan)
+        # The viewer follows two of the fans
+        for fan in self.fans[:2]:
+            Follow.objects.create(follower=self.viewer, followee=fan)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def fetch_all(self, url):
+        names, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            names += [user['username'] for user in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return names, pages
+
+    def test_followers_newest_first_across_pages(self):
+        names, pages = self.fetch_all(reverse('get_followers', args=[self.star.id]) + '?page_size=2')
+        self.assertEqual(names, [f'fan{i}' for i in reversed(range(5))])
+        self.assertEqual(pages, 3)
+
+    def test_following(self):
+        names, _ = self.fetch_all(reverse('get_following', args=[self.star.id]))
+        self.assertEqual(names, [f'fan{i}' for i in reversed(range(5))])
+
+    def test_query_count_is_independent_of_page_size(self):
+        for url_name in ('get_followers', 'get_following'):
+            url = reverse(url_name, args=[self.star.id])
+            # target lookup, page with users joined, viewer's following set
+            with self.assertNumQueries(3):
+                small = self.client.get(url + '?page_size=1')
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(len(small.data['results']), 1)
+            flags = {user['username']: user['is_following'] for user in response.data['results']}
+            self.assertEqual(flags, {'fan0': True, 'fan1': True, 'fan2': False, 'fan3': False, 'fan4': False})
+
+    def test_unknown_user(self):
+        self.assertEqual(self.client.get(reverse('get_followers', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('get_following', args=[999])).status_code, 404)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer')
+        for username, followers in [('anna', 5), ('Annabel', 50), ('annette', 0), ('bob', 100)]:
+            user = make_user(username)
+            UserProfile.objects.filter(user=user).update(followers_count=followers)
+        username_index.clear()
+        self.addCleanup(username_index.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def complete(self, q, **params):
+        response = self.client.get(reverse('autocomplete_users'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [user['username'] for user in response.data]
+
+    def test_prefix_ranked_by_followers(self):
+        self.assertEqual(self.complete('ANN'), ['Annabel', 'anna', 'annette'])
+        self.assertEqual(self.complete('@anne'), ['annette'])
+        self.assertEqual(self.complete('ann', limit=1), ['Annabel'])
+        self.assertEqual(self.complete('z'), [])
+        self.assertEqual(self.complete(''), [])
+
+    def test_answered_without_queries(self):
+        self.complete('a')
+        with self.assertNumQueries(0):
+            username_index.complete('an')
+
+    def test_follows_renames_and_deletes(self):
+        self.complete('a')
+        annette = User.objects.get(username='annette')
+        with self.captureOnCommitCallbacks(execute=True):
+            for fan in [make_user(f'fan{i}') for i in range(6)]:
+                Follow.objects.create(follower=fan, followee=annette)
+        self.assertEqual(self.complete('ann'), ['Annabel', 'annette', 'anna'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            annette.username = 'nettie'
+            annette.save()
+        self.assertEqual(self.complete('ann'), ['Annabel', 'anna'])
+        self.assertEqual(self.complete('net'), ['nettie'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(username='Annabel').delete()
+        self.assertEqual(self.complete('ann'), ['anna'])
+
+    def test_memoized_prefixes_are_evicted(self):
+        users = User.objects.bulk_create([User(username=f'crowd{i:04d}', email=f'crowd{i}@example.com') for i in range(SCAN_LIMIT + 1)])
+        self.assertEqual(self.complete('crowd', limit=1), ['crowd0000'])
+        self.assertEqual(username_index.metrics()['memoized_prefixes'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.viewer, followee=users[-1])
+        self.assertEqual(self.complete('crowd', limit=1), [users[-1].username])
+
+    def test_metrics(self):
+        self.complete('a')
+        self.assertEqual(self.client.get(reverse('autocomplete_metrics')).status_code, 403)
+        self.viewer.is_staff = True
+        self.viewer.save()
+        metrics = self.client.get(reverse('autocomplete_metrics')).data
+        self.assertEqual(metrics['users'], 5)
+        self.assertGreater(metrics['memory_bytes'], 0)
+
+    def test_expired_index_is_rebuilt_by_one_thread(self):
+        index = UsernameIndex(refresh_seconds=300)
+        index.build()
+        index._built_at -= 301
+        builds, building, release = [], threading.Event(), threading.Event()
+
+        def slow_build():
+            builds.append(threading.current_thread())
+            building.set()
+            release.wait(5)
+            index._built_at = time.monotonic()
+
+        index.build = slow_build
+        first = threading.Thread(target=index.complete, args=('ann',))
+        first.start()
+        self.assertTrue(building.wait(5))
+        # Answered from the old index while the first thread is still building
+        self.assertEqual([user['username'] for user in index.complete('ann')], ['Annabel', 'anna', 'annette'])
+        release.set()
+        first.join(5)
+        self.assertEqual(builds, [first])
+
+
+class TokenUserAuthenticationTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+        user_cache.clear()
+        self.user = make_user('alice')
+        self.auth = f'Bearer {AccessToken.for_user(self.user)}'
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth)
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=self.auth)
+        user, _ = TokenUserAuthentication().authenticate(request)
+        return user
+
+    def test_authentication_does_not_query(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual((user.id, user.pk), (self.user.id, self.user.id))
+            self.assertTrue(user.is_authenticated)
+
+    def test_user_is_loaded_on_first_use_and_cached(self):
+        user = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, 'alice')
+            self.assertEqual(user.email, 'alice@example.com')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate().username, 'alice')
+
+    def test_saving_the_user_evicts_it(self):
+        self.authenticate().username
+        self.user.bio = 'hello'
+        self.user.save()
+        self.assertEqual(self.authenticate().bio, 'hello')
+
+    def test_views_that_only_need_the_id_skip_the_user(self):
+        # user_cache was cleared in setUp; only the counters are read
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('user-stats', args=[self.user.id]))
+        self.assertEqual([q['sql'] for q in queries if 'FROM "accounts_user"' in q['sql']], [])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('user-stats', args=[self.user.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'followers': 0, 'following': 0})
+
+    def test_views_that_need_the_user_load_it(self):
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.data['username'], 'alice')
+        response = self.client.put(reverse('profile'), {'bio': 'hello'})
+        self.assertEqual(response.data['bio'], 'hello')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bio, 'hello')
+
+    def test_deactivated_user_is_rejected_once_loaded(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate().username
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+
+class FollowMigrationTests(TransactionTestCase):
+    before = [('accounts', '0002_profile_counters')]
+    after = [('accounts', '0003_follow_edges')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_m2m_rows_become_follow_edges(self):
+        apps = self.migrate(self.before)
+        OldUser = apps.get_model('accounts', 'User')
+        OldProfile = apps.get_model('accounts', 'UserProfile')
+        alice, bob, carol = (OldUser.objects.create(username=name, email=f'{name}@example.com')
+                             for name in ('alice', 'bob', 'carol'))
+        profiles = {user.id: OldProfile.objects.create(user=user) for user in (alice, bob, carol)}
+        profiles[bob.id].followers.add(alice)
+        profiles[carol.id].followers.add(alice, bob)
+        # Self-follows aren't copied, but 0002 counted them
+        profiles[bob.id].followers.add(bob)
+        for user_id, (followers, following) in {alice.id: (0, 2), bob.id: (2, 2), carol.id: (2, 0)}.items():
+            OldProfile.objects.filter(user_id=user_id).update(followers_count=followers, following_count=following)
+
+        apps = self.migrate(self.after)
+        NewFollow = apps.get_model('accounts', 'Follow')
+        NewProfile = apps.get_model('accounts', 'UserProfile')
+        edges = list(NewFollow.objects.order_by('created_at', 'id').values_list('follower_id', 'followee_id'))
+        self.assertEqual(edges, [(alice.id, bob.id), (alice.id, carol.id), (bob.id, carol.id)])
+        counters = {user_id: (followers, following) for user_id, followers, following in
+                    NewProfile.objects.values_list('user_id', 'followers_count', 'following_count')}
+        self.assertEqual(counters, {alice.id: (0, 2), bob.id: (1, 1), carol.id: (2, 0)})
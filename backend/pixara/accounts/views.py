@@ -1,17 +1,25 @@
+import asyncio
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.db import transaction
 from django.contrib.auth import authenticate
 from django.views.decorators.csrf import csrf_exempt
-from .models import User, UserProfile
+from .models import User, UserProfile, Follow
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer,
     UserLoginSerializer,
-    UserProfileSerializer
 )
 from accounts.models import UserProfile
+from .autocomplete import username_index
+from .counters import adjust_counter
+from posts.async_api import async_api_view
+from posts.fast_serializers import FOLLOW_COLUMNS, follow_rows, serialize_users
+from posts.fragments import acached_user_card, acached_user_counters, cached_user_id
+from posts.pagination import FollowPagination
+from posts.timeline import on_follow, on_unfollow
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -60,22 +68,17 @@ def profile(request):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['GET'])
+@async_api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-def user_profile(request, user_id):
-    try:
-        user = User.objects.get(id=user_id)
-        profile, _ = UserProfile.objects.get_or_create(user=user)
-        user_data = UserSerializer(user).data
-        profile_data = UserProfileSerializer(profile).data
-        profile_data['followers_count'] = profile.followers.count()
-        profile_data['following_count'] = UserProfile.objects.filter(followers=user).count()
-        return Response({
-            'user': user_data,
-            'profile': profile_data
-        })
-    except User.DoesNotExist:
+async def user_profile(request, user_id):
+    # Served from cached fragments; only is_following is looked up per viewer
+    user_data, profile = await asyncio.gather(acached_user_card(request, user_id), acached_user_counters(user_id))
+    if user_data is None:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'user': user_data,
+        'profile': profile
+    })
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -85,77 +88,101 @@ def follow_user(request, user_id):
         user_to_follow = User.objects.get(id=user_id)
 
         # Prevent self-follow
-        if request.user == user_to_follow:
+        if request.user.id == user_to_follow.id:
             return Response({'error': 'You cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Get or create profiles
         profile_to_follow, _ = UserProfile.objects.get_or_create(user=user_to_follow)
-        current_user_profile, _ = UserProfile.objects.get_or_create(user=request.user)
-
-        # Toggle follow/unfollow
-        if profile_to_follow.followers.filter(id=request.user.id).exists():
-            profile_to_follow.followers.remove(request.user)
-            profile_to_follow.save()
-            return Response({'message': 'Unfollowed successfully'})
-        else:
-            profile_to_follow.followers.add(request.user)
-            profile_to_follow.save()
+        current_user_profile, _ = UserProfile.objects.get_or_create(user_id=request.user.id)
+
+        # Toggle follow/unfollow on the edge table so the counters only
+        # move when a row was actually inserted or deleted
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower_id=request.user.id, followee=user_to_follow).delete()
+            if deleted:
+                adjust_counter(UserProfile, profile_to_follow.pk, 'followers_count', -1)
+                adjust_counter(UserProfile, current_user_profile.pk, 'following_count', -1)
+                on_unfollow(request.user.id, user_to_follow.id)
+                return Response({'message': 'Unfollowed successfully'})
+
+            _, created = Follow.objects.get_or_create(follower_id=request.user.id, followee=user_to_follow)
+            if created:
+                adjust_counter(UserProfile, profile_to_follow.pk, 'followers_count', 1)
+                adjust_counter(UserProfile, current_user_profile.pk, 'following_count', 1)
+                on_follow(request.user.id, profile_to_follow)
             return Response({'message': 'Followed successfully'})
 
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
+def _follow_page(request, edges, user_field):
+    """One page of follow rows serialized as users, newest follow first.
+
+    The rows carry the ``user_field`` side's columns, and the viewer's
+    ``is_following`` flags come from one set lookup for the whole page.
+    """
+    paginator = FollowPagination()
+    page = paginator.paginate_queryset(follow_rows(edges, user_field), request)
+    return paginator.get_paginated_response(
+        serialize_users(page, {'request': request}, start=len(FOLLOW_COLUMNS)))
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_followers(request, user_id):
-    try:
-        user = User.objects.get(id=user_id)
-        profile = UserProfile.objects.get(user=user)
-        followers = profile.followers.all()
-        return Response({'followers': UserSerializer(followers, many=True).data})
-    except User.DoesNotExist:
+    if not User.objects.filter(id=user_id).exists():
         return Response({'error': 'User not found'}, status=404)
+    return _follow_page(request, Follow.objects.filter(followee_id=user_id), 'follower')
     
 
     
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def resolve_user_id(request, username):
-    try:
-        user = User.objects.get(username=username)
-        return Response({'id': user.id})
-    except User.DoesNotExist:
+    user_id = cached_user_id(username)
+    if user_id is None:
         return Response({'error': 'User not found'}, status=404)
-
-
+    return Response({'id': user_id})
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-def get_following(request, user_id):
+def autocomplete_users(request):
+    """Typeahead: the most followed users whose username starts with ``q``."""
+    prefix = request.query_params.get('q', '').strip().lstrip('@')
+    if not prefix:
+        return Response([])
     try:
-        user = User.objects.get(id=user_id)
-        following_profiles = UserProfile.objects.filter(followers=user)
-        following_users = [p.user for p in following_profiles]
-        return Response({'following': UserSerializer(following_users, many=True).data})
-    except User.DoesNotExist:
-        return Response({'error': 'User not found'}, status=404)
+        limit = max(int(request.query_params.get('limit', 10)), 1)
+    except ValueError:
+        limit = 10
+    return Response(username_index.complete(prefix, limit))
+
 
 @api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def user_stats(request, user_id):
-    try:
-        user = User.objects.get(pk=user_id)
-        profile, _ = UserProfile.objects.get_or_create(user=user)
+@permission_classes([permissions.IsAdminUser])
+def autocomplete_metrics(request):
+    return Response(username_index.metrics())
 
-        followers_count = profile.followers.count()
-        following_count = UserProfile.objects.filter(followers=user).count()
 
-        return Response({
-            'followers': followers_count,
-            'following': following_count
-        })
 
-    except User.DoesNotExist:
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_following(request, user_id):
+    if not User.objects.filter(id=user_id).exists():
+        return Response({'error': 'User not found'}, status=404)
+    return _follow_page(request, Follow.objects.filter(follower_id=user_id), 'followee')
+
+@async_api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+async def user_stats(request, user_id):
+    counters = await acached_user_counters(user_id)
+    if counters is None:
         return Response({'detail': 'User not found'}, status=404)
 
+    return Response({
+        'followers': counters['followers_count'],
+        'following': counters['following_count']
+    })
+
@@ -0,0 +1,15 @@
+from django.contrib import admin
+from .models import EndpointStat, SlowRequest
+
+@admin.register(EndpointStat)
+class EndpointStatAdmin(admin.ModelAdmin):
+    list_display = ['view_name', 'window_start', 'window_end', 'requests', 'queries_max']
+    list_filter = ['view_name']
+    readonly_fields = [field.name for field in EndpointStat._meta.fields]
+
+@admin.register(SlowRequest)
+class SlowRequestAdmin(admin.ModelAdmin):
+    list_display = ['method', 'path', 'view_name', 'wall_ms', 'db_ms', 'query_count', 'created_at']
+    list_filter = ['view_name', 'method']
+    search_fields = ['path']
+    readonly_fields = [field.name for field in SlowRequest._meta.fields]
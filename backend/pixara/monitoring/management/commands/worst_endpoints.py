@@ -0,0 +1,70 @@
+import json
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from monitoring.models import EndpointStat
+from monitoring.profiling import Histogram
+
+SORT_KEYS = {
+    'p50': lambda r: r['p50_ms'],
+    'p95': lambda r: r['p95_ms'],
+    'p99': lambda r: r['p99_ms'],
+    'total': lambda r: r['total_ms'],
+    'queries': lambda r: r['avg_queries'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Print the slowest endpoints from flushed request profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help='How far back to look')
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='p95')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        merged = {}
+        for stat in EndpointStat.objects.filter(window_end__gte=since).iterator():
+            entry = merged.setdefault(stat.view_name, {
+                'requests': 0, 'wall_ms_total': 0.0, 'db_ms_total': 0.0,
+                'queries_total': 0, 'queries_max': 0, 'wall': Histogram(), 'db': Histogram(),
+            })
+            entry['requests'] += stat.requests
+            entry['wall_ms_total'] += stat.wall_ms_total
+            entry['db_ms_total'] += stat.db_ms_total
+            entry['queries_total'] += stat.queries_total
+            entry['queries_max'] = max(entry['queries_max'], stat.queries_max)
+            entry['wall'].merge(Histogram(stat.wall_histogram))
+            entry['db'].merge(Histogram(stat.db_histogram))
+
+        rows = [{
+            'view': view_name,
+            'requests': e['requests'],
+            'p50_ms': e['wall'].percentile(50),
+            'p95_ms': e['wall'].percentile(95),
+            'p99_ms': e['wall'].percentile(99),
+            'total_ms': e['wall_ms_total'],
+            'db_p95_ms': e['db'].percentile(95),
+            'db_share': e['db_ms_total'] / e['wall_ms_total'] if e['wall_ms_total'] else 0.0,
+            'avg_queries': e['queries_total'] / e['requests'],
+            'max_queries': e['queries_max'],
+        } for view_name, e in merged.items()]
+        rows.sort(key=SORT_KEYS[options['sort']], reverse=True)
+        rows = rows[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        if not rows:
+            self.stdout.write('No request profiles recorded in that window')
+            return
+
+        self.stdout.write(f"{'view':<28} {'reqs':>7} {'p50':>8} {'p95':>8} {'p99':>8} "
+                          f"{'db p95':>8} {'db %':>5} {'avg q':>6} {'max q':>6}")
+        for r in rows:
+            self.stdout.write(
+                f"{r['view']:<28} {r['requests']:>7} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+                f"{r['p99_ms']:>8.1f} {r['db_p95_ms']:>8.1f} {r['db_share'] * 100:>5.0f} "
+                f"{r['avg_queries']:>6.1f} {r['max_queries']:>6}")
@@ -0,0 +1,61 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from .profiling import QueryTracker, recorder
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilingMiddleware:
+    """Records wall time, DB time and query count per view.
+
+    Goes first in MIDDLEWARE so the numbers cover the whole stack. With
+    ``PROFILING_SAMPLE_RATE`` > 0 a fraction of requests also capture their
+    SQL, and those slower than ``PROFILING_OUTLIER_MS`` are stored as
+    ``SlowRequest`` rows.
+    """
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.outlier_ms = settings.PROFILING_OUTLIER_MS
+        self.flush_seconds = settings.PROFILING_FLUSH_SECONDS
+        self.flush_to = settings.PROFILING_FLUSH_TO
+
+    def __call__(self, request):
+        capture = self.sample_rate > 0 and random.random() < self.sample_rate
+        tracker = QueryTracker(capture)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(tracker))
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        recorder.record(view_name, wall_ms, tracker.seconds * 1000, tracker.count)
+
+        if capture and wall_ms >= self.outlier_ms:
+            self.save_outlier(request, view_name, wall_ms, tracker)
+        if recorder.due(self.flush_seconds):
+            try:
+                recorder.flush(self.flush_to)
+            except Exception:
+                logger.exception('Could not flush request profiles')
+        return response
+
+    def save_outlier(self, request, view_name, wall_ms, tracker):
+        from .models import SlowRequest
+        try:
+            SlowRequest.objects.create(
+                view_name=view_name, method=request.method, path=request.path[:500],
+                wall_ms=wall_ms, db_ms=tracker.seconds * 1000,
+                query_count=tracker.count, queries=tracker.queries)
+        except Exception:
+            logger.exception('Could not store slow request sample')
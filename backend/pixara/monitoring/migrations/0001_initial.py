@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(max_length=200)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('wall_ms', models.FloatField()),
+                ('db_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField()),
+                ('queries', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EndpointStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(max_length=200)),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('requests', models.PositiveIntegerField()),
+                ('wall_ms_total', models.FloatField()),
+                ('db_ms_total', models.FloatField()),
+                ('queries_total', models.PositiveIntegerField()),
+                ('queries_max', models.PositiveIntegerField()),
+                ('wall_histogram', models.JSONField()),
+                ('db_histogram', models.JSONField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window_end', 'view_name'], name='endpointstat_window_idx')],
+            },
+        ),
+    ]
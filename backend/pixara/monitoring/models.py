@@ -0,0 +1,40 @@
+from django.db import models
+
+
+class EndpointStat(models.Model):
+    """Aggregated timings for one view over one flush window."""
+    view_name = models.CharField(max_length=200)
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    requests = models.PositiveIntegerField()
+    wall_ms_total = models.FloatField()
+    db_ms_total = models.FloatField()
+    queries_total = models.PositiveIntegerField()
+    queries_max = models.PositiveIntegerField()
+    # Bucket counts (see monitoring.profiling.Histogram), so windows can be merged exactly
+    wall_histogram = models.JSONField()
+    db_histogram = models.JSONField()
+
+    class Meta:
+        indexes = [models.Index(fields=['window_end', 'view_name'], name='endpointstat_window_idx')]
+
+    def __str__(self):
+        return f"{self.view_name} @ {self.window_start}"
+
+
+class SlowRequest(models.Model):
+    """Full query capture for a sampled request that crossed PROFILING_OUTLIER_MS."""
+    view_name = models.CharField(max_length=200)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    wall_ms = models.FloatField()
+    db_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    queries = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.wall_ms:.0f} ms)"
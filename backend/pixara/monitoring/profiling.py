@@ -0,0 +1,145 @@
+"""In-process request timing histograms.
+
+Every request adds its wall time, DB time and query count to a per-view
+entry in ``recorder``. Timings go into fixed log-scale histograms, so
+recording is a ``bisect`` and an increment, percentiles are read straight
+off the bucket counts, and windows flushed at different times can be merged
+exactly. ``Recorder.flush`` writes one ``EndpointStat`` row per view (or one
+JSON line per view when ``PROFILING_FLUSH_TO`` is a file path) and starts a
+new window.
+"""
+import bisect
+import json
+import threading
+import time
+from django.utils import timezone
+
+
+class Histogram:
+    # Bucket upper bounds in ms: 0.1 ms to ~2 minutes, each 25% wider than the last
+    BOUNDS = tuple(0.1 * 1.25 ** i for i in range(64))
+
+    def __init__(self, counts=None):
+        self.counts = list(counts) if counts else [0] * (len(self.BOUNDS) + 1)
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    @property
+    def total(self):
+        return sum(self.counts)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the ``q``-th percentile (accurate to one bucket)."""
+        total = self.total
+        if not total:
+            return 0.0
+        rank = q / 100 * total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.BOUNDS[index] if index < len(self.BOUNDS) else float('inf')
+        return self.BOUNDS[-1]
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.wall_ms_total = 0.0
+        self.db_ms_total = 0.0
+        self.queries_total = 0
+        self.queries_max = 0
+        self.wall = Histogram()
+        self.db = Histogram()
+
+    def add(self, wall_ms, db_ms, queries):
+        self.requests += 1
+        self.wall_ms_total += wall_ms
+        self.db_ms_total += db_ms
+        self.queries_total += queries
+        self.queries_max = max(self.queries_max, queries)
+        self.wall.add(wall_ms)
+        self.db.add(db_ms)
+
+
+class QueryTracker:
+    """``connection.execute_wrapper`` that counts and times queries.
+
+    With ``capture`` the SQL of every query is kept as well; that is the
+    expensive part, so it is only switched on for sampled requests.
+    """
+    def __init__(self, capture=False):
+        self.capture = capture
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if self.capture:
+                self.queries.append({'sql': sql, 'ms': round(elapsed * 1000, 3)})
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._window_start = timezone.now()
+        self._last_flush = time.monotonic()
+
+    def record(self, view_name, wall_ms, db_ms, queries):
+        with self._lock:
+            stats = self._stats.get(view_name)
+            if stats is None:
+                stats = self._stats[view_name] = ViewStats()
+            stats.add(wall_ms, db_ms, queries)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def due(self, interval):
+        return time.monotonic() - self._last_flush >= interval
+
+    def flush(self, target='db'):
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            window_start, self._window_start = self._window_start, timezone.now()
+            self._last_flush = time.monotonic()
+        if not stats:
+            return 0
+
+        rows = [{
+            'view_name': view_name,
+            'window_start': window_start,
+            'window_end': self._window_start,
+            'requests': s.requests,
+            'wall_ms_total': s.wall_ms_total,
+            'db_ms_total': s.db_ms_total,
+            'queries_total': s.queries_total,
+            'queries_max': s.queries_max,
+            'wall_histogram': s.wall.counts,
+            'db_histogram': s.db.counts,
+        } for view_name, s in stats.items()]
+
+        if target == 'db':
+            from .models import EndpointStat
+            EndpointStat.objects.bulk_create([EndpointStat(**row) for row in rows])
+        else:
+            with open(target, 'a') as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=str) + '\n')
+        return len(rows)
+
+
+recorder = Recorder()
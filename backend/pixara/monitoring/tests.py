@@ -0,0 +1,67 @@
+import json
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from accounts.models import User
+from posts.models import Post
+from .models import EndpointStat, SlowRequest
+from .profiling import Histogram, recorder
+
+
+class HistogramTests(TestCase):
+    def test_percentiles_are_within_one_bucket(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.add(value)
+        self.assertAlmostEqual(histogram.percentile(50), 50, delta=50 * 0.25)
+        self.assertAlmostEqual(histogram.percentile(99), 99, delta=99 * 0.25)
+
+    def test_merge(self):
+        a, b = Histogram(), Histogram()
+        a.add(1)
+        b.add(1000)
+        a.merge(b)
+        self.assertEqual(a.total, 2)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_FLUSH_SECONDS=3600)
+class QueryProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        recorder.flush('db')
+        EndpointStat.objects.all().delete()
+        self.user = User.objects.create(username='alice', email='alice@example.com')
+        Post.objects.create(user=self.user, caption='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_requests_are_recorded_per_view(self):
+        for _ in range(3):
+            self.client.get(reverse('posts'))
+        stats = recorder.snapshot()['posts']
+        self.assertEqual(stats.requests, 3)
+        self.assertGreater(stats.queries_total, 0)
+        self.assertGreater(stats.wall_ms_total, 0)
+
+    def test_flush_and_report(self):
+        self.client.get(reverse('posts'))
+        self.client.get(reverse('explore_posts'))
+        self.assertEqual(recorder.flush('db'), 2)
+        self.assertEqual(recorder.snapshot(), {})
+
+        out = StringIO()
+        call_command('worst_endpoints', '--json', stdout=out)
+        rows = {row['view']: row for row in json.loads(out.getvalue())}
+        self.assertEqual(set(rows), {'posts', 'explore_posts'})
+        self.assertEqual(rows['posts']['requests'], 1)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_OUTLIER_MS=0)
+    def test_sampled_outliers_keep_their_queries(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse('posts'))
+        sample = SlowRequest.objects.get()
+        self.assertEqual(sample.view_name, 'posts')
+        self.assertEqual(len(sample.queries), sample.query_count)
+        self.assertIn('SELECT', sample.queries[0]['sql'])
@@ -0,0 +1,63 @@
+"""``DATABASES`` entries tuned for the backend ``DATABASE_URL`` points at.
+
+SQLite
+    Connections persist for ``conn_max_age`` seconds, with a health check
+    before reuse. Each new connection sets ``SQLITE_PRAGMAS``: WAL, so readers
+    and the writer no longer block each other; ``synchronous=NORMAL``, which
+    syncs at checkpoints instead of every commit (still safe against crashes;
+    a power cut can lose the last few commits); and a memory-mapped file and
+    larger page cache for reads. A writer waits up to ``busy_timeout`` seconds
+    for the lock instead of failing with "database is locked", and
+    transactions begin ``IMMEDIATE``. A deferred transaction that reads and
+    then writes can't be helped by the busy timeout: its upgrade to a write
+    lock fails at once when another writer got in first.
+
+Postgres
+    psycopg 3's connection pool, ``pool_min_size`` to ``pool_max_size``
+    connections per process (size it to the worker's threads; workers x
+    max size has to stay under ``max_connections``). It needs
+    ``psycopg[pool]``; without it, persistent connections as for SQLite.
+
+``profile='basic'`` returns Django's defaults (a connection per request, the
+rollback journal). ``bench_writes`` uses it as the baseline, and settings use
+it for the checked-in dev database when no ``DATABASE_URL`` is set.
+"""
+import importlib.util
+import dj_database_url
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative: KiB rather than pages
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+
+def database_config(url, profile='production', conn_max_age=600, busy_timeout=20,
+                    pool_min_size=2, pool_max_size=10, pool_timeout=10):
+    config = dj_database_url.parse(url)
+    sqlite = config['ENGINE'] == 'django.db.backends.sqlite3'
+    if profile == 'basic':
+        if sqlite:
+            # WAL is stored in the database file, so it has to be undone explicitly
+            config.setdefault('OPTIONS', {})['init_command'] = 'PRAGMA journal_mode=DELETE'
+        return config
+
+    options = config.setdefault('OPTIONS', {})
+    persistent = {'CONN_MAX_AGE': conn_max_age, 'CONN_HEALTH_CHECKS': True}
+    if sqlite:
+        options.update({
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'timeout': busy_timeout,
+            'transaction_mode': 'IMMEDIATE',
+        })
+        config.update(persistent)
+    elif config['ENGINE'] == 'django.db.backends.postgresql' and importlib.util.find_spec('psycopg_pool'):
+        options['pool'] = {'min_size': pool_min_size, 'max_size': pool_max_size, 'timeout': pool_timeout}
+        # The pool replaces persistent connections; Django refuses both at once
+        config['CONN_MAX_AGE'] = 0
+    else:
+        config.update(persistent)
+    return config
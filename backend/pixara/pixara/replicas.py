@@ -0,0 +1,139 @@
+"""Read replicas (``DATABASE_REPLICA_URLS``).
+
+``ReplicaRouter`` sends writes to ``default`` and reads made while serving a
+safe (GET/HEAD/OPTIONS) request to a random alias in ``REPLICA_DATABASES``.
+Everything else reads from the primary: requests that write (a read there
+usually feeds the write, and can't be allowed to see a lagging copy),
+reads after a write within the same request, and code running outside a
+request (management commands, the moderation and like-buffer threads).
+
+Read-your-writes: after a successful write request the user is pinned to
+the primary for ``REPLICA_STICKY_SECONDS``, longer than replication lag is
+expected to get, so a like or follow shows up on the next page load. The
+pin is a cache key, so all workers see it as long as the cache is shared.
+The user is only known once DRF has authenticated the request, so reads
+before that (there are none with JWT auth) go to a replica.
+
+Anything cached for every user to see is built inside ``primary_reads()``:
+a fragment built from a lagging replica after a write would otherwise be
+served from the cache, stale, to the pinned writer too.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import LazyObject
+from accounts.authentication import TokenUser
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = contextvars.ContextVar('replica_state', default=None)
+
+
+class _RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.safe = request.method in SAFE_METHODS
+        self.wrote = False
+        self.pinned = None
+
+
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def _user_id(request):
+    # type() rather than isinstance(): a lazy user would load itself to answer
+    user = request.__dict__.get('user')
+    if issubclass(type(user), TokenUser):
+        return user.id
+    if user is None or issubclass(type(user), LazyObject) or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def _cache():
+    return caches[settings.FRAGMENT_CACHE_ALIAS]
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, e.g. to build something other users will be served."""
+    token = _state.set(None)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if not settings.REPLICA_DATABASES or state is None or not state.safe or state.wrote:
+            return 'default'
+        if state.pinned is None:
+            user_id = _user_id(state.request)
+            if user_id is None:
+                return random.choice(settings.REPLICA_DATABASES)
+            state.pinned = _cache().get(_pin_key(user_id)) is not None
+        return 'default' if state.pinned else random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaRoutingMiddleware:
+    """Makes the current request visible to ``ReplicaRouter`` and pins users after they write.
+
+    Runs natively under both WSGI and ASGI, so async views aren't pushed back
+    onto a thread. Code that ``sync_to_async`` runs in a thread sees the same
+    request state, since asgiref copies the context variables.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RequestState(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.pin_writer(request, state, response)
+        return response
+
+    async def __acall__(self, request):
+        state = _RequestState(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.pin_writer(request, state, response)
+        return response
+
+    def pin_writer(self, request, state, response):
+        if (not state.safe or state.wrote) and response.status_code < 400 and settings.REPLICA_DATABASES:
+            user_id = _user_id(request)
+            if user_id is not None:
+                _cache().set(_pin_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
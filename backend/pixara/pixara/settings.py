@@ -2,15 +2,12 @@ from pathlib import Path
 from datetime import timedelta
 import os
 from pathlib import Path
-import dj_database_url
 from dotenv import load_dotenv
+from .database import database_config
 
 load_dotenv()  
 
 
-DATABASES = {
-    'default': dj_database_url.config(default='sqlite:///db.sqlite3')
-}
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY")
@@ -33,15 +30,20 @@ INSTALLED_APPS = [
     'corsheaders',
     'accounts',
     'posts',
+    'monitoring',
+    'uploads',
+    'search',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.QueryProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pixara.replicas.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,13 +69,32 @@ TEMPLATES = [
 WSGI_APPLICATION = 'pixara.wsgi.application'
 
 
+# Database (pixara/database.py): DATABASE_URL, db.sqlite3 next to manage.py by
+# default. The tuning is on when DATABASE_URL is set; the checked-in dev
+# database gets the basic profile, since switching it to WAL rewrites the file.
+# DATABASE_PROFILE=basic/production overrides either. Under ASGI, set
+# DATABASE_CONN_MAX_AGE=0: requests run their sync code in short-lived threads,
+# whose persistent connections would never be reused.
+DATABASE_TUNING = {
+    'profile': os.environ.get('DATABASE_PROFILE', 'production' if 'DATABASE_URL' in os.environ else 'basic'),
+    'conn_max_age': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+    'pool_max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+}
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+                               **DATABASE_TUNING),
 }
 
+# Read replicas (pixara/replicas.py): comma-separated DATABASE_REPLICA_URLS
+# become replica1, replica2, ... Reads of GET requests go to them, except for
+# users who wrote something in the last REPLICA_STICKY_SECONDS.
+REPLICA_DATABASES = []
+for number, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {**database_config(url.strip(), **DATABASE_TUNING), 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(f'replica{number}')
+DATABASE_ROUTERS = ['pixara.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,7 +128,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from the token and loads the row only when it's
+        # used (accounts/authentication.py); simplejwt's JWTAuthentication
+        # loads it on every request
+        'accounts.authentication.TokenUserAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -150,14 +174,121 @@ CORS_ALLOW_HEADERS = [
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Users loaded by TokenUserAuthentication, kept per process
+TOKEN_USER_CACHE_SECONDS = 60
+TOKEN_USER_CACHE_SIZE = 10000
+
+# Home timeline (posts/timeline.py)
+TIMELINE_BACKEND = os.environ.get('TIMELINE_BACKEND', 'posts.timeline.DatabaseTimelineBackend')
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_BACKFILL_SIZE = 50
+TIMELINE_CELEBRITY_THRESHOLD = 10000
+# Background threads pushing new posts to followers; 0 pushes them inline after commit
+TIMELINE_FANOUT_WORKERS = 2
+# Tries per fan-out on database errors, waiting RETRY_SECONDS, then twice that, ...
+TIMELINE_FANOUT_ATTEMPTS = 3
+TIMELINE_FANOUT_RETRY_SECONDS = 0.5
+
+# Write-behind likes (posts/like_buffer.py): buffered per process and written
+# in one transaction every LIKE_FLUSH_INTERVAL_MS. Off unless LIKE_WRITE_BEHIND=1.
+LIKE_WRITE_BEHIND = os.environ.get('LIKE_WRITE_BEHIND') == '1'
+LIKE_FLUSH_INTERVAL_MS = 200
+LIKE_BUFFER_MAX_SIZE = 5000
+
+# Explore ranking (posts/explore.py). Lists are recomputed by
+# `manage.py refresh_explore` (schedule it more often than the timeout) or
+# by the first request after they expire.
+EXPLORE_WINDOW_HOURS = 72
+EXPLORE_MAX_CANDIDATES = 20000
+EXPLORE_VELOCITY_HOURS = 6
+EXPLORE_SEGMENTS = 50
+EXPLORE_SEGMENT_SIZE = 500
+EXPLORE_CACHE_TIMEOUT = 15 * 60
+EXPLORE_WEIGHTS = {
+    'likes': 1.0, 'comments': 2.0, 'followers': 0.5, 'prior': 1.0,
+    'toxicity': 0.8, 'interest': 0.5, 'gravity': 1.5,
+}
 
+# Comment toxicity inference (posts/ml_utils.py, posts/inference.py)
+COMMENT_MODEL_MMAP = os.environ.get('COMMENT_MODEL_MMAP', '1') == '1'
+COMMENT_MODEL_WARMUP = os.environ.get('COMMENT_MODEL_WARMUP') == '1'
+TOXICITY_BATCH_SIZE = 64
+TOXICITY_BATCH_LATENCY_MS = 5
+TOXICITY_CACHE_SIZE = 10000
+TOXICITY_MAX_CLASSIFY_BATCH = 100
+# Per-label probability at or above which a comment gets that label
+TOXICITY_THRESHOLDS = {
+    'toxic': 0.5,
+    'obscene': 0.5,
+    'insult': 0.5,
+}
 
-INSTALLED_APPS += ['cloudinary', 'cloudinary_storage']
+# Comment moderation (posts/moderation.py): 'thread' scores new comments in a
+# background thread of each web process, 'off' leaves it to `manage.py moderate_comments`
+MODERATION_WORKER = os.environ.get('MODERATION_WORKER', 'thread')
+MODERATION_BATCH_SIZE = 64
+MODERATION_POLL_SECONDS = 5
+
+
+# Request profiling (monitoring/middleware.py). Off unless PROFILING_ENABLED=1.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+# Fraction of requests that capture their SQL; kept if slower than PROFILING_OUTLIER_MS
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_OUTLIER_MS = 500
+PROFILING_FLUSH_SECONDS = 60
+# 'db' for EndpointStat rows, or a file path for JSON lines
+PROFILING_FLUSH_TO = os.environ.get('PROFILING_FLUSH_TO', 'db')
+
+# Response fragments (posts/fragments.py). Shared Redis when REDIS_URL is
+# set, otherwise per-process memory.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        }
+    }
+FRAGMENT_CACHE_ALIAS = 'default'
+FRAGMENT_CACHE_TIMEOUT = 300
+
+# Uploads larger than this are streamed to a temporary file instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+# Same as Django's defaults, but they also hash each upload as it streams in
+FILE_UPLOAD_HANDLERS = [
+    'uploads.handlers.HashingMemoryFileUploadHandler',
+    'uploads.handlers.HashingTemporaryFileUploadHandler',
+]
+# Media is deduplicated by content (uploads/storage.py), on local disk or on
+# Cloudinary when CLOUDINARY_CLOUD_NAME is set (see below)
+STORAGES = {
+    'default': {'BACKEND': 'uploads.storage.DedupFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+# Image variants (posts/images.py): longest edge in pixels per size
+IMAGE_VARIANT_SIZES = {'thumb': 150, 'feed': 640, 'full': 1440}
+IMAGE_VARIANT_QUALITY = 82
+# Background threads generating variants; 0 generates them inline after commit
+IMAGE_VARIANT_WORKERS = 2
+
+# Username autocomplete (accounts/autocomplete.py): each worker's in-memory
+# index is rebuilt this often to pick up changes made by other processes
+USERNAME_INDEX_REFRESH_SECONDS = 300
+
+
+INSTALLED_APPS += ['cloudinary', 'cloudinary_storage']
 
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': os.environ.get('CLOUDINARY_CLOUD_NAME'),
     'API_KEY': os.environ.get('CLOUDINARY_API_KEY'),
     'API_SECRET': os.environ.get('CLOUDINARY_API_SECRET')
 }
+if CLOUDINARY_STORAGE['CLOUD_NAME']:
+    STORAGES['default'] = {'BACKEND': 'uploads.cloud.DedupCloudinaryStorage'}
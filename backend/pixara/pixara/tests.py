@@ -0,0 +1,150 @@
+import logging
+import shutil
+import tempfile
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections, router
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from posts.models import Post, Like
+from .database import database_config
+
+
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_profile(self):
+        config = database_config('sqlite:////tmp/pixara.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 600)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', config['OPTIONS']['init_command'])
+
+    def test_basic_profile_keeps_django_defaults(self):
+        config = database_config('sqlite:////tmp/pixara.sqlite3', profile='basic')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS'], {'init_command': 'PRAGMA journal_mode=DELETE'})
+
+    def test_postgres_profile(self):
+        config = database_config('postgres://pixara:secret@db:5432/pixara', pool_max_size=4)
+        if 'pool' in config['OPTIONS']:
+            self.assertEqual(config['OPTIONS']['pool']['max_size'], 4)
+            self.assertEqual(config['CONN_MAX_AGE'], 0)
+        else:
+            # psycopg_pool isn't installed
+            self.assertEqual(config['CONN_MAX_AGE'], 600)
+            self.assertTrue(config['CONN_HEALTH_CHECKS'])
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        config = connections.configure_settings(
+            {'default': database_config(f'sqlite:///{directory}/tuned.sqlite3')})['default']
+        tuned = DatabaseWrapper(config, alias='tuned')
+        try:
+            with tuned.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 20000)
+        finally:
+            tuned.close()
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # The test database is the primary; the replica is an SQLite file with the schema and no rows
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        replica = database_config(f'sqlite:///{cls.directory}/replica.sqlite3')
+        connections.settings['replica'] = connections.configure_settings(
+            {**connections.settings, 'replica': replica})['replica']
+        call_command('migrate', database='replica', verbosity=0)
+        # Set here rather than on the class: the runner only creates test databases for configured aliases
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+        replicas = override_settings(REPLICA_DATABASES=['replica'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        self.author = User.objects.create(username='alice', email='alice@example.com')
+        self.viewer = User.objects.create(username='bob', email='bob@example.com')
+        self.post = Post.objects.create(user=self.author, caption='hello')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_reads_go_to_the_replica_until_the_user_writes(self):
+        viewer, author = self.client_for(self.viewer), self.client_for(self.author)
+        comments = reverse('post_comments', args=[self.post.id])
+        self.assertEqual(viewer.get(comments).status_code, 404)
+
+        # Writes (and the reads they make) go to the primary
+        self.assertEqual(viewer.put(reverse('toggle_like', args=[self.post.id])).status_code, 200)
+        self.assertTrue(Like.objects.filter(user=self.viewer, post=self.post).exists())
+
+        # Only the user who wrote is pinned
+        self.assertEqual(author.get(comments).status_code, 404)
+        self.assertEqual(viewer.get(comments).status_code, 200)
+
+        # Until the pin expires
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+        self.assertEqual(viewer.get(comments).status_code, 404)
+
+    def test_shared_fragments_are_built_from_the_primary(self):
+        # A lagging copy: the replica has the post, but not the like below
+        for model, row in ((User, self.author), (User, self.viewer), (Post, self.post)):
+            model.objects.using('replica').bulk_create([row])
+        viewer, author = self.client_for(self.viewer), self.client_for(self.author)
+        detail = reverse('post_detail', args=[self.post.id])
+        self.assertEqual(viewer.put(reverse('toggle_like', args=[self.post.id])).status_code, 200)
+
+        # The author isn't pinned, but the counters they cache are the primary's
+        response = author.get(detail)
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertFalse(response.data['is_liked'])
+        response = viewer.get(detail)
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertTrue(response.data['is_liked'])
+
+    @override_settings(DEBUG=True)
+    def test_middleware_runs_natively_under_asgi(self):
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            logging.getLogger('django.request').debug('loading middleware')
+            ASGIHandler()
+        self.assertEqual([line for line in logs.output if 'ReplicaRoutingMiddleware' in line], [])
+
+    def test_async_views_are_routed(self):
+        Like.objects.create(user=self.viewer, post=self.post)
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.viewer)}'}
+        detail = reverse('post_detail', args=[self.post.id])
+        client = AsyncClient()
+        # The viewer's likes are read from the (empty) replica until they write something
+        self.assertFalse(async_to_sync(client.get)(detail, headers=headers).json()['is_liked'])
+        self.assertEqual(async_to_sync(client.put)(reverse('toggle_like', args=[self.post.id]),
+                                                   headers=headers).status_code, 200)
+        self.assertTrue(async_to_sync(client.get)(detail, headers=headers).json()['is_liked'])
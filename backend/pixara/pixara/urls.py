@@ -21,6 +21,7 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/',include('accounts.urls')),
+    path('api/search/',include('search.urls')),
     path('api/',include('posts.urls')),
 ]
 
@@ -9,7 +9,7 @@ class PostAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'caption', 'created_at', 'likes_count', 'comments_count']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['user__username', 'caption']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'likes_count', 'comments_count']
 
 @admin.register(Like)
 class LikeAdmin(admin.ModelAdmin):
@@ -19,7 +19,7 @@ class LikeAdmin(admin.ModelAdmin):
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'post', 'content', 'created_at']
-    list_filter = ['created_at', 'updated_at']
+    list_display = ['id', 'user', 'post', 'content', 'moderation_status', 'created_at']
+    list_filter = ['moderation_status', 'created_at', 'updated_at']
     search_fields = ['user__username', 'content']
-    readonly_fields = ['created_at', 'updated_at']
\ No newline at end of file
+    readonly_fields = ['created_at', 'updated_at', 'toxic_score', 'obscene_score', 'insult_score', 'moderated_at']
\ No newline at end of file
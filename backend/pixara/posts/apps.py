@@ -1,6 +1,19 @@
+import threading
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from . import fragments, images
+        fragments.connect_signals()
+        images.connect_signals()
+
+        # Opt-in (web workers only): load the comment model in the background
+        # so the first comment doesn't wait for it
+        if settings.COMMENT_MODEL_WARMUP:
+            from .ml_utils import warm_up
+            threading.Thread(target=warm_up, name='comment-model-warmup', daemon=True).start()
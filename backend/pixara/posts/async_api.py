@@ -0,0 +1,82 @@
+"""``api_view`` for ``async def`` views.
+
+DRF only dispatches synchronous views, so ``async_api_view`` does the parts
+of ``APIView`` our endpoints rely on: authentication and permission checks
+(run through ``sync_to_async``, since the JWT check loads the user), method
+checks, DRF's exception handler and JSON rendering. The view itself runs on
+the event loop and gets a DRF ``Request``. ``@permission_classes`` is read
+from the function just like with ``@api_view``:
+
+    @async_api_view(['GET'])
+    @permission_classes([permissions.IsAuthenticated])
+    async def user_stats(request, user_id):
+        ...
+
+Under WSGI Django runs these views in a per-request event loop, so both
+deployments keep working.
+"""
+import functools
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+
+def _check_permissions(request, permissions):
+    for permission in permissions:
+        if not permission.has_permission(request, None):
+            if request.authenticators and not request.successful_authenticator:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+
+def _handle_exception(request, exc):
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        header = request.authenticators[0].authenticate_header(request) if request.authenticators else None
+        if header:
+            exc.auth_header = header
+        else:
+            exc.status_code = 403
+    response = exception_handler(exc, {'view': None, 'args': (), 'kwargs': {}, 'request': request})
+    if response is None:
+        raise exc
+    if getattr(exc, 'auth_header', None):
+        response['WWW-Authenticate'] = exc.auth_header
+    return response
+
+
+def async_api_view(http_method_names):
+    allowed = {method.upper() for method in http_method_names}
+
+    def decorator(func):
+        permission_classes = getattr(func, 'permission_classes', api_settings.DEFAULT_PERMISSION_CLASSES)
+
+        @csrf_exempt
+        @functools.wraps(func)
+        async def view(django_request, *args, **kwargs):
+            request = Request(
+                django_request,
+                parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+                parser_context={'args': args, 'kwargs': kwargs},
+            )
+            try:
+                if request.method not in allowed:
+                    raise exceptions.MethodNotAllowed(request.method)
+                await sync_to_async(_check_permissions)(request, [p() for p in permission_classes])
+                response = await func(request, *args, **kwargs)
+            except Exception as exc:
+                response = _handle_exception(request, exc)
+
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+            response.renderer_context = {'view': None, 'args': args, 'kwargs': kwargs,
+                                         'request': request, 'response': response}
+            return response
+
+        return view
+
+    return decorator
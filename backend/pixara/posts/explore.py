@@ -0,0 +1,176 @@
+"""Ranked explore feed.
+
+A refresh (``refresh_explore``, run on a schedule, or the first request
+that finds the cache empty) loads every post from the last
+``EXPLORE_WINDOW_HOURS`` in three aggregate queries and scores the whole
+candidate set at once with NumPy:
+
+    base  = (likes * recent likes + comments * recent visible comments
+             + followers * log1p(author followers) + prior)
+            * (1 - toxicity * mean comment toxicity) / (age_hours + 2) ** gravity
+    score = base * (1 + interest * author shares the segment's interest)
+
+``score`` is a (posts x segments) matrix, one column per interest segment:
+the ``EXPLORE_SEGMENTS`` most common tags in users' ``interests`` plus
+``ALL`` for viewers without any. The best ``EXPLORE_SEGMENT_SIZE`` posts of
+each column are cached as ``(score, post_id, author_id)`` lists.
+
+A request (``aexplore_entries``) only reads the lists for the viewer's
+segments, merges them (keeping a post's best score), drops the viewer's own
+posts and posts by people they follow, and pages through the result by
+``(score, id)``.
+"""
+import re
+import threading
+from datetime import timedelta
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+from accounts.models import User, Follow
+from .models import Post, Like, Comment
+
+ALL = '*'
+KEY_PREFIX = 'explore'
+
+_refresh_lock = threading.Lock()
+
+
+def interest_tags(interests):
+    """``'Travel, street photography'`` -> ``{'travel', 'street photography'}``."""
+    return {tag.strip().lower() for tag in re.split(r'[,;#\n]+', interests or '') if tag.strip()}
+
+
+def _cache():
+    return caches[settings.FRAGMENT_CACHE_ALIAS]
+
+
+def _key(name):
+    return f'{KEY_PREFIX}:{name}'
+
+
+def load_candidates(now):
+    """Feature columns for every post in the window, as NumPy arrays (one entry per post)."""
+    since = now - timedelta(hours=settings.EXPLORE_WINDOW_HOURS)
+    recent = now - timedelta(hours=settings.EXPLORE_VELOCITY_HOURS)
+    rows = list(Post.objects.filter(created_at__gte=since).order_by('-created_at')
+                .values_list('id', 'user_id', 'created_at', 'user__interests',
+                             'user__userprofile__followers_count')[:settings.EXPLORE_MAX_CANDIDATES])
+    if not rows:
+        return None
+    post_ids = [row[0] for row in rows]
+    likes = dict(Like.objects.filter(post_id__in=post_ids, created_at__gte=recent)
+                 .order_by().values('post_id').annotate(n=Count('id')).values_list('post_id', 'n'))
+    comments = {row['post_id']: row for row in Comment.objects.filter(post_id__in=post_ids).order_by()
+                .values('post_id').annotate(recent=Count('id', filter=Q(created_at__gte=recent,
+                                                                        moderation_status=Comment.Status.VISIBLE)),
+                                            toxicity=Avg('toxic_score'))}
+    no_comments = {'recent': 0, 'toxicity': None}
+    return {
+        'post_ids': np.array(post_ids, dtype=np.int64),
+        'author_ids': np.array([row[1] for row in rows], dtype=np.int64),
+        'age_hours': np.array([(now - row[2]).total_seconds() / 3600 for row in rows]),
+        'tags': [interest_tags(row[3]) for row in rows],
+        'followers': np.array([row[4] or 0 for row in rows], dtype=np.float64),
+        'likes': np.array([likes.get(post_id, 0) for post_id in post_ids], dtype=np.float64),
+        'comments': np.array([comments.get(post_id, no_comments)['recent'] for post_id in post_ids],
+                             dtype=np.float64),
+        'toxicity': np.array([comments.get(post_id, no_comments)['toxicity'] or 0.0 for post_id in post_ids]),
+    }
+
+
+def top_segments(limit):
+    counts = {}
+    for interests in User.objects.exclude(interests='').values_list('interests', flat=True).iterator():
+        for tag in interest_tags(interests):
+            counts[tag] = counts.get(tag, 0) + 1
+    return sorted(counts, key=lambda tag: (-counts[tag], tag))[:limit]
+
+
+def score_candidates(candidates, segments, weights):
+    """``(posts x [ALL] + segments)`` score matrix for the candidate set."""
+    engagement = (weights['likes'] * candidates['likes']
+                  + weights['comments'] * candidates['comments']
+                  + weights['followers'] * np.log1p(candidates['followers'])
+                  + weights['prior'])
+    quality = np.clip(1 - weights['toxicity'] * candidates['toxicity'], 0, 1)
+    base = engagement * quality / (candidates['age_hours'] + 2) ** weights['gravity']
+
+    overlap = np.zeros((len(base), len(segments) + 1))
+    column = {tag: i + 1 for i, tag in enumerate(segments)}
+    for row, tags in enumerate(candidates['tags']):
+        for tag in tags:
+            if tag in column:
+                overlap[row, column[tag]] = 1
+    return base[:, None] * (1 + weights['interest'] * overlap)
+
+
+def rank(candidates, segments, size):
+    """``{segment: [(score, post_id, author_id), ...]}``, best first, ties broken by id."""
+    scores = score_candidates(candidates, segments, settings.EXPLORE_WEIGHTS)
+    ranked = {}
+    for column, segment in enumerate([ALL] + segments):
+        # lexsort sorts by its last key first: score descending, then post id
+        order = np.lexsort((candidates['post_ids'], -scores[:, column]))[:size]
+        ranked[segment] = list(zip(scores[order, column].tolist(), candidates['post_ids'][order].tolist(),
+                                   candidates['author_ids'][order].tolist()))
+    return ranked
+
+
+def refresh(now=None):
+    """Recompute and cache the ranked lists of every segment. Returns the segments."""
+    with _refresh_lock:
+        candidates = load_candidates(now or timezone.now())
+        segments = top_segments(settings.EXPLORE_SEGMENTS)
+        ranked = rank(candidates, segments, settings.EXPLORE_SEGMENT_SIZE) if candidates else {}
+        cache = _cache()
+        timeout = settings.EXPLORE_CACHE_TIMEOUT
+        cache.set_many({_key(f'segment:{segment}'): ranked.get(segment, []) for segment in [ALL] + segments},
+                       timeout)
+        # Written last, so readers never see segments without their lists
+        cache.set(_key('segments'), segments, timeout)
+        return segments
+
+
+def _segment_keys(interests, segments):
+    wanted = sorted(interest_tags(interests) & set(segments)) or [ALL]
+    return [_key(f'segment:{segment}') for segment in wanted]
+
+
+def _merge(lists):
+    best = {}
+    for entries in lists:
+        for score, post_id, author_id in entries:
+            if post_id not in best or score > best[post_id][0]:
+                best[post_id] = (score, post_id, author_id)
+    return sorted(best.values(), key=lambda entry: (-entry[0], entry[1]))
+
+
+async def aranked_for(user):
+    """Merged ranked ``(score, post_id, author_id)`` list for ``user``'s segments, best first."""
+    cache = _cache()
+    segments = await cache.aget(_key('segments'))
+    if segments is None:
+        segments = await sync_to_async(refresh)()
+    # A TokenUser loads the row for this, which can't happen on the event loop
+    interests = await sync_to_async(getattr)(user, 'interests')
+    keys = _segment_keys(interests, segments)
+    lists = await cache.aget_many(keys)
+    if len(lists) < len(keys):
+        await sync_to_async(refresh)()
+        lists = await cache.aget_many(keys)
+    return _merge(lists.values())
+
+
+def _hidden_authors(user, entries):
+    return Follow.objects.filter(follower_id=user.id, followee_id__in={entry[2] for entry in entries}).values_list(
+        'followee_id', flat=True)
+
+
+async def aexplore_entries(user):
+    """Ranked entries for ``user`` without their own posts and those of people they follow."""
+    entries = await aranked_for(user)
+    hidden = {followee_id async for followee_id in _hidden_authors(user, entries)} | {user.id}
+    return [entry for entry in entries if entry[2] not in hidden]
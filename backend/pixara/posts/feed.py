@@ -0,0 +1,69 @@
+import asyncio
+from django.db.models import Prefetch
+from accounts.models import Follow
+from .like_buffer import like_buffer
+from .models import Post, Like, Comment
+
+
+def feed_queryset(queryset=None):
+    """Posts with author and comments loaded up front.
+
+    Serializing any number of posts from this queryset costs one query for the
+    posts and one for all of their visible comments (with comment authors).
+    Like and comment counts are stored on the post row, so they come for free.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    return (queryset
+            .select_related('user')
+            .prefetch_related(Prefetch('comments', queryset=Comment.objects
+                                       .filter(moderation_status=Comment.Status.VISIBLE)
+                                       .select_related('user'))))
+
+
+def viewer_sets(user, post_ids, author_ids):
+    """``(liked post ids, followed user ids)`` for the viewer, in two queries.
+
+    Likes still waiting in the write-behind buffer are included.
+    """
+    if not (user and user.is_authenticated):
+        return set(), set()
+    liked = set(Like.objects.filter(user_id=user.id, post_id__in=post_ids).values_list('post_id', flat=True))
+    liked = like_buffer.liked(user.id, post_ids, liked)
+    following = set(Follow.objects.filter(follower_id=user.id, followee_id__in=author_ids)
+                    .values_list('followee_id', flat=True))
+    return liked, following
+
+
+async def aviewer_sets(user, post_ids, author_ids):
+    """``viewer_sets`` for async views, with both lookups in flight at once."""
+    if not (user and user.is_authenticated):
+        return set(), set()
+
+    async def ids(queryset):
+        return {pk async for pk in queryset}
+
+    liked, following = await asyncio.gather(
+        ids(Like.objects.filter(user_id=user.id, post_id__in=post_ids).values_list('post_id', flat=True)),
+        ids(Follow.objects.filter(follower_id=user.id, followee_id__in=author_ids).values_list('followee_id', flat=True)),
+    )
+    return like_buffer.liked(user.id, post_ids, liked), following
+
+
+def _authors(posts):
+    author_ids = {post.user_id for post in posts}
+    for post in posts:
+        author_ids.update(comment.user_id for comment in post.comments.all())
+    return author_ids
+
+
+def feed_context(request, posts):
+    """Serializer context with the viewer's likes and follows for ``posts`` in two queries.
+
+    ``posts`` must already be evaluated (a page or a list), since the lookups
+    are keyed on the ids of the posts and of every author shown on the page.
+    """
+    post_ids = [post.id for post in posts]
+    liked, following = viewer_sets(getattr(request, 'user', None), post_ids, _authors(posts))
+    return {'request': request, 'liked_post_ids': liked, 'following_user_ids': following,
+            'like_deltas': like_buffer.like_deltas(post_ids)}
@@ -0,0 +1,340 @@
+"""Cached, viewer-independent fragments of hot API responses.
+
+Responses are assembled from small per-object fragments stored in the
+``FRAGMENT_CACHE_ALIAS`` cache (locmem by default, Redis when ``REDIS_URL``
+is set):
+
+- ``post``: a serialized post with its visible comments, where every
+  embedded user is reduced to its id
+- ``post_counters``: a post's like and comment counts
+- ``user``: a user card, as shown next to posts and on profiles
+- ``user_counters``: a profile's follower/following counts
+- ``username``: username -> user id
+
+Media URLs are stored as the storage returns them (relative for local
+media) and made absolute per response: a fragment is shared by every
+viewer, so it mustn't carry the host of whichever request built it.
+
+Keeping counters apart from bodies means a like only evicts two integers,
+and a profile edit evicts one card instead of every post that shows it.
+Per-viewer fields (``is_liked``, ``is_following``) are never cached; they
+are merged in by the view from the same bulk lookups the feeds use.
+
+Fragments are evicted by ``post_save``/``post_delete`` receivers (wired up
+in ``PostsConfig.ready``), once immediately and once more when the
+surrounding transaction commits, so a reader can't cache a value from
+before the commit. Builds read from the primary even when the request is
+routed to a read replica, for the same reason. Writes that bypass signals (``QuerySet.update``,
+``bulk_update``) call ``fragment_cache.invalidate`` themselves.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from accounts.models import User, UserProfile, Follow
+from accounts.serializers import UserProfileSerializer
+from pixara.replicas import primary_reads
+from .images import FORMATS
+from .fast_serializers import post_rows, user_rows, serialize_posts, serialize_users
+from .feed import viewer_sets, aviewer_sets
+from .like_buffer import like_buffer
+from .models import Post, Like, Comment
+from .serializers import PostSerializer
+
+NO_VIEWER = {'liked_post_ids': frozenset(), 'following_user_ids': frozenset()}
+
+
+class FragmentCache:
+    def __init__(self, alias, timeout, key_prefix='frag'):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self._stats_lock = threading.Lock()
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, kind, ident):
+        return f'{self.key_prefix}:{kind}:{ident}'
+
+    def get_many(self, kind, idents, build):
+        """Fragments of ``kind`` for ``idents``, building and storing the misses.
+
+        ``build(missing)`` returns ``{ident: fragment}``; idents it leaves out
+        (e.g. deleted rows) are simply absent from the result.
+        """
+        keys = self._keys(kind, idents)
+        found, missing = self._found(kind, keys, self.cache.get_many(list(keys)))
+        if missing:
+            built = self._build(build, missing)
+            if built:
+                self.set_many(kind, built)
+            found.update(built)
+        return found
+
+    async def aget_many(self, kind, idents, build):
+        """``get_many`` for async views; ``build`` is synchronous (it queries the database)."""
+        keys = self._keys(kind, idents)
+        found, missing = self._found(kind, keys, await self.cache.aget_many(list(keys)))
+        if missing:
+            built = await sync_to_async(self._build)(build, missing)
+            if built:
+                await self.cache.aset_many(self._items(kind, built), self.timeout)
+            found.update(built)
+        return found
+
+    @staticmethod
+    def _build(build, missing):
+        with primary_reads():
+            return build(missing)
+
+    def _keys(self, kind, idents):
+        return {self.key(kind, ident): ident for ident in dict.fromkeys(idents)}
+
+    def _found(self, kind, keys, values):
+        found = {keys[key]: value for key, value in values.items()}
+        missing = [ident for ident in keys.values() if ident not in found]
+        with self._stats_lock:
+            self._hits[kind] += len(found)
+            self._misses[kind] += len(missing)
+        return found, missing
+
+    def _items(self, kind, fragments):
+        return {self.key(kind, ident): value for ident, value in fragments.items()}
+
+    def get(self, kind, ident, build):
+        return self.get_many(kind, [ident], build).get(ident)
+
+    def set_many(self, kind, fragments):
+        self.cache.set_many(self._items(kind, fragments), self.timeout)
+
+    def invalidate(self, kind, *idents):
+        keys = [self.key(kind, ident) for ident in idents]
+        self.cache.delete_many(keys)
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+    def metrics(self):
+        with self._stats_lock:
+            hits, misses = dict(self._hits), dict(self._misses)
+        stats = {}
+        for kind in sorted(set(hits) | set(misses)):
+            stats[kind] = self._ratio(hits.get(kind, 0), misses.get(kind, 0))
+        return {
+            'backend': self.cache.__class__.__name__,
+            **self._ratio(sum(hits.values()), sum(misses.values())),
+            'fragments': stats,
+        }
+
+    @staticmethod
+    def _ratio(hits, misses):
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+fragment_cache = FragmentCache(settings.FRAGMENT_CACHE_ALIAS, settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def build_posts(post_ids):
+    rows = list(post_rows(Post.objects.filter(id__in=post_ids)))
+    data = serialize_posts(rows, NO_VIEWER)
+    bodies, counters, cards = {}, {}, {}
+
+    def strip_user(user):
+        cards[user['id']] = _card(user)
+        return user['id']
+
+    for post in data:
+        post = dict(post)
+        counters[post['id']] = {'likes_count': post.pop('likes_count'),
+                                'comments_count': post.pop('comments_count')}
+        post.pop('is_liked')
+        post['user'] = strip_user(post['user'])
+        post['comments'] = [{**comment, 'user': strip_user(comment['user'])} for comment in post['comments']]
+        bodies[post['id']] = post
+    # Counters and authors come from the same rows, so store them while we have them
+    fragment_cache.set_many('post_counters', counters)
+    fragment_cache.set_many('user', cards)
+    return bodies
+
+
+def build_post_counters(post_ids):
+    return {row.pop('id'): row for row in
+            Post.objects.filter(id__in=post_ids).values('id', 'likes_count', 'comments_count')}
+
+
+def _card(user_data):
+    card = dict(user_data)
+    card.pop('is_following')
+    return card
+
+
+def build_user_cards(user_ids):
+    data = serialize_users(user_rows(User.objects.filter(id__in=user_ids)), NO_VIEWER)
+    return {user['id']: _card(user) for user in data}
+
+
+def build_user_counters(user_ids):
+    profiles = {profile.user_id: profile for profile in UserProfile.objects.filter(user_id__in=user_ids)}
+    for user_id in User.objects.filter(id__in=set(user_ids) - set(profiles)).values_list('id', flat=True):
+        profiles[user_id], _ = UserProfile.objects.get_or_create(user_id=user_id)
+    return {user_id: UserProfileSerializer(profile).data for user_id, profile in profiles.items()}
+
+
+def build_usernames(usernames):
+    return dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+
+def _absolute(request, fragment, file_field, variants_field):
+    """``fragment`` with its media URLs made absolute for this request, as DRF's ``ImageField`` does."""
+    if request is None:
+        return fragment
+    fragment = dict(fragment)
+    if fragment[file_field]:
+        fragment[file_field] = request.build_absolute_uri(fragment[file_field])
+    fragment[variants_field] = {
+        label: {key: request.build_absolute_uri(value) if key in FORMATS and value else value
+                for key, value in entry.items()}
+        for label, entry in fragment[variants_field].items()}
+    return fragment
+
+
+def user_cards(request, user_ids, following_user_ids):
+    cards = fragment_cache.get_many('user', user_ids, build_user_cards)
+    return _viewer_cards(request, cards, following_user_ids)
+
+
+def _viewer_cards(request, cards, following_user_ids):
+    return {user_id: {**_absolute(request, card, 'profile_picture', 'profile_picture_variants'),
+                      'is_following': user_id in following_user_ids}
+            for user_id, card in cards.items()}
+
+
+def _authors(bodies):
+    author_ids = set()
+    for body in bodies.values():
+        author_ids.add(body['user'])
+        author_ids.update(comment['user'] for comment in body['comments'])
+    return author_ids
+
+
+def _assemble(request, post_ids, bodies, counters, liked, cards):
+    like_deltas = like_buffer.like_deltas(bodies)
+    results = []
+    for post_id in post_ids:
+        body = bodies.get(post_id)
+        if body is None or post_id not in counters:
+            continue
+        post = {**_absolute(request, body, 'image', 'image_variants'), **counters[post_id],
+                'is_liked': post_id in liked}
+        post['likes_count'] += like_deltas.get(post_id, 0)
+        post['user'] = cards[body['user']]
+        post['comments'] = [{**comment, 'user': cards[comment['user']]} for comment in body['comments']]
+        # Restore PostSerializer's field order
+        results.append({field: post[field] for field in PostSerializer.Meta.fields})
+    return results
+
+
+def cached_posts(request, post_ids):
+    """Serialized posts for ``post_ids`` (same shape as ``PostSerializer``), in order.
+
+    On a warm cache this costs the viewer's two flag lookups and nothing else.
+    """
+    bodies = fragment_cache.get_many('post', post_ids, build_posts)
+    counters = fragment_cache.get_many('post_counters', list(bodies), build_post_counters)
+    author_ids = _authors(bodies)
+    liked, following = viewer_sets(request.user, list(bodies), author_ids)
+    cards = user_cards(request, author_ids, following)
+    return _assemble(request, post_ids, bodies, counters, liked, cards)
+
+
+async def acached_posts(request, post_ids):
+    """``cached_posts`` for async views: counters, viewer flags and author cards are fetched concurrently."""
+    bodies = await fragment_cache.aget_many('post', post_ids, build_posts)
+    author_ids = _authors(bodies)
+    counters, (liked, following), cards = await asyncio.gather(
+        fragment_cache.aget_many('post_counters', list(bodies), build_post_counters),
+        aviewer_sets(request.user, list(bodies), author_ids),
+        fragment_cache.aget_many('user', author_ids, build_user_cards),
+    )
+    return _assemble(request, post_ids, bodies, counters, liked, _viewer_cards(request, cards, following))
+
+
+async def acached_user_card(request, user_id):
+    async def following():
+        if not request.user.is_authenticated or request.user.id == user_id:
+            return set()
+        return {followee_id async for followee_id in Follow.objects
+                .filter(follower_id=request.user.id, followee_id=user_id).values_list('followee_id', flat=True)}
+
+    cards, following_ids = await asyncio.gather(
+        fragment_cache.aget_many('user', [user_id], build_user_cards),
+        following(),
+    )
+    return _viewer_cards(request, cards, following_ids).get(user_id)
+
+
+async def acached_user_counters(user_id):
+    return (await fragment_cache.aget_many('user_counters', [user_id], build_user_counters)).get(user_id)
+
+
+def cached_user_id(username):
+    return fragment_cache.get('username', username, build_usernames)
+
+
+# Invalidation
+
+def post_changed(sender, instance, **kwargs):
+    fragment_cache.invalidate('post', instance.pk)
+    fragment_cache.invalidate('post_counters', instance.pk)
+
+
+def like_changed(sender, instance, **kwargs):
+    fragment_cache.invalidate('post_counters', instance.post_id)
+
+
+def comment_changed(sender, instance, **kwargs):
+    fragment_cache.invalidate('post', instance.post_id)
+    fragment_cache.invalidate('post_counters', instance.post_id)
+
+
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    # A rename has to evict the old username, which is gone after the save
+    if instance.pk and (update_fields is None or 'username' in update_fields):
+        old = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+        if old and old != instance.username:
+            fragment_cache.invalidate('username', old)
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    fragment_cache.invalidate('user', instance.pk)
+    fragment_cache.invalidate('user_counters', instance.pk)
+    fragment_cache.invalidate('username', instance.username)
+
+
+def profile_changed(sender, instance, **kwargs):
+    fragment_cache.invalidate('user_counters', instance.user_id)
+
+
+def follow_changed(sender, instance, **kwargs):
+    # follow_user moves both counters with QuerySet.update, which sends no signal
+    fragment_cache.invalidate('user_counters', instance.follower_id, instance.followee_id)
+
+
+def connect_signals():
+    for signal in (post_save, post_delete):
+        signal.connect(post_changed, sender=Post, dispatch_uid='fragments_post')
+        signal.connect(like_changed, sender=Like, dispatch_uid='fragments_like')
+        signal.connect(comment_changed, sender=Comment, dispatch_uid='fragments_comment')
+        signal.connect(user_changed, sender=User, dispatch_uid='fragments_user')
+        signal.connect(profile_changed, sender=UserProfile, dispatch_uid='fragments_profile')
+        signal.connect(follow_changed, sender=Follow, dispatch_uid='fragments_follow')
+    pre_save.connect(user_changing, sender=User, dispatch_uid='fragments_user_rename')
@@ -0,0 +1,169 @@
+"""Resized, metadata-free variants of uploaded images.
+
+Uploads stream to disk in chunks (``FILE_UPLOAD_MAX_MEMORY_SIZE``) and are
+stored as-is. Once the row is committed, a worker pool re-reads the
+original from storage and writes one WebP and one JPEG per size in
+``IMAGE_VARIANT_SIZES``. JPEGs are decoded at the smallest scale that still
+covers the largest variant (``Image.draft``), each smaller size is resized
+from the previous one, and re-encoding from pixels drops EXIF/GPS and other
+metadata (orientation is applied first). Originals are kept untouched;
+clients are expected to show the variants.
+
+The storage names end up in a JSON field next to the image (``{'source':
+<original name>, 'thumb': {'webp': ..., 'jpeg': ..., 'width': ...}, ...}``)
+and serializers turn them into URLs with ``variant_urls``. A ``post_save``
+receiver notices when the image no longer matches ``source`` and schedules
+a new run, so every way of changing an image (API, admin, shell) is covered.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from PIL import Image, ImageOps
+from accounts.models import User
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# model -> (image field, variants field, fragment kind to evict)
+IMAGE_FIELDS = {
+    Post: ('image', 'image_variants', 'post'),
+    User: ('profile_picture', 'profile_picture_variants', 'user'),
+}
+FORMATS = {'webp': ('WEBP', {'method': 4}), 'jpeg': ('JPEG', {'optimize': True, 'progressive': True})}
+
+
+def render_variants(source, sizes, quality):
+    """Yield ``(label, format, width, height, bytes)`` for every size and format, largest size first."""
+    image = Image.open(source)
+    largest = max(sizes.values())
+    # Lets the JPEG decoder skip straight to a 1/2, 1/4 or 1/8 scale image
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    for label, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        for ext, (fmt, options) in FORMATS.items():
+            frame = image
+            if fmt == 'JPEG' and image.mode == 'RGBA':
+                frame = Image.new('RGB', image.size, 'white')
+                frame.paste(image, mask=image.getchannel('A'))
+            out = io.BytesIO()
+            frame.save(out, fmt, quality=quality, **options)
+            yield label, ext, image.width, image.height, out.getvalue()
+
+
+def generate_variants(model, pk):
+    """Create the variants for one row's current image and record them on the row."""
+    image_field, variants_field, fragment = IMAGE_FIELDS[model]
+    instance = model.objects.filter(pk=pk).only('pk', image_field, variants_field).first()
+    if instance is None:
+        return None
+    file = getattr(instance, image_field)
+    old = getattr(instance, variants_field) or {}
+    if not file or old.get('source') == file.name:
+        return old
+
+    storage = file.storage
+    stem, _ = os.path.splitext(file.name)
+    directory, basename = os.path.split(stem)
+    variants = {'source': file.name}
+    with storage.open(file.name, 'rb') as source:
+        for label, ext, width, height, data in render_variants(
+                source, settings.IMAGE_VARIANT_SIZES, settings.IMAGE_VARIANT_QUALITY):
+            name = storage.save(os.path.join(directory, 'variants', f'{basename}_{label}.{ext}'), ContentFile(data))
+            variants.setdefault(label, {'width': width, 'height': height})[ext] = name
+
+    # Only record them if the image wasn't replaced while we were working
+    updated = model.objects.filter(pk=pk, **{image_field: file.name}).update(**{variants_field: variants})
+    stale = old if updated else variants
+    delete_variant_files(storage, stale)
+    if updated:
+        from .fragments import fragment_cache
+        fragment_cache.invalidate(fragment, pk)
+    return variants if updated else None
+
+
+def delete_variant_files(storage, variants):
+    for label, entry in variants.items():
+        if label == 'source':
+            continue
+        for ext in FORMATS:
+            if entry.get(ext):
+                storage.delete(entry[ext])
+
+
+def variant_urls(variants, storage, request=None):
+    """``{'thumb': {'webp': url, 'jpeg': url, 'width': w, 'height': h}, ...}`` for serializers."""
+    urls = {}
+    for label, entry in (variants or {}).items():
+        if label == 'source':
+            continue
+        urls[label] = dict(entry)
+        for ext in FORMATS:
+            if entry.get(ext):
+                url = storage.url(entry[ext])
+                urls[label][ext] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _run(model, pk):
+    try:
+        generate_variants(model, pk)
+    except Exception:
+        logger.exception('Could not create image variants for %s %s', model._meta.label, pk)
+    finally:
+        connection.close()
+
+
+def schedule_variants(model, pk):
+    """Run ``generate_variants`` on the pool, or inline when ``IMAGE_VARIANT_WORKERS`` is 0."""
+    global _pool
+    if not settings.IMAGE_VARIANT_WORKERS:
+        generate_variants(model, pk)
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants')
+    _pool.submit(_run, model, pk)
+
+
+def image_saved(sender, instance, update_fields=None, **kwargs):
+    image_field, variants_field, _ = IMAGE_FIELDS[sender]
+    if update_fields is not None and image_field not in update_fields:
+        return
+    file = getattr(instance, image_field)
+    variants = getattr(instance, variants_field) or {}
+    if file and variants.get('source') != file.name:
+        transaction.on_commit(lambda: schedule_variants(sender, instance.pk))
+    elif not file and variants:
+        # Image removed: drop the variants too
+        sender.objects.filter(pk=instance.pk).update(**{variants_field: {}})
+        setattr(instance, variants_field, {})
+        transaction.on_commit(lambda: delete_variant_files(file.storage, variants))
+
+
+def image_deleted(sender, instance, **kwargs):
+    image_field, variants_field, _ = IMAGE_FIELDS[sender]
+    variants = getattr(instance, variants_field)
+    if variants:
+        storage = getattr(instance, image_field).storage
+        transaction.on_commit(lambda: delete_variant_files(storage, variants))
+
+
+def connect_signals():
+    for model in IMAGE_FIELDS:
+        uid = f'image_variants_{model._meta.label_lower}'
+        post_save.connect(image_saved, sender=model, dispatch_uid=uid)
+        post_delete.connect(image_deleted, sender=model, dispatch_uid=uid)
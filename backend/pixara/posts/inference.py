@@ -0,0 +1,184 @@
+"""Micro-batching toxicity inference.
+
+Scoring a single comment pays the full TF-IDF + OneVsRest overhead for a
+batch of one. ``ToxicityInferenceService`` queues concurrent requests,
+waits at most ``max_latency`` seconds for more to arrive (or until
+``max_batch_size`` are waiting), and scores the whole batch with one
+vectorized ``predict_proba`` call on a background thread. Per-label
+probabilities are kept in an LRU cache keyed on normalized text, so
+repeated spam costs a dict lookup. Turning scores into labels is left to
+the caller (see ``ml_utils.apply_thresholds``).
+
+The model is obtained through ``model_loader`` on first use, so building
+the service never loads it.
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+
+def normalize_text(text):
+    # The vectorizer lowercases and tokenizes on word boundaries, so case
+    # and whitespace differences never change the prediction
+    return ' '.join(text.lower().split())
+
+
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ToxicityInferenceService:
+    def __init__(self, model_loader, labels, max_batch_size=64, max_latency=0.005, cache_size=10000):
+        self.model_loader = model_loader
+        self.labels = list(labels)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.cache = LRUCache(cache_size)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._requests = 0
+        self._cache_hits = 0
+        self._batches = 0
+        self._predicted = 0
+        self._max_batch = 0
+        self._model_time = 0.0
+
+    def predict(self, text, timeout=None):
+        """Probability row for one comment, batched with whatever else is in flight."""
+        return self.submit(text).result(timeout=timeout)
+
+    def submit(self, text):
+        """Like ``predict``, but returns a ``Future`` (async callers wrap it with ``asyncio.wrap_future``)."""
+        key = normalize_text(text)
+        future = Future()
+        cached = self._cached(key)
+        if cached is not None:
+            future.set_result(cached)
+            return future
+
+        self._ensure_worker()
+        self._queue.put((key, future))
+        return future
+
+    def predict_many(self, texts):
+        """``(len(texts), len(labels))`` probability array, scored in the caller's thread in one pass."""
+        keys = [normalize_text(text) for text in texts]
+        results = {}
+        for key in keys:
+            if key not in results:
+                cached = self._cached(key)
+                if cached is not None:
+                    results[key] = cached
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        if missing:
+            results.update(self._score(missing))
+        if not keys:
+            return np.empty((0, len(self.labels)))
+        return np.vstack([results[key] for key in keys])
+
+    def metrics(self):
+        with self._stats_lock:
+            uptime = time.monotonic() - self._started_at
+            return {
+                'requests': self._requests,
+                'cache_hits': self._cache_hits,
+                'cache_hit_ratio': self._cache_hits / self._requests if self._requests else 0.0,
+                'cache_size': len(self.cache),
+                'batches': self._batches,
+                'predicted': self._predicted,
+                'avg_batch_size': self._predicted / self._batches if self._batches else 0.0,
+                'max_batch_size': self._max_batch,
+                'model_seconds': self._model_time,
+                'throughput_per_second': self._predicted / self._model_time if self._model_time else 0.0,
+                'uptime_seconds': uptime,
+                'queue_depth': self._queue.qsize(),
+            }
+
+    def _cached(self, key):
+        value = self.cache.get(key)
+        with self._stats_lock:
+            self._requests += 1
+            if value is not None:
+                self._cache_hits += 1
+        return value
+
+    def _score(self, keys):
+        started = time.perf_counter()
+        probabilities = np.asarray(self.model_loader().predict_proba(keys), dtype=float)
+        elapsed = time.perf_counter() - started
+        results = {}
+        for key, row in zip(keys, probabilities):
+            # Rows are shared through the cache, so hand out read-only views
+            row.flags.writeable = False
+            results[key] = row
+            self.cache.set(key, row)
+        with self._stats_lock:
+            self._batches += 1
+            self._predicted += len(keys)
+            self._max_batch = max(self._max_batch, len(keys))
+            self._model_time += elapsed
+        return results
+
+    def _ensure_worker(self):
+        # Started on first use rather than at import so forked workers each get their own
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='toxicity-inference', daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            keys = list(dict.fromkeys(key for key, _ in batch))
+            try:
+                results = self._score(keys)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for key, future in batch:
+                future.set_result(results[key])
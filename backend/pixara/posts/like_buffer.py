@@ -0,0 +1,137 @@
+"""Write-behind buffer for likes (``LIKE_WRITE_BEHIND``).
+
+Like and unlike actions are recorded in memory, coalesced per ``(user,
+post)`` so only the last action survives, and a background thread writes
+them every ``LIKE_FLUSH_INTERVAL_MS`` (sooner once ``LIKE_BUFFER_MAX_SIZE``
+are waiting; 0 leaves it to whoever calls ``flush``) with
+``likes.apply_likes``: one transaction per batch instead of one per tap,
+which is what SQLite's single writer needs under load.
+
+Reads go through the buffer too, so a user sees their own actions right
+away: ``feed.viewer_sets`` overlays buffered states on ``is_liked`` and
+``like_deltas`` gives the change every post's ``likes_count`` is still owed.
+A batch stays readable until its transaction has committed.
+
+The buffer is per process: with several workers, read-your-writes holds for
+requests that land on the same worker (sticky sessions), and anything still
+buffered is written when the process exits.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from .models import Post, Like
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._flushing = {}
+        # likes_count changes owed by _pending and by _flushing
+        self._deltas = Counter()
+        self._flushing_deltas = Counter()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._pending) + len(self._flushing)
+
+    def _buffered(self, key):
+        liked = self._pending.get(key)
+        return self._flushing.get(key) if liked is None else liked
+
+    def record(self, user_id, actions):
+        """Buffer ``{post_id: liked}`` for ``user_id``; returns the post ids whose state changed."""
+        stored = dict(Post.objects.filter(pk__in=list(actions))
+                      .annotate(liked=Exists(Like.objects.filter(user_id=user_id, post=OuterRef('pk'))))
+                      .values_list('pk', 'liked'))
+        changed = set()
+        with self._lock:
+            for post_id, liked in actions.items():
+                if post_id not in stored:
+                    continue
+                key = (user_id, post_id)
+                current = self._buffered(key)
+                if current is None:
+                    current = stored[post_id]
+                self._pending[key] = liked
+                if liked != current:
+                    changed.add(post_id)
+                    self._deltas[post_id] += 1 if liked else -1
+            full = len(self._pending) >= settings.LIKE_BUFFER_MAX_SIZE
+        self._start()
+        if full:
+            self._wake.set()
+        return changed
+
+    def liked(self, user_id, post_ids, stored):
+        """``stored`` (the viewer's liked ids among ``post_ids``) with buffered actions applied."""
+        if not (self._pending or self._flushing):
+            return stored
+        liked = set(stored)
+        with self._lock:
+            for post_id in post_ids:
+                buffered = self._buffered((user_id, post_id))
+                if buffered is True:
+                    liked.add(post_id)
+                elif buffered is False:
+                    liked.discard(post_id)
+        return liked
+
+    def like_deltas(self, post_ids):
+        """``{post_id: change}`` still to be added to each post's stored ``likes_count``."""
+        if not (self._deltas or self._flushing_deltas):
+            return {}
+        with self._lock:
+            deltas = {post_id: self._deltas[post_id] + self._flushing_deltas[post_id]
+                      for post_id in post_ids if post_id in self._deltas or post_id in self._flushing_deltas}
+        return {post_id: delta for post_id, delta in deltas.items() if delta}
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of actions written."""
+        from .likes import apply_likes
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+                self._flushing_deltas, self._deltas = self._deltas, Counter()
+            batch = self._flushing
+            try:
+                if batch:
+                    apply_likes(batch)
+            except Exception:
+                logger.exception('Could not write %d buffered likes, will retry', len(batch))
+                with self._lock:
+                    # Put the batch back under anything recorded since
+                    self._pending = {**batch, **self._pending}
+                    self._deltas.update(self._flushing_deltas)
+                    self._flushing, self._flushing_deltas = {}, Counter()
+                return 0
+            with self._lock:
+                self._flushing, self._flushing_deltas = {}, Counter()
+            return len(batch)
+
+    def _start(self):
+        if self._thread is not None or not settings.LIKE_FLUSH_INTERVAL_MS:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='like-buffer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.LIKE_FLUSH_INTERVAL_MS / 1000)
+            self._wake.clear()
+            self.flush()
+            connection.close_if_unusable_or_obsolete()
+
+
+like_buffer = LikeBuffer()
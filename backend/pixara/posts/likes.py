@@ -0,0 +1,96 @@
+"""Idempotent like and unlike.
+
+Each action is one statement that reports the rows it actually changed:
+``INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING`` to like (the
+``SELECT`` skips posts that don't exist) and ``DELETE ... RETURNING`` to
+unlike. A double tap or two racing requests find nothing left to do instead
+of failing on the unique constraint, and ``likes_count`` only moves for
+rows that changed, in one ``UPDATE`` per distinct delta.
+
+These statements send no model signals, so the counter fragments are
+evicted here.
+
+With ``LIKE_WRITE_BEHIND`` the views hand actions to ``like_buffer``
+instead (see ``posts/like_buffer.py``), which writes them with
+``apply_likes`` in the background.
+"""
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from accounts.models import User
+from .fragments import fragment_cache
+from .like_buffer import like_buffer
+from .models import Post, Like
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _insert(user_id, post_ids):
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    return _execute(
+        f'INSERT INTO {Like._meta.db_table} (user_id, post_id, created_at) '
+        f'SELECT %s, id, %s FROM {Post._meta.db_table} WHERE id IN ({placeholders}) '
+        f'ON CONFLICT (user_id, post_id) DO NOTHING RETURNING post_id',
+        [user_id, connection.ops.adapt_datetimefield_value(timezone.now()), *post_ids])
+
+
+def _delete(user_id, post_ids):
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    return _execute(
+        f'DELETE FROM {Like._meta.db_table} WHERE user_id = %s AND post_id IN ({placeholders}) '
+        f'RETURNING post_id',
+        [user_id, *post_ids])
+
+
+def _adjust_likes(deltas):
+    by_delta = defaultdict(list)
+    for post_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(post_id)
+    for delta, post_ids in by_delta.items():
+        Post.objects.filter(pk__in=post_ids).update(likes_count=Greatest(F('likes_count') + delta, 0))
+    if deltas:
+        fragment_cache.invalidate('post_counters', *deltas)
+
+
+def apply_likes(actions):
+    """Write ``{(user_id, post_id): liked}`` in one transaction; returns the changed pairs."""
+    by_user = defaultdict(lambda: ([], []))
+    for (user_id, post_id), liked in actions.items():
+        by_user[user_id][0 if liked else 1].append(post_id)
+    changed, deltas = set(), Counter()
+    with transaction.atomic():
+        # Users deleted since they liked something would fail the foreign key
+        for user_id in User.objects.filter(pk__in=by_user).values_list('pk', flat=True):
+            likes, unlikes = by_user[user_id]
+            for post_id in _insert(user_id, likes) if likes else ():
+                changed.add((user_id, post_id))
+                deltas[post_id] += 1
+            for post_id in _delete(user_id, unlikes) if unlikes else ():
+                changed.add((user_id, post_id))
+                deltas[post_id] -= 1
+        _adjust_likes(deltas)
+    return changed
+
+
+def set_likes(user, actions):
+    """Apply ``{post_id: liked}`` for ``user``; returns the post ids whose state changed.
+
+    Posts that don't exist are ignored.
+    """
+    if settings.LIKE_WRITE_BEHIND:
+        return like_buffer.record(user.pk, actions)
+    likes = [post_id for post_id, liked in actions.items() if liked]
+    unlikes = [post_id for post_id, liked in actions.items() if not liked]
+    with transaction.atomic():
+        liked = _insert(user.pk, likes) if likes else set()
+        unliked = _delete(user.pk, unlikes) if unlikes else set()
+        _adjust_likes({**dict.fromkeys(liked, 1), **dict.fromkeys(unliked, -1)})
+    return liked | unliked
@@ -0,0 +1,177 @@
+import json
+import math
+import platform
+import random
+import time
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+from accounts.models import User, UserProfile
+from monitoring.profiling import QueryTracker
+from posts.models import Post, Like, Comment
+
+COMMENTS = [
+    'What a great shot, love the colours',
+    'This is the worst thing I have seen all week',
+    'Where was this taken?',
+    'You are an idiot and so is everyone who liked this',
+    'Congrats on the new place!',
+]
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main API endpoints through the test client: throughput, latency percentiles, queries'
+
+    # name -> (method, build(self) -> (url, data))
+    ENDPOINTS = {
+        'posts': ('get', lambda self: (reverse('posts'), None)),
+        'explore_posts': ('get', lambda self: (reverse('explore_posts'), None)),
+        'post_detail': ('get', lambda self: (reverse('post_detail', args=[self.pick(self.post_ids)]), None)),
+        'toggle_like': ('post', lambda self: (reverse('toggle_like', args=[self.pick(self.post_ids)]), None)),
+        'follow_user': ('post', lambda self: (reverse('follow_user', args=[self.pick(self.user_ids)]), None)),
+        'get_followers': ('get', lambda self: (reverse('get_followers', args=[self.pick(self.user_ids)]), None)),
+        'classify_comment': ('post', lambda self: (reverse('classify_comment'),
+                                                   {'comment': self.pick(COMMENTS)})),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per endpoint')
+        parser.add_argument('--endpoint', action='append', choices=list(self.ENDPOINTS),
+                            help='Only run these endpoints (repeatable)')
+        parser.add_argument('--user', help='Username to authenticate as (default: the user following most accounts)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.post_ids = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:1000])
+        # Popular accounts are the ones people follow and look up
+        self.user_ids = list(UserProfile.objects.order_by('-followers_count').values_list('user_id', flat=True)[:1000])
+        if not self.post_ids or not self.user_ids:
+            raise CommandError('No data to benchmark against; run seed_data first')
+        viewer = self.get_viewer(options['user'])
+
+        client = APIClient()
+        client.raise_request_exception = False
+        client.force_authenticate(viewer)
+
+        results = []
+        # Writes (likes, follows) are rolled back so runs stay comparable
+        with transaction.atomic():
+            for name in options['endpoint'] or self.ENDPOINTS:
+                results.append(self.run(client, name, options['warmup'], options['requests']))
+            transaction.set_rollback(True)
+
+        report = {
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'likes': Like.objects.count(),
+                'comments': Comment.objects.count(),
+            },
+            'python': platform.python_version(),
+            'requests_per_endpoint': options['requests'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = {r['endpoint']: r for r in json.load(f)['results']}
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(results, baseline)
+
+    def get_viewer(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No user named {username!r}')
+        profile = UserProfile.objects.select_related('user').order_by('-following_count').first()
+        if profile is None:
+            raise CommandError('No users to authenticate as')
+        return profile.user
+
+    def pick(self, values):
+        return self.rng.choice(values)
+
+    def request(self, client, method, url, data):
+        tracker = QueryTracker()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(tracker))
+            if method == 'get':
+                response = client.get(url)
+            else:
+                response = client.post(url, data, format='json')
+        return time.perf_counter() - started, tracker.count, response.status_code
+
+    def run(self, client, name, warmup, requests):
+        method, build = self.ENDPOINTS[name]
+        for _ in range(warmup):
+            self.request(client, method, *build(self))
+
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            seconds, count, status = self.request(client, method, *build(self))
+            latencies.append(seconds * 1000)
+            queries.append(count)
+            errors += status >= 400
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'endpoint': name,
+            'requests': requests,
+            'errors': errors,
+            'seconds': round(elapsed, 4),
+            'throughput_rps': round(requests / elapsed, 2) if elapsed else 0.0,
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+            'queries_mean': round(sum(queries) / len(queries), 2) if queries else 0.0,
+            'queries_max': max(queries, default=0),
+        }
+
+    def print_table(self, results, baseline):
+        header = (f"{'endpoint':<18} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                  f"{'queries':>8} {'errors':>6}")
+        if baseline:
+            header += f" {'Δ req/s':>9} {'Δ p95':>8}"
+        self.stdout.write(header)
+        for r in results:
+            line = (f"{r['endpoint']:<18} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                    f"{r['p99_ms']:>8.2f} {r['queries_mean']:>8.1f} {r['errors']:>6}")
+            before = (baseline or {}).get(r['endpoint'])
+            if before:
+                line += (f" {self.change(before['throughput_rps'], r['throughput_rps']):>9}"
+                         f" {self.change(before['p95_ms'], r['p95_ms']):>8}")
+            self.stdout.write(line)
+
+    @staticmethod
+    def change(before, after):
+        if not before:
+            return 'n/a'
+        return f'{(after - before) / before * 100:+.0f}%'
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import platform
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import User, UserProfile
+from posts.models import Post
+from .bench_api import COMMENTS, percentile
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the read-heavy endpoints under concurrent load, served through the WSGI handler '
+            '(one thread per concurrent request) and the ASGI handler (one event loop)')
+
+    # name -> (method, build(self) -> (url, data))
+    ENDPOINTS = {
+        'posts': ('get', lambda self: (reverse('posts'), None)),
+        'explore_posts': ('get', lambda self: (reverse('explore_posts'), None)),
+        'post_detail': ('get', lambda self: (reverse('post_detail', args=[self.pick(self.post_ids)]), None)),
+        'user_profile': ('get', lambda self: (reverse('user_profile', args=[self.pick(self.user_ids)]), None)),
+        'user_stats': ('get', lambda self: (reverse('user-stats', args=[self.pick(self.user_ids)]), None)),
+        'classify_comment': ('post', lambda self: (reverse('classify_comment'), {'comment': self.pick(COMMENTS)})),
+    }
+    MODES = ('wsgi', 'asgi')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per endpoint and mode')
+        parser.add_argument('--endpoint', action='append', choices=list(self.ENDPOINTS),
+                            help='Only run these endpoints (repeatable)')
+        parser.add_argument('--mode', action='append', choices=self.MODES, help='Only run these modes (repeatable)')
+        parser.add_argument('--user', help='Username to authenticate as (default: the user following most accounts)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        self.rng = random.Random(options['seed'])
+        self.post_ids = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:1000])
+        self.user_ids = list(UserProfile.objects.order_by('-followers_count').values_list('user_id', flat=True)[:1000])
+        if not self.post_ids or not self.user_ids:
+            raise CommandError('No data to benchmark against; run seed_data first')
+        # A real token, so authentication is part of what is measured
+        token = str(RefreshToken.for_user(self.get_viewer(options['user'])).access_token)
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+        results = []
+        for name in options['endpoint'] or self.ENDPOINTS:
+            for mode in options['mode'] or self.MODES:
+                results.append(self.run(name, mode, options['concurrency'], options['warmup'], options['requests']))
+
+        report = {
+            'python': platform.python_version(),
+            'concurrency': options['concurrency'],
+            'requests_per_endpoint': options['requests'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(results)
+
+    def get_viewer(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No user named {username!r}')
+        profile = UserProfile.objects.select_related('user').order_by('-following_count').first()
+        if profile is None:
+            raise CommandError('No users to authenticate as')
+        return profile.user
+
+    def pick(self, values):
+        return self.rng.choice(values)
+
+    def plan(self, name, count):
+        method, build = self.ENDPOINTS[name]
+        return [(method, *build(self)) for _ in range(count)]
+
+    def run_wsgi(self, plan, concurrency):
+        local = threading.local()
+
+        def send(method, url, data):
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False)
+            started = time.perf_counter()
+            if method == 'get':
+                response = local.client.get(url, headers=self.headers)
+            else:
+                response = local.client.post(url, data, content_type='application/json', headers=self.headers)
+            return (time.perf_counter() - started) * 1000, response.status_code
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(lambda request: send(*request), plan))
+
+    async def run_asgi(self, plan, concurrency):
+        client = AsyncClient(raise_request_exception=False)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def send(method, url, data):
+            async with slots:
+                started = time.perf_counter()
+                if method == 'get':
+                    response = await client.get(url, headers=self.headers)
+                else:
+                    response = await client.post(url, data, content_type='application/json',
+                                                 headers=self.headers)
+                return (time.perf_counter() - started) * 1000, response.status_code
+
+        return await asyncio.gather(*(send(*request) for request in plan))
+
+    def send_all(self, mode, plan, concurrency):
+        if mode == 'wsgi':
+            return self.run_wsgi(plan, concurrency)
+        return asyncio.run(self.run_asgi(plan, concurrency))
+
+    def run(self, name, mode, concurrency, warmup, requests):
+        self.send_all(mode, self.plan(name, warmup), concurrency)
+        plan = self.plan(name, requests)
+        started = time.perf_counter()
+        results = self.send_all(mode, plan, concurrency)
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(ms for ms, _ in results)
+        return {
+            'endpoint': name,
+            'mode': mode,
+            'requests': requests,
+            'errors': sum(status >= 400 for _, status in results),
+            'seconds': round(elapsed, 4),
+            'throughput_rps': round(requests / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+        }
+
+    def print_table(self, results):
+        self.stdout.write(f"{'endpoint':<18} {'mode':<5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'errors':>6}")
+        wsgi = {r['endpoint']: r for r in results if r['mode'] == 'wsgi'}
+        for r in results:
+            line = (f"{r['endpoint']:<18} {r['mode']:<5} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.2f} "
+                    f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>6}")
+            before = wsgi.get(r['endpoint'])
+            if r['mode'] == 'asgi' and before and before['throughput_rps']:
+                line += f" {(r['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100:+.0f}%"
+            self.stdout.write(line)
@@ -0,0 +1,114 @@
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter per mode. The parent only sets Django up, then
+# forks workers the way gunicorn does without --preload: each worker imports
+# posts.ml_utils (timed), scores one comment, and once every worker has
+# loaded they all report their proportional set size (PSS). PSS splits
+# shared pages between the processes mapping them, so it is what a worker
+# really costs; a memory-mapped model is shared through the page cache.
+PROBE = r'''
+import json, os, sys, time
+mode, workers, base_dir = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+sys.path.insert(0, base_dir)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pixara.settings')
+os.environ['COMMENT_MODEL_MMAP'] = '1' if mode == 'lazy-mmap' else '0'
+
+def memory_kb(field):
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def worker(ready_fd, go_fd, result_fd):
+    started = time.perf_counter()
+    from posts import ml_utils
+    if mode == 'eager':
+        # What importing ml_utils used to do
+        ml_utils.get_comment_model()
+    import_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    ml_utils.get_comment_model().predict(['a perfectly friendly comment'])
+    first_use_seconds = time.perf_counter() - started
+    os.write(ready_fd, b'.')
+    os.read(go_fd, 1)
+    os.write(result_fd, json.dumps({
+        'import_seconds': import_seconds,
+        'first_use_seconds': first_use_seconds,
+        'rss_kb': memory_kb('Rss'),
+        'pss_kb': memory_kb('Pss'),
+    }).encode())
+
+import django
+django.setup()
+ready_r, ready_w = os.pipe()
+go_r, go_w = os.pipe()
+children = []
+for _ in range(workers):
+    result_r, result_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(go_w)
+        worker(ready_w, go_r, result_w)
+        os._exit(0)
+    os.close(result_w)
+    children.append((pid, result_r))
+
+for _ in range(workers):
+    os.read(ready_r, 1)
+os.close(go_w)
+
+stats = []
+for pid, result_r in children:
+    with os.fdopen(result_r) as f:
+        stats.append(json.loads(f.read()))
+    os.waitpid(pid, 0)
+
+def mean(key):
+    return sum(s[key] for s in stats) / len(stats)
+
+print(json.dumps({
+    'mode': mode,
+    'workers': workers,
+    'import_seconds': mean('import_seconds'),
+    'first_use_seconds': mean('first_use_seconds'),
+    'worker_rss_kb': mean('rss_kb'),
+    'worker_pss_kb': mean('pss_kb'),
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Compare comment model startup latency and per-worker memory: eager vs lazy vs lazy+mmap'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Forked workers per mode')
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def handle(self, *args, **options):
+        results = []
+        for mode in ('eager', 'lazy', 'lazy-mmap'):
+            output = subprocess.run(
+                [sys.executable, '-c', PROBE, mode, str(options['workers']), str(settings.BASE_DIR)],
+                check=True, capture_output=True, text=True, env=os.environ.copy(),
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'mode':<10} {'import ms':>10} {'first use ms':>13} "
+                          f"{'worker RSS MB':>14} {'worker PSS MB':>14}")
+        for r in results:
+            self.stdout.write(
+                f"{r['mode']:<10} {r['import_seconds'] * 1000:>10.1f} {r['first_use_seconds'] * 1000:>13.1f} "
+                f"{r['worker_rss_kb'] / 1024:>14.1f} {r['worker_pss_kb'] / 1024:>14.1f}")
@@ -0,0 +1,114 @@
+import json
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from accounts.models import User, UserProfile
+from posts.fast_serializers import post_rows, serialize_posts
+from posts.feed import feed_queryset, feed_context
+from posts.models import Post, Comment
+from posts.serializers import PostSerializer
+from .bench_api import COMMENTS
+
+
+def drf_page(request, post_ids):
+    posts = list(feed_queryset(Post.objects.filter(id__in=post_ids)))
+    return PostSerializer(posts, many=True, context=feed_context(request, posts)).data
+
+
+def fast_page(request, post_ids):
+    return serialize_posts(list(post_rows(Post.objects.filter(id__in=post_ids))), {'request': request})
+
+
+class Command(BaseCommand):
+    help = ('Benchmark serializing post pages (with their comments) through the DRF serializers '
+            'and through posts.fast_serializers, queries included')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument('--comments-per-post', type=int, default=5,
+                            help='Top posts up to this many visible comments first (rolled back afterwards)')
+        parser.add_argument('--rounds', type=int, default=5, help='Measured passes over the pages')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def handle(self, *args, **options):
+        if options['page_size'] < 1 or options['pages'] < 1 or options['rounds'] < 1:
+            raise CommandError('--page-size, --pages and --rounds must be at least 1')
+        rng = random.Random(options['seed'])
+        post_ids = list(Post.objects.order_by('-created_at', '-id')
+                        .values_list('id', flat=True)[:options['page_size'] * options['pages']])
+        user_ids = list(User.objects.values_list('id', flat=True)[:1000])
+        if not post_ids or not user_ids:
+            raise CommandError('No data to benchmark against; run seed_data first')
+        pages = [post_ids[i:i + options['page_size']] for i in range(0, len(post_ids), options['page_size'])]
+
+        request = RequestFactory().get('/api/posts/')
+        # A viewer who follows people, so the is_following flags aren't all False
+        viewer_id = UserProfile.objects.order_by('-following_count').values_list('user_id', flat=True).first()
+        request.user = User.objects.get(pk=viewer_id or user_ids[0])
+
+        with transaction.atomic():
+            self.add_comments(post_ids, user_ids, options['comments_per_post'], rng)
+            expected = [drf_page(request, page) for page in pages]
+            actual = [fast_page(request, page) for page in pages]
+            identical = all(JSONRenderer().render(a) == JSONRenderer().render(e) for a, e in zip(actual, expected))
+            results = {name: self.measure(build, request, pages, options['rounds'])
+                       for name, build in (('drf', drf_page), ('fast', fast_page))}
+            transaction.set_rollback(True)
+
+        comments = sum(len(post['comments']) for page in expected for post in page)
+        # Every post and comment carries a nested user
+        objects = 2 * (len(post_ids) + comments)
+        for result in results.values():
+            result['posts_per_second'] = round(len(post_ids) / result['seconds_per_pass'], 1)
+            result['objects_per_second'] = round(objects / result['seconds_per_pass'], 1)
+        report = {
+            'page_size': options['page_size'],
+            'pages': len(pages),
+            'posts': len(post_ids),
+            'comments': comments,
+            'objects': objects,
+            'identical': identical,
+            'results': results,
+            'speedup': round(results['drf']['seconds_per_pass'] / results['fast']['seconds_per_pass'], 2),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{report['pages']} pages of {report['page_size']}: {report['posts']} posts, "
+                          f"{report['comments']} comments, {report['objects']} objects; "
+                          f"output identical: {report['identical']}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<6} {result['ms_per_page']:>9.2f} ms/page "
+                              f"{result['posts_per_second']:>10.1f} posts/s "
+                              f"{result['objects_per_second']:>10.1f} objects/s")
+        self.stdout.write(f"speedup {report['speedup']}x")
+
+    def add_comments(self, post_ids, user_ids, per_post, rng):
+        existing = dict.fromkeys(post_ids, 0)
+        for post_id in Comment.objects.filter(post_id__in=post_ids, moderation_status=Comment.Status.VISIBLE) \
+                .values_list('post_id', flat=True):
+            existing[post_id] += 1
+        Comment.objects.bulk_create([
+            Comment(post_id=post_id, user_id=rng.choice(user_ids), content=rng.choice(COMMENTS),
+                    moderation_status=Comment.Status.VISIBLE)
+            for post_id, count in existing.items() for _ in range(per_post - count)
+        ])
+
+    def measure(self, build, request, pages, rounds):
+        # One unmeasured pass so both sides start with warm connections and caches
+        for page in pages:
+            build(request, page)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for page in pages:
+                build(request, page)
+        elapsed = time.perf_counter() - started
+        return {
+            'seconds_per_pass': round(elapsed / rounds, 6),
+            'ms_per_page': round(elapsed / (rounds * len(pages)) * 1000, 3),
+        }
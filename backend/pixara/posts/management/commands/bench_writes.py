@@ -0,0 +1,92 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from accounts.models import User
+from posts.likes import set_likes
+from posts.models import Post, Like, Comment
+from .bench_api import COMMENTS, percentile
+
+
+class Command(BaseCommand):
+    help = ('Benchmark concurrent writes (likes and comments from many threads) against the configured database; '
+            'run once with DATABASE_PROFILE=basic and once without to compare')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=200, help='Writes per thread')
+        parser.add_argument('--comment-ratio', type=float, default=0.2, help='Share of writes that are comments')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1:
+            raise CommandError('--threads must be at least 1')
+        rng = random.Random(options['seed'])
+        users = list(User.objects.values_list('id', flat=True)[:options['threads']])
+        post_ids = list(Post.objects.order_by('-id').values_list('id', flat=True)[:200])
+        if len(users) < options['threads'] or not post_ids:
+            raise CommandError('Not enough data to benchmark against; run seed_data first')
+        # Every like is undone afterwards, so runs leave the data as they found it
+        liked_before = set(Like.objects.filter(user_id__in=users, post_id__in=post_ids)
+                           .values_list('user_id', 'post_id'))
+        # (post, comment text or None for a like, liked)
+        plans = [[(rng.choice(post_ids), rng.choice(COMMENTS) if rng.random() < options['comment_ratio'] else None,
+                   rng.random() < 0.5) for _ in range(options['operations'])] for _ in users]
+        comment_ids, lock = [], threading.Lock()
+
+        def work(user_id, plan):
+            user = User(pk=user_id)
+            latencies, errors = [], 0
+            try:
+                for post_id, content, liked in plan:
+                    started = time.perf_counter()
+                    try:
+                        if content is not None:
+                            comment = Comment.objects.create(user_id=user_id, post_id=post_id, content=content)
+                            with lock:
+                                comment_ids.append(comment.pk)
+                        else:
+                            set_likes(user, {post_id: liked})
+                    except OperationalError:
+                        # "database is locked" and friends
+                        errors += 1
+                        continue
+                    latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['threads']) as pool:
+            results = list(pool.map(work, users, plans))
+        elapsed = time.perf_counter() - started
+
+        Comment.objects.filter(pk__in=comment_ids).delete()
+        for user_id in users:
+            set_likes(User(pk=user_id), {post_id: (user_id, post_id) in liked_before for post_id in post_ids})
+
+        latencies = sorted(ms for thread_latencies, _ in results for ms in thread_latencies)
+        report = {
+            'vendor': connection.vendor,
+            'options': {key: value for key, value in connection.settings_dict['OPTIONS'].items() if key != 'pool'},
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'threads': options['threads'],
+            'operations': options['threads'] * options['operations'],
+            'committed': len(latencies),
+            'errors': sum(errors for _, errors in results),
+            'seconds': round(elapsed, 4),
+            'writes_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for key in ('vendor', 'conn_max_age', 'threads', 'operations', 'committed', 'errors', 'seconds',
+                    'writes_per_second', 'p50_ms', 'p95_ms', 'p99_ms'):
+            self.stdout.write(f'{key:<18} {report[key]}')
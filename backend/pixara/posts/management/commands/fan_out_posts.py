@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from posts.models import Post
+from posts.timeline import fan_out_post
+
+
+class Command(BaseCommand):
+    help = ("Push recent posts to their followers' home timelines again, e.g. after fan-outs failed; "
+            'entries that are already there are left alone')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=60, help='Only posts created this recently')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(minutes=options['minutes'])
+        posts = (Post.objects.filter(created_at__gte=since)
+                 .only('id', 'user_id', 'created_at').order_by('created_at', 'id'))
+        count = 0
+        for post in posts.iterator():
+            fan_out_post(post)
+            count += 1
+        self.stdout.write(f'{count} posts fanned out')
@@ -0,0 +1,22 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from posts.moderation import moderate_all
+
+
+class Command(BaseCommand):
+    help = 'Score pending comments in batches and mark them visible or hidden'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.MODERATION_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new comments instead of exiting when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            moderated = moderate_all(options['batch_size'])
+            if moderated:
+                self.stdout.write(f'Moderated {moderated} comments')
+            if not options['loop']:
+                return
+            time.sleep(settings.MODERATION_POLL_SECONDS)
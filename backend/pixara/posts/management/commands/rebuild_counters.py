@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from accounts.models import UserProfile, Follow
+from posts.fragments import fragment_cache
+from posts.models import Post, Like, Comment
+
+
+def _count(model, fk, outer='pk', **filters):
+    rows = (model.objects.filter(**{fk: OuterRef(outer)}, **filters)
+            .order_by().values(fk).annotate(total=Count('pk')).values('total'))
+    return Coalesce(Subquery(rows), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized like, comment and follower counters that have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many rows have drifted')
+
+    def handle(self, *args, **options):
+        # model, counter, actual value, cached fragment holding the counter and its key
+        targets = [
+            (Post, 'likes_count', _count(Like, 'post'), 'post_counters', 'pk'),
+            (Post, 'comments_count', _count(Comment, 'post', moderation_status=Comment.Status.VISIBLE),
+             'post_counters', 'pk'),
+            (UserProfile, 'followers_count', _count(Follow, 'followee', 'user_id'), 'user_counters', 'user_id'),
+            (UserProfile, 'following_count', _count(Follow, 'follower', 'user_id'), 'user_counters', 'user_id'),
+        ]
+
+        for model, field, actual, fragment, key in targets:
+            drifted = model.objects.annotate(actual=actual).exclude(**{field: F('actual')})
+            if options['dry_run']:
+                fixed = drifted.count()
+            else:
+                # One UPDATE per counter, restricted to the rows that disagree
+                with transaction.atomic():
+                    keys = list(drifted.values_list(key, flat=True))
+                    fixed = model.objects.filter(pk__in=drifted.values('pk')).update(**{field: actual})
+                    fragment_cache.invalidate(fragment, *keys)
+            self.stdout.write(f'{model._meta.label}.{field}: {fixed} drifted')
@@ -0,0 +1,13 @@
+import time
+from django.core.management.base import BaseCommand
+from posts import explore
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached explore rankings for every interest segment (run on a schedule)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        segments = explore.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ranked explore for {len(segments) + 1} segments in {time.perf_counter() - started:.2f}s'))
@@ -0,0 +1,157 @@
+import bisect
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.models import User, UserProfile, Follow
+from posts.models import Post, Like, Comment
+
+PREFIX = 'seed_'
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the given ``auto_now_add`` values instead of overwriting them with now()."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+class PowerLaw:
+    """Draws 0..n-1 with P(i) proportional to (i + 1) ** -exponent, in O(log n) per draw."""
+    def __init__(self, n, exponent, rng):
+        self.cum_weights = list(accumulate((i + 1) ** -exponent for i in range(n)))
+        self.rng = rng
+
+    def draw(self):
+        return bisect.bisect_left(self.cum_weights, self.rng.random() * self.cum_weights[-1])
+
+
+class Command(BaseCommand):
+    help = 'Bulk-insert a large synthetic dataset (users, power-law follower graph, posts, likes, comments)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--likes', type=int, default=10_000_000)
+        parser.add_argument('--comments', type=int, default=1_000_000)
+        parser.add_argument('--follows-per-user', type=int, default=50,
+                            help='Mean number of accounts each user follows')
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='Power-law exponent for popularity of authors, posts and followees')
+        parser.add_argument('--days', type=int, default=365, help='Spread created_at over this many days')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help=f'Delete previously seeded data (users named {PREFIX}*) first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days']).total_seconds()
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=PREFIX).delete()
+            self.stdout.write(f'Deleted {deleted} seeded rows')
+
+        user_ids = self.step('users', self.seed_users, options['users'])
+        if not user_ids:
+            return
+        popular_users = PowerLaw(len(user_ids), options['exponent'], self.rng)
+        self.step('follows', self.seed_follows, user_ids, popular_users, options['follows_per_user'])
+        post_ids = self.step('posts', self.seed_posts, user_ids, popular_users, options['posts'])
+        if post_ids:
+            popular_posts = PowerLaw(len(post_ids), options['exponent'], self.rng)
+            self.step('likes', self.seed_likes, user_ids, post_ids, popular_posts, options['likes'])
+            self.step('comments', self.seed_comments, user_ids, post_ids, popular_posts, options['comments'])
+        self.step('counters', call_command, 'rebuild_counters', stdout=StringIO())
+
+    def step(self, name, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write(f'{name}: {time.perf_counter() - started:.1f}s')
+        return result
+
+    def random_time(self):
+        return self.now - timedelta(seconds=self.rng.random() * self.span)
+
+    def batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def seed_users(self, count):
+        start = User.objects.filter(username__startswith=PREFIX).count()
+        # Hashing is deliberately slow; every seeded user shares one password
+        password = make_password('password')
+        rows = (User(username=f'{PREFIX}{i}', email=f'{PREFIX}{i}@example.com', password=password)
+                for i in range(start, start + count))
+        for batch in self.batches(rows):
+            User.objects.bulk_create(batch)
+        user_ids = list(User.objects.filter(username__startswith=PREFIX).order_by('id').values_list('id', flat=True))
+        missing = (User.objects.filter(username__startswith=PREFIX, userprofile__isnull=True)
+                   .values_list('id', flat=True))
+        for batch in self.batches(UserProfile(user_id=user_id) for user_id in missing.iterator()):
+            UserProfile.objects.bulk_create(batch)
+        return user_ids
+
+    def seed_follows(self, user_ids, popular_users, follows_per_user):
+        def edges():
+            for follower in user_ids:
+                # Out-degree is exponential around the mean, followees are power-law popular
+                wanted = min(int(self.rng.expovariate(1 / follows_per_user)), len(user_ids) - 1)
+                followees = {user_ids[popular_users.draw()] for _ in range(wanted)}
+                followees.discard(follower)
+                for followee in followees:
+                    yield Follow(follower_id=follower, followee_id=followee, created_at=self.random_time())
+
+        with explicit_timestamps(Follow._meta.get_field('created_at')):
+            for batch in self.batches(edges()):
+                Follow.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def seed_posts(self, user_ids, popular_users, count):
+        rows = (Post(user_id=user_ids[popular_users.draw()], caption=f'Seeded post {i}',
+                     created_at=self.random_time())
+                for i in range(count))
+        with explicit_timestamps(Post._meta.get_field('created_at')):
+            for batch in self.batches(rows):
+                Post.objects.bulk_create(batch)
+        post_ids = list(Post.objects.filter(user__username__startswith=PREFIX).values_list('id', flat=True))
+        # Popularity follows list position, so shuffle to spread hot posts across authors and time
+        self.rng.shuffle(post_ids)
+        return post_ids
+
+    def seed_likes(self, user_ids, post_ids, popular_posts, count):
+        rows = (Like(user_id=self.rng.choice(user_ids), post_id=post_ids[popular_posts.draw()],
+                     created_at=self.random_time())
+                for _ in range(count))
+        with explicit_timestamps(Like._meta.get_field('created_at')):
+            for batch in self.batches(rows):
+                # Duplicate (user, post) pairs are dropped, so slightly fewer rows land than requested
+                Like.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def seed_comments(self, user_ids, post_ids, popular_posts, count):
+        rows = (Comment(user_id=self.rng.choice(user_ids), post_id=post_ids[popular_posts.draw()],
+                        content=f'Seeded comment {i}', created_at=self.random_time(),
+                        moderation_status=Comment.Status.VISIBLE)
+                for i in range(count))
+        with explicit_timestamps(Comment._meta.get_field('created_at')):
+            for batch in self.batches(rows):
+                Comment.objects.bulk_create(batch)
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+
+    def count(model_name):
+        rows = (apps.get_model('posts', model_name).objects.filter(post=OuterRef('pk'))
+                .order_by().values('post').annotate(total=Count('pk')).values('total'))
+        return Coalesce(Subquery(rows), 0)
+
+    Post.objects.using(schema_editor.connection.alias).update(likes_count=count('Like'),
+                                                              comments_count=count('Comment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_timeline_entry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='insult_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='moderated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Comments that predate moderation stay visible; new ones start pending
+        migrations.AddField(
+            model_name='comment',
+            name='moderation_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('visible', 'Visible'), ('hidden', 'Hidden')], default='visible', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='moderation_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('visible', 'Visible'), ('hidden', 'Hidden')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='obscene_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='toxic_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['moderation_status', 'id'], name='comment_moderation_queue_idx'),
+        ),
+    ]
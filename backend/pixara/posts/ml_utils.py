@@ -1,11 +1,67 @@
-import joblib, os
+import asyncio, joblib, os, threading
+import numpy as np
+from django.conf import settings
+from .inference import ToxicityInferenceService
 BASE = os.path.dirname(__file__)
 MODEL_PATH=os.path.join(BASE,'ml_models','comment_model.pkl')
-comment_model=joblib.load(MODEL_PATH)
 labels=['toxic','obscene','insult']
+_comment_model=None
+_load_lock=threading.Lock()
+def get_comment_model():
+    # Loaded on first use so migrate & co. never pay for it. With
+    # COMMENT_MODEL_MMAP the numpy arrays (idf weights, coefficients) are
+    # memory-mapped read-only, so forked workers share one physical copy
+    # through the page cache instead of each holding their own.
+    global _comment_model
+    if _comment_model is None:
+        with _load_lock:
+            if _comment_model is None:
+                mmap_mode='r' if settings.COMMENT_MODEL_MMAP else None
+                _comment_model=joblib.load(MODEL_PATH,mmap_mode=mmap_mode)
+    return _comment_model
+def __getattr__(name):
+    # Keeps `ml_utils.comment_model` working without loading at import time
+    if name=='comment_model':
+        return get_comment_model()
+    raise AttributeError(name)
+def warm_up():
+    # One throwaway prediction also pages in the arrays and sklearn's code paths
+    get_comment_model().predict(['warm up'])
+inference_service=ToxicityInferenceService(
+    get_comment_model, labels,
+    max_batch_size=settings.TOXICITY_BATCH_SIZE,
+    max_latency=settings.TOXICITY_BATCH_LATENCY_MS/1000,
+    cache_size=settings.TOXICITY_CACHE_SIZE,
+)
+def thresholds():
+    return np.array([settings.TOXICITY_THRESHOLDS[label] for label in labels])
+def apply_thresholds(probabilities):
+    # Works on one row or a whole (n, len(labels)) batch in a single comparison
+    return (np.asarray(probabilities) >= thresholds()).astype(int)
+def score_comments(texts):
+    # One predict_proba pass for the whole list, then one threshold comparison
+    return format_scores(texts, inference_service.predict_many(texts))
+async def ascore_comments(texts):
+    # A single comment joins the micro-batcher and awaits its future without
+    # holding a thread; a list is scored in one pass on the default executor
+    if len(texts) == 1:
+        probabilities=np.vstack([await asyncio.wrap_future(inference_service.submit(texts[0]))])
+    else:
+        probabilities=await asyncio.get_running_loop().run_in_executor(None, inference_service.predict_many, texts)
+    return format_scores(texts, probabilities)
+def format_scores(texts, probabilities):
+    flags=apply_thresholds(probabilities)
+    return [{
+        'comment': text,
+        'labels': [label for label, flag in zip(labels, row_flags) if flag],
+        'scores': dict(zip(labels, np.round(row, 4).tolist())),
+    } for text, row, row_flags in zip(texts, probabilities, flags)]
+def toxicity_scores(text):
+    return dict(zip(labels, inference_service.predict(text).tolist()))
 def predict_toxicity(text):
-    pred=comment_model.predict([text])[0]
-    return dict(zip(labels,map(int,pred)))
+    return dict(zip(labels, apply_thresholds(inference_service.predict(text)).tolist()))
+def predict_toxicity_batch(texts):
+    return [dict(zip(labels, row)) for row in apply_thresholds(inference_service.predict_many(texts)).tolist()]
 #comment_model = joblib.load(os.path.join(BASE, 'ml/comment_model.pkl'))
 #score_model = joblib.load(os.path.join(BASE, 'ml/score_predictor.pkl'))
 #bot_model = joblib.load(os.path.join(BASE, 'ml/bot_detector.pkl'))
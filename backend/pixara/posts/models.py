@@ -1,26 +1,29 @@
 from django.db import models
 from django.conf import settings
+from accounts.counters import CounterFieldsMixin
 
-class Post(models.Model):
+class Post(CounterFieldsMixin, models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
     caption = models.TextField(max_length=2000, blank=True)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # Resized copies of image, filled in by posts/images.py
+    image_variants = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    counter_fields = ('likes_count', 'comments_count')
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_created_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username}'s post - {self.created_at}"
-    
-    @property
-    def likes_count(self):
-        return self.likes.count()
-    
-    @property
-    def comments_count(self):
-        return self.comments.count()
 
 class Like(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='likes')
@@ -34,14 +37,47 @@ class Like(models.Model):
         return f"{self.user.username} liked {self.post.id}"
 
 class Comment(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        VISIBLE = 'visible'
+        HIDDEN = 'hidden'
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments')
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     content = models.TextField(max_length=500)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Filled in by the moderation worker (posts/moderation.py)
+    moderation_status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    toxic_score = models.FloatField(null=True, blank=True)
+    obscene_score = models.FloatField(null=True, blank=True)
+    insult_score = models.FloatField(null=True, blank=True)
+    moderated_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_id_idx'),
+            models.Index(fields=['moderation_status', 'id'], name='comment_moderation_queue_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} commented on {self.post.id}"
\ No newline at end of file
+        return f"{self.user.username} commented on {self.post.id}"
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    # Copied from the post so timeline pages are a range scan on this table alone
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_created_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in {self.owner_id}'s timeline"
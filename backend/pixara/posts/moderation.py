@@ -0,0 +1,115 @@
+"""Background moderation of new comments.
+
+Comments are saved as ``pending`` and the request returns immediately. The
+``pending`` rows themselves are the queue: a worker claims a batch, scores
+it with one ``predict_proba`` pass through the inference service, and
+flips each comment to ``visible`` or ``hidden`` with its scores stored on
+the row, so no comment is ever scored twice.
+
+``MODERATION_WORKER = 'thread'`` drains the queue from a daemon thread in
+the web process, woken whenever a comment is created. With ``'off'`` nothing
+runs in-process and the ``moderate_comments`` management command (or a test
+calling ``moderate_pending``) serves the queue instead.
+"""
+import logging
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from accounts.counters import adjust_counter
+from search.index import index_objects
+from .fragments import fragment_cache
+from .ml_utils import inference_service, apply_thresholds
+from .models import Post, Comment
+
+logger = logging.getLogger(__name__)
+
+
+def moderate_pending(batch_size=None):
+    """Score one batch of pending comments. Returns how many were moderated."""
+    batch_size = batch_size or settings.MODERATION_BATCH_SIZE
+    with transaction.atomic():
+        pending = Comment.objects.filter(moderation_status=Comment.Status.PENDING).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers drain the queue without claiming the same rows
+            pending = pending.select_for_update(skip_locked=True)
+        batch = list(pending.only('id', 'post_id', 'content')[:batch_size])
+        if not batch:
+            return 0
+
+        probabilities = inference_service.predict_many([comment.content for comment in batch])
+        flagged = apply_thresholds(probabilities).any(axis=1)
+        now = timezone.now()
+        for comment, scores, hidden in zip(batch, probabilities.tolist(), flagged):
+            comment.toxic_score, comment.obscene_score, comment.insult_score = scores
+            comment.moderation_status = Comment.Status.HIDDEN if hidden else Comment.Status.VISIBLE
+            comment.moderated_at = now
+        Comment.objects.bulk_update(batch, ['moderation_status', 'toxic_score', 'obscene_score',
+                                            'insult_score', 'moderated_at'])
+
+        # comments_count only counts comments readers can see
+        approved = Counter(c.post_id for c in batch if c.moderation_status == Comment.Status.VISIBLE)
+        for post_id, count in approved.items():
+            adjust_counter(Post, post_id, 'comments_count', count)
+        # bulk_update sends no signals
+        post_ids = {c.post_id for c in batch}
+        fragment_cache.invalidate('post', *post_ids)
+        fragment_cache.invalidate('post_counters', *post_ids)
+        index_objects(Comment, batch)
+    return len(batch)
+
+
+def moderate_all(batch_size=None):
+    total = 0
+    while True:
+        moderated = moderate_pending(batch_size)
+        if not moderated:
+            return total
+        total += moderated
+
+
+class ModerationWorker:
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def notify(self):
+        self._ensure_running()
+        self._wakeup.set()
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='comment-moderation', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                moderate_all()
+            except Exception:
+                logger.exception('Comment moderation batch failed')
+            finally:
+                connection.close()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def comment_created():
+    """Called after a comment is committed so the worker picks it up."""
+    global _worker
+    if settings.MODERATION_WORKER != 'thread':
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = ModerationWorker(settings.MODERATION_POLL_SECONDS)
+    _worker.notify()
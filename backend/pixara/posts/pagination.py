@@ -0,0 +1,145 @@
+import base64
+from datetime import datetime
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on ``(created_at, id)``, newest first.
+
+    Each page is a range scan on the ``(-created_at, -id)`` index that starts
+    right after the last row of the previous page, so there is no ``COUNT(*)``
+    and no ``OFFSET`` and page 10,000 costs the same as page 1.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._page(list(self._window(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views."""
+        return self._page([obj async for obj in self._window(queryset, request)])
+
+    def _window(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = self.order_queryset(queryset)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = self.filter_after(queryset, position)
+        return queryset[:self.page_size + 1]
+
+    def _page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def order_queryset(self, queryset):
+        return queryset.order_by('-created_at', '-id')
+
+    def filter_after(self, queryset, position):
+        created_at, pk = position
+        # The redundant created_at__lte bounds the index range scan
+        return queryset.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return self.parse_position(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_position(self, raw):
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+
+    def format_position(self, obj):
+        return f'{obj.created_at.isoformat()}|{obj.pk}'
+
+    def encode_cursor(self, obj):
+        return base64.urlsafe_b64encode(self.format_position(obj).encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PostPagination(KeysetPagination):
+    pass
+
+
+class CommentPagination(KeysetPagination):
+    page_size = 20
+
+
+class FollowPagination(KeysetPagination):
+    """Newest follows first over ``Follow`` rows of one follower or followee.
+
+    Served by the ``(follower|followee, -created_at, -id)`` indexes, so deep
+    pages of a huge follower list cost the same as the first.
+    """
+    page_size = 50
+    max_page_size = 200
+
+
+class ExplorePagination(KeysetPagination):
+    """Best first over an in-memory ranked list of ``(score, post_id, ...)`` entries.
+
+    The list is already sorted by score descending, then id; the cursor
+    carries the last entry's exact score (``repr`` round-trips floats).
+    """
+    page_size = 10
+
+    def paginate_ranked(self, entries, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            score, pk = position
+            entries = [entry for entry in entries if entry[0] < score or (entry[0] == score and entry[1] > pk)]
+        self.has_next = len(entries) > self.page_size
+        self.page = entries[:self.page_size]
+        return self.page
+
+    def parse_position(self, raw):
+        score, pk = raw.split('|')
+        return float(score), int(pk)
+
+    def format_position(self, entry):
+        return f'{entry[0]!r}|{entry[1]}'
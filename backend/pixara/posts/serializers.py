@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from accounts.serializers import UserSerializer
+from .images import variant_urls
 from .models import Post, Like, Comment
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -7,31 +8,49 @@ class CommentSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Comment
-        fields = ('id', 'user', 'content', 'created_at', 'updated_at')
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        fields = ('id', 'user', 'content', 'moderation_status', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'moderation_status', 'created_at', 'updated_at')
 
 class PostSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    likes_count = serializers.ReadOnlyField()
-    comments_count = serializers.ReadOnlyField()
     is_liked = serializers.SerializerMethodField()
+    likes_count = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     comments = CommentSerializer(many=True, read_only=True)
     
     class Meta:
         model = Post
-        fields = ('id', 'user', 'caption', 'image', 'created_at', 'updated_at', 
+        fields = ('id', 'user', 'caption', 'image', 'image_variants', 'created_at', 'updated_at', 
                  'likes_count', 'comments_count', 'is_liked', 'comments')
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'likes_count', 'comments_count')
     
     def get_user(self, obj):
         return UserSerializer(obj.user, context=self.context).data
     
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_variants, obj.image.storage, self.context.get('request'))
+    
+    def get_likes_count(self, obj):
+        # Likes still in the write-behind buffer (posts/like_buffer.py)
+        return obj.likes_count + self.context.get('like_deltas', {}).get(obj.id, 0)
+
     def get_is_liked(self, obj):
+        if 'liked_post_ids' in self.context:
+            return obj.id in self.context['liked_post_ids']
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return Like.objects.filter(user=request.user, post=obj).exists()
+            return Like.objects.filter(user_id=request.user.id, post=obj).exists()
         return False
 
+class LikeActionSerializer(serializers.Serializer):
+    post = serializers.IntegerField(min_value=1)
+    action = serializers.ChoiceField(choices=['like', 'unlike'])
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    actions = LikeActionSerializer(many=True, allow_empty=False, max_length=500)
+
+
 class LikeSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
@@ -0,0 +1,1027 @@
+import io
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import User, UserProfile, Follow
+from .models import Post, Like, Comment
+from .timeline import LocMemTimelineBackend, fan_out_post, get_timeline_backend
+from .inference import ToxicityInferenceService
+from .moderation import moderate_pending
+from .fragments import fragment_cache
+from .like_buffer import like_buffer
+from . import explore
+from .fast_serializers import (post_rows, comment_rows, user_rows, follow_rows, serialize_posts,
+                               serialize_comments, serialize_users)
+from .feed import feed_queryset, feed_context
+from .serializers import PostSerializer, CommentSerializer
+from accounts.serializers import UserSerializer
+
+
+def make_user(username):
+    user = User.objects.create(username=username, email=f'{username}@example.com')
+    UserProfile.objects.get_or_create(user=user)
+    return user
+
+
+class FeedQueryCountTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def add_posts(self, count, comments_per_post=3):
+        for i in range(count):
+            author = make_user(f'author{Post.objects.count()}')
+            Follow.objects.create(follower=self.viewer, followee=author)
+            post = Post.objects.create(user=author, caption=f'post {i}')
+            Like.objects.create(user=self.viewer, post=post)
+            for j in range(comments_per_post):
+                commenter = make_user(f'commenter{Comment.objects.count()}')
+                Comment.objects.create(user=commenter, post=post, content=f'comment {j}',
+                                       moderation_status=Comment.Status.VISIBLE)
+        call_command('rebuild_counters', stdout=StringIO())
+
+    def assert_constant_queries(self, url, expected):
+        self.add_posts(2)
+        with self.assertNumQueries(expected):
+            self.client.get(url)
+        self.add_posts(8)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_posts(self):
+        # posts, comments, liked set, following set
+        response = self.assert_constant_queries(reverse('posts'), 4)
+        post = response.data['results'][0]
+        self.assertTrue(post['is_liked'])
+        self.assertTrue(post['user']['is_following'])
+        self.assertEqual(post['likes_count'], 1)
+        self.assertEqual(post['comments_count'], 3)
+        self.assertFalse(post['comments'][0]['user']['is_following'])
+
+    def test_user_posts(self):
+        author = make_user('prolific')
+        for i in range(2):
+            Post.objects.create(user=author, caption=f'first {i}')
+        url = reverse('user_posts', args=[author.id])
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        for i in range(8):
+            Post.objects.create(user=author, caption=f'more {i}')
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_post_detail(self):
+        self.add_posts(1)
+        post = Post.objects.get()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('post_detail', args=[post.id]))
+        self.assertTrue(response.data['is_liked'])
+        self.assertEqual(response.data['comments_count'], 3)
+        # Cached fragments: only the viewer's liked and following sets
+        with self.assertNumQueries(2):
+            cached = self.client.get(reverse('post_detail', args=[post.id]))
+        self.assertEqual(cached.data, response.data)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_pages_cover_every_post_once_with_tied_timestamps(self):
+        posts = [Post.objects.create(user=self.viewer, caption=str(i)) for i in range(7)]
+        # Force ties on created_at so the id tiebreaker has to do the work
+        Post.objects.filter(id__in=[p.id for p in posts[:4]]).update(created_at=posts[0].created_at)
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(reverse('posts') + '?page_size=3'), expected)
+        self.assertEqual(self.walk(reverse('user_posts', args=[self.viewer.id]) + '?page_size=2'), expected)
+
+    def test_comment_listing_is_paginated(self):
+        post = Post.objects.create(user=self.viewer, caption='busy')
+        for i in range(25):
+            Comment.objects.create(user=self.viewer, post=post, content=str(i),
+                                   moderation_status=Comment.Status.VISIBLE)
+        response = self.client.get(reverse('post_comments', args=[post.id]))
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(len(self.walk(reverse('post_comments', args=[post.id]))), 25)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('posts') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice')
+        self.other = make_user('bob')
+        self.post = Post.objects.create(user=self.other, caption='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_like_toggle_updates_counter(self):
+        url = reverse('toggle_like', args=[self.post.id])
+        self.client.post(url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.client.post(url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_comment_create_and_delete_update_counter(self):
+        response = self.client.post(reverse('post_comments', args=[self.post.id]), {'content': 'nice'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        with override_settings(TOXICITY_THRESHOLDS={'toxic': 1.01, 'obscene': 1.01, 'insult': 1.01}):
+            moderate_pending()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.client.delete(reverse('comment_detail', args=[response.data['id']]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_follow_toggle_updates_both_profiles(self):
+        url = reverse('follow_user', args=[self.other.id])
+        self.client.post(url)
+        self.assertEqual(UserProfile.objects.get(user=self.other).followers_count, 1)
+        self.assertEqual(UserProfile.objects.get(user=self.user).following_count, 1)
+        self.client.post(url)
+        self.assertEqual(UserProfile.objects.get(user=self.other).followers_count, 0)
+        self.assertEqual(UserProfile.objects.get(user=self.user).following_count, 0)
+
+    def test_save_does_not_overwrite_counters(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        self.client.post(reverse('toggle_like', args=[self.post.id]))
+        stale.caption = 'edited'
+        stale.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.caption, 'edited')
+        self.assertEqual(self.post.likes_count, 1)
+
+    def test_user_stats_reads_stored_counters(self):
+        Follow.objects.create(follower=self.user, followee=self.other)
+        call_command('rebuild_counters', stdout=StringIO())
+        # profile, then served from the fragment cache
+        with self.assertNumQueries(1):
+            self.client.get(reverse('user-stats', args=[self.other.id]))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('user-stats', args=[self.other.id]))
+        self.assertEqual(response.data, {'followers': 1, 'following': 0})
+
+    def test_rebuild_counters_fixes_drift(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 0))
+        self.assertIn('posts.Post.likes_count: 1 drifted', out.getvalue())
+
+
+class LikeTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice')
+        self.posts = [Post.objects.create(user=make_user(f'author{i}'), caption=f'post {i}') for i in range(3)]
+        self.post = self.posts[0]
+        self.url = reverse('toggle_like', args=[self.post.id])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def likes(self, post):
+        post.refresh_from_db()
+        return post.likes_count, Like.objects.filter(post=post).count()
+
+    def test_like_and_unlike_are_idempotent(self):
+        for _ in range(2):
+            response = self.client.put(self.url)
+            self.assertEqual(response.data['liked'], True)
+            self.assertEqual(self.likes(self.post), (1, 1))
+        for _ in range(2):
+            response = self.client.delete(self.url)
+            self.assertEqual(response.data['liked'], False)
+            self.assertEqual(self.likes(self.post), (0, 0))
+
+    def test_like_is_one_insert_and_one_update(self):
+        with self.assertNumQueries(4):  # savepoint, INSERT ... RETURNING, UPDATE, release
+            self.client.put(self.url)
+        # Already liked: the INSERT finds a conflict, then the post is confirmed to exist
+        with self.assertNumQueries(4):
+            self.client.put(self.url)
+
+    def test_missing_post(self):
+        url = reverse('toggle_like', args=[self.posts[-1].id + 100])
+        for method in (self.client.put, self.client.delete, self.client.post):
+            self.assertEqual(method(url).status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+    def test_like_evicts_cached_counters(self):
+        self.client.get(reverse('post_detail', args=[self.post.id]))
+        self.client.put(self.url)
+        detail = self.client.get(reverse('post_detail', args=[self.post.id])).data
+        self.assertEqual((detail['likes_count'], detail['is_liked']), (1, True))
+
+    def test_batch_applies_the_last_action_per_post(self):
+        Like.objects.create(user=self.user, post=self.posts[2])
+        Post.objects.filter(pk=self.posts[2].pk).update(likes_count=1)
+        actions = [
+            {'post': self.posts[0].id, 'action': 'like'},
+            {'post': self.posts[1].id, 'action': 'like'},
+            {'post': self.posts[1].id, 'action': 'unlike'},
+            {'post': self.posts[2].id, 'action': 'unlike'},
+            {'post': self.posts[0].id, 'action': 'like'},
+            {'post': 999999, 'action': 'like'},
+        ]
+        response = self.client.post(reverse('batch_likes'), {'actions': actions}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'post': self.posts[0].id, 'liked': True, 'changed': True},
+            {'post': self.posts[1].id, 'liked': False, 'changed': False},
+            {'post': self.posts[2].id, 'liked': False, 'changed': True},
+        ])
+        self.assertEqual(response.data['not_found'], [999999])
+        self.assertEqual([self.likes(post) for post in self.posts], [(1, 1), (0, 0), (0, 0)])
+
+        # Replaying the same queue changes nothing
+        response = self.client.post(reverse('batch_likes'), {'actions': actions}, format='json')
+        self.assertFalse(any(result['changed'] for result in response.data['results']))
+        self.assertEqual([self.likes(post) for post in self.posts], [(1, 1), (0, 0), (0, 0)])
+
+    def test_batch_validation(self):
+        url = reverse('batch_likes')
+        self.assertEqual(self.client.post(url, {'actions': []}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'actions': [{'post': 1, 'action': 'love'}]},
+                                          format='json').status_code, 400)
+        too_many = [{'post': 1, 'action': 'like'}] * 501
+        self.assertEqual(self.client.post(url, {'actions': too_many}, format='json').status_code, 400)
+
+
+@override_settings(LIKE_WRITE_BEHIND=True, LIKE_FLUSH_INTERVAL_MS=0)
+class LikeBufferTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+        self.addCleanup(like_buffer.flush)
+        self.user = make_user('alice')
+        self.post = Post.objects.create(user=make_user('bob'), caption='hello')
+        self.url = reverse('toggle_like', args=[self.post.id])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seen(self):
+        detail = self.client.get(reverse('post_detail', args=[self.post.id])).data
+        listed = self.client.get(reverse('posts')).data['results'][0]
+        self.assertEqual((listed['likes_count'], listed['is_liked']), (detail['likes_count'], detail['is_liked']))
+        return detail['likes_count'], detail['is_liked']
+
+    def stored(self):
+        self.post.refresh_from_db()
+        return self.post.likes_count, Like.objects.filter(post=self.post).count()
+
+    def test_reads_see_buffered_likes(self):
+        self.seen()
+        self.assertEqual(self.client.put(self.url).data['liked'], True)
+        self.assertEqual(self.stored(), (0, 0))
+        self.assertEqual(self.seen(), (1, True))
+
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(self.stored(), (1, 1))
+        self.assertEqual(self.seen(), (1, True))
+
+    def test_only_the_last_action_is_written(self):
+        for method in ('put', 'delete', 'put', 'put', 'post', 'post'):
+            getattr(self.client, method)(self.url)
+        self.assertEqual(len(like_buffer), 1)
+        self.assertEqual(self.seen(), (1, True))
+        with self.assertNumQueries(5):  # savepoint, existing users, INSERT, UPDATE, release
+            like_buffer.flush()
+        self.assertEqual(self.stored(), (1, 1))
+
+    def test_buffered_unlike_of_a_stored_like(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=1)
+        self.client.delete(self.url)
+        self.assertEqual(self.seen(), (0, False))
+        like_buffer.flush()
+        self.assertEqual(self.stored(), (0, 0))
+        self.assertEqual(self.seen(), (0, False))
+
+    def test_batch_from_many_users_is_one_transaction(self):
+        fans = [make_user(f'fan{i}') for i in range(5)]
+        for fan in fans:
+            self.client.force_authenticate(fan)
+            self.client.post(reverse('batch_likes'), {'actions': [{'post': self.post.id, 'action': 'like'}]},
+                             format='json')
+        self.assertEqual(self.stored(), (0, 0))
+        self.assertEqual(like_buffer.flush(), 5)
+        self.assertEqual(self.stored(), (5, 5))
+
+
+@override_settings(TIMELINE_BACKEND='posts.timeline.DatabaseTimelineBackend')
+@override_settings(TIMELINE_FANOUT_WORKERS=0)
+class DatabaseTimelineTests(TestCase):
+    def setUp(self):
+        self.reader = make_user('reader')
+        self.author = make_user('author')
+        self.stranger = make_user('stranger')
+        self.client = APIClient()
+
+    def as_user(self, user):
+        self.client.force_authenticate(user)
+        return self.client
+
+    def follow(self, follower, followee):
+        self.as_user(follower).post(reverse('follow_user', args=[followee.id]))
+
+    def publish(self, user, caption):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.as_user(user).post(reverse('posts'), {'caption': caption}).data['id']
+
+    def home(self, user, query=''):
+        return [post['id'] for post in self.as_user(user).get(reverse('home_feed') + query).data['results']]
+
+    def test_new_posts_fan_out_to_followers_only(self):
+        self.follow(self.reader, self.author)
+        post_id = self.publish(self.author, 'hello')
+        stranger_post = self.publish(self.stranger, 'not followed')
+        self.assertEqual(self.home(self.reader), [post_id])
+        self.assertEqual(self.home(self.author), [post_id])
+        self.assertEqual(self.home(self.stranger), [stranger_post])
+
+    def test_followers_are_fanned_out_to_after_commit(self):
+        self.follow(self.reader, self.author)
+        with self.captureOnCommitCallbacks() as callbacks:
+            post_id = self.as_user(self.author).post(reverse('posts'), {'caption': 'hello'}).data['id']
+        # The author sees their post at once; followers once the fan-out has run
+        self.assertEqual(self.home(self.author), [post_id])
+        self.assertEqual(self.home(self.reader), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.home(self.reader), [post_id])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        older = [self.publish(self.author, str(i)) for i in range(3)]
+        self.follow(self.reader, self.author)
+        self.assertEqual(self.home(self.reader), older[::-1])
+        self.follow(self.reader, self.author)
+        self.assertEqual(self.home(self.reader), [])
+
+    @override_settings(TIMELINE_CELEBRITY_THRESHOLD=1)
+    def test_celebrity_posts_are_merged_on_read(self):
+        self.follow(self.reader, self.author)
+        post_id = self.publish(self.author, 'famous')
+        self.assertEqual(get_timeline_backend().read(self.reader.id), [])
+        self.assertEqual(self.home(self.reader), [post_id])
+
+    @override_settings(TIMELINE_MAX_LENGTH=3)
+    def test_timelines_are_bounded(self):
+        self.follow(self.reader, self.author)
+        posts = [self.publish(self.author, str(i)) for i in range(5)]
+        self.assertEqual(get_timeline_backend().read(self.reader.id, limit=10), posts[:1:-1])
+
+    def test_home_feed_pages_with_cursor(self):
+        self.follow(self.reader, self.author)
+        posts = [self.publish(self.author, str(i)) for i in range(5)]
+        seen, url = [], reverse('home_feed') + '?page_size=2'
+        while url:
+            response = self.as_user(self.reader).get(url)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, posts[::-1])
+
+
+@override_settings(TIMELINE_BACKEND='posts.timeline.LocMemTimelineBackend')
+class LocMemTimelineTests(DatabaseTimelineTests):
+    def setUp(self):
+        super().setUp()
+        get_timeline_backend().clear()
+
+
+class FlakyTimelineBackend(LocMemTimelineBackend):
+    """Fails the next ``failures`` pushes to followers, as a locked database would."""
+    failures = 0
+
+    def push(self, post, owner_ids):
+        owner_ids = list(owner_ids)
+        if owner_ids != [post.user_id] and FlakyTimelineBackend.failures:
+            FlakyTimelineBackend.failures -= 1
+            raise OperationalError('database table is locked')
+        super().push(post, owner_ids)
+
+
+@override_settings(TIMELINE_BACKEND='posts.tests.FlakyTimelineBackend', TIMELINE_FANOUT_WORKERS=0,
+                   TIMELINE_FANOUT_ATTEMPTS=3, TIMELINE_FANOUT_RETRY_SECONDS=0)
+class FanOutRetryTests(TestCase):
+    def setUp(self):
+        self.reader = make_user('reader')
+        self.author = make_user('author')
+        Follow.objects.create(follower=self.reader, followee=self.author)
+        self.post = Post.objects.create(user=self.author, caption='hello')
+        self.addCleanup(setattr, FlakyTimelineBackend, 'failures', 0)
+        get_timeline_backend().clear()
+
+    def test_failed_attempts_are_retried(self):
+        FlakyTimelineBackend.failures = 2
+        with self.assertLogs('posts.timeline', 'WARNING') as logs:
+            fan_out_post(self.post)
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(get_timeline_backend().read(self.reader.id), [self.post.id])
+
+    def test_posts_that_ran_out_of_attempts_are_backfilled(self):
+        FlakyTimelineBackend.failures = 3
+        with self.assertLogs('posts.timeline', 'WARNING'), self.assertRaises(OperationalError):
+            fan_out_post(self.post)
+        self.assertEqual(get_timeline_backend().read(self.reader.id), [])
+        call_command('fan_out_posts', stdout=StringIO())
+        call_command('fan_out_posts', stdout=StringIO())
+        self.assertEqual(get_timeline_backend().read(self.reader.id), [self.post.id])
+
+
+class CountingModel:
+    """Stands in for the comment pipeline: texts containing 'idiot' score high."""
+    def __init__(self):
+        self.calls = []
+
+    def predict_proba(self, texts):
+        self.calls.append(list(texts))
+        return [[0.9, 0.1, 0.7] if 'idiot' in text else [0.2, 0.05, 0.1] for text in texts]
+
+
+class InferenceServiceTests(TestCase):
+    def setUp(self):
+        self.model = CountingModel()
+        self.service = ToxicityInferenceService(lambda: self.model, ['toxic', 'obscene', 'insult'],
+                                                max_batch_size=8, max_latency=0.2)
+
+    def test_concurrent_requests_share_one_predict_call(self):
+        results = {}
+        barrier = threading.Barrier(8)
+
+        def score(i):
+            barrier.wait()
+            results[i] = self.service.predict(f'comment {i} idiot' if i % 2 else f'comment {i}')
+
+        threads = [threading.Thread(target=score, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(len(self.model.calls), 8)
+        self.assertEqual(results[1].tolist(), [0.9, 0.1, 0.7])
+        self.assertEqual(results[2].tolist(), [0.2, 0.05, 0.1])
+        self.assertEqual(self.service.metrics()['predicted'], 8)
+
+    def test_repeated_text_is_served_from_cache(self):
+        self.service.predict('You  IDIOT')
+        self.assertEqual(self.service.predict('you idiot').tolist(), [0.9, 0.1, 0.7])
+        self.assertEqual(len(self.model.calls), 1)
+        self.assertEqual(self.service.metrics()['cache_hits'], 1)
+
+    def test_predict_many_is_one_vectorized_call(self):
+        results = self.service.predict_many(['a', 'idiot', 'A', 'b'])
+        self.assertEqual(self.model.calls, [['a', 'idiot', 'b']])
+        self.assertEqual(results.shape, (4, 3))
+        self.assertEqual(results[:, 0].tolist(), [0.2, 0.9, 0.2, 0.2])
+
+
+class CommentToxicityTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alice')
+        self.post = Post.objects.create(user=self.user, caption='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_classify_comment(self):
+        response = self.client.post(reverse('classify_comment'), {'comment': 'nice photo'})
+        self.assertEqual(set(response.data['scores']), {'toxic', 'obscene', 'insult'})
+        self.assertTrue(all(0 <= score <= 1 for score in response.data['scores'].values()))
+
+    def test_classify_comment_batch(self):
+        comments = ['nice photo', 'you idiot trash person', 'great day']
+        response = self.client.post(reverse('classify_comment'), {'comments': comments}, format='json')
+        self.assertEqual([r['comment'] for r in response.data['results']], comments)
+
+    def test_labels_follow_configured_thresholds(self):
+        with override_settings(TOXICITY_THRESHOLDS={'toxic': 0.0, 'obscene': 1.01, 'insult': 1.01}):
+            response = self.client.post(reverse('classify_comment'), {'comment': 'nice photo'})
+        self.assertEqual(response.data['labels'], ['toxic'])
+
+    def test_classify_comment_batch_rejects_bad_input(self):
+        response = self.client.post(reverse('classify_comment'), {'comments': ['ok', '']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+
+class ModerationTests(TestCase):
+    def setUp(self):
+        self.author = make_user('alice')
+        self.reader = make_user('bob')
+        self.post = Post.objects.create(user=self.author, caption='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def comment(self, content):
+        response = self.client.post(reverse('post_comments', args=[self.post.id]), {'content': content})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['moderation_status'], 'pending')
+        return Comment.objects.get(id=response.data['id'])
+
+    def listing(self, user):
+        self.client.force_authenticate(user)
+        return [c['id'] for c in self.client.get(reverse('post_comments', args=[self.post.id])).data['results']]
+
+    @override_settings(TOXICITY_THRESHOLDS={'toxic': 0.0, 'obscene': 1.01, 'insult': 1.01})
+    def test_flagged_comments_are_hidden_with_scores(self):
+        comment = self.comment('anything at all')
+        self.assertEqual(moderate_pending(), 1)
+        comment.refresh_from_db()
+        self.assertEqual(comment.moderation_status, Comment.Status.HIDDEN)
+        self.assertIsNotNone(comment.toxic_score)
+        self.assertIsNotNone(comment.moderated_at)
+        self.assertEqual(self.listing(self.author), [comment.id])
+        self.assertEqual(self.listing(self.reader), [])
+
+    @override_settings(TOXICITY_THRESHOLDS={'toxic': 1.01, 'obscene': 1.01, 'insult': 1.01})
+    def test_clean_comments_become_visible_once(self):
+        comments = [self.comment(f'lovely {i}') for i in range(3)]
+        self.assertEqual(self.listing(self.reader), [])
+        self.assertEqual(moderate_pending(batch_size=10), 3)
+        self.assertEqual(moderate_pending(batch_size=10), 0)
+        self.assertEqual(sorted(self.listing(self.reader)), sorted(c.id for c in comments))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+
+    @override_settings(TOXICITY_THRESHOLDS={'toxic': 1.01, 'obscene': 1.01, 'insult': 1.01})
+    def test_edited_comment_is_moderated_again(self):
+        comment = self.comment('first version')
+        moderate_pending()
+        self.client.put(reverse('comment_detail', args=[comment.id]), {'content': 'second version'})
+        comment.refresh_from_db()
+        self.assertEqual(comment.moderation_status, Comment.Status.PENDING)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_unmoderated_comments_are_not_found_by_others(self):
+        pending = self.comment('not scored yet')
+        hidden = self.comment('anything at all')
+        Comment.objects.filter(id=hidden.id).update(moderation_status=Comment.Status.HIDDEN)
+        for comment in (pending, hidden):
+            url = reverse('comment_detail', args=[comment.id])
+            self.client.force_authenticate(self.author)
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.client.force_authenticate(self.reader)
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(Comment.objects.count(), 2)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+        self.author = make_user('alice')
+        self.reader = make_user('bob')
+        self.post = Post.objects.create(user=self.author, caption='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def detail(self):
+        return self.client.get(reverse('post_detail', args=[self.post.id])).data
+
+    def test_like_refreshes_counters_but_keeps_the_body(self):
+        self.detail()
+        self.client.post(reverse('toggle_like', args=[self.post.id]))
+        hits = fragment_cache.metrics()['fragments']['post']['hits']
+        post = self.detail()
+        self.assertEqual(post['likes_count'], 1)
+        self.assertTrue(post['is_liked'])
+        self.assertEqual(fragment_cache.metrics()['fragments']['post']['hits'], hits + 1)
+
+    def test_media_urls_use_each_requests_host(self):
+        variants = {'source': 'posts/a.jpg', 'thumb': {'webp': 'posts/a.webp', 'jpeg': 'posts/a.jpeg',
+                                                       'width': 150, 'height': 100}}
+        # update() rather than save(): no variant generation for files that don't exist
+        Post.objects.filter(pk=self.post.pk).update(image='posts/a.jpg', image_variants=variants)
+        User.objects.filter(pk=self.author.pk).update(profile_picture='profiles/a.jpg')
+        url = reverse('post_detail', args=[self.post.id])
+        # The first request to miss the cache sends a forged Host header
+        self.assertEqual(self.client.get(url, HTTP_HOST='evil.example').status_code, 200)
+        post = self.client.get(url).data
+        self.assertEqual(post['image'], 'http://testserver/media/posts/a.jpg')
+        self.assertEqual(post['image_variants']['thumb']['webp'], 'http://testserver/media/posts/a.webp')
+        self.assertEqual(post['image_variants']['thumb']['width'], 150)
+        self.assertEqual(post['user']['profile_picture'], 'http://testserver/media/profiles/a.jpg')
+
+    @override_settings(TOXICITY_THRESHOLDS={'toxic': 1.01, 'obscene': 1.01, 'insult': 1.01})
+    def test_moderated_comment_appears(self):
+        self.assertEqual(self.detail()['comments'], [])
+        self.client.post(reverse('post_comments', args=[self.post.id]), {'content': 'nice'})
+        moderate_pending()
+        post = self.detail()
+        self.assertEqual([c['content'] for c in post['comments']], ['nice'])
+        self.assertEqual(post['comments_count'], 1)
+
+    def test_profile_edit_updates_embedded_author(self):
+        self.detail()
+        self.author.bio = 'new bio'
+        self.author.save()
+        self.assertEqual(self.detail()['user']['bio'], 'new bio')
+
+    def test_follow_updates_profile_and_stats(self):
+        self.assertFalse(self.client.get(reverse('user_profile', args=[self.author.id])).data['user']['is_following'])
+        self.client.get(reverse('user-stats', args=[self.author.id]))
+        self.client.post(reverse('follow_user', args=[self.author.id]))
+        profile = self.client.get(reverse('user_profile', args=[self.author.id])).data
+        self.assertTrue(profile['user']['is_following'])
+        self.assertEqual(profile['profile']['followers_count'], 1)
+        stats = self.client.get(reverse('user-stats', args=[self.author.id])).data
+        self.assertEqual(stats, {'followers': 1, 'following': 0})
+
+    def test_rename_evicts_old_username(self):
+        url = reverse('resolve_user_id', args=['alice'])
+        self.assertEqual(self.client.get(url).data, {'id': self.author.id})
+        self.author.username = 'alicia'
+        self.author.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('resolve_user_id', args=['alicia'])).data, {'id': self.author.id})
+
+    def test_missing_objects(self):
+        self.assertEqual(self.client.get(reverse('post_detail', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('user_profile', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('user-stats', args=[999])).status_code, 404)
+
+    def test_metrics_are_admin_only(self):
+        self.detail()
+        self.detail()
+        self.assertEqual(self.client.get(reverse('cache_metrics')).status_code, 403)
+        self.reader.is_staff = True
+        self.reader.save()
+        metrics = self.client.get(reverse('cache_metrics')).data
+        self.assertEqual(metrics['backend'], 'LocMemCache')
+        self.assertGreater(metrics['fragments']['post']['hit_ratio'], 0)
+
+
+def make_image(size=(2000, 1500), fmt='JPEG', mode='RGB', name='photo.jpg'):
+    image = Image.new(mode, size, 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'CameraMaker'
+    out = io.BytesIO()
+    image.save(out, fmt, **({'exif': exif} if fmt == 'JPEG' else {}))
+    return SimpleUploadedFile(name, out.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class ExploreTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+        self.now = timezone.now()
+        self.viewer = make_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def author(self, username, interests=''):
+        user = make_user(username)
+        user.interests = interests
+        user.save()
+        return user
+
+    def post(self, author, caption, hours_ago=1):
+        # Same age for every post, so only the features under test differ
+        post = Post.objects.create(user=author, caption=caption)
+        Post.objects.filter(pk=post.pk).update(created_at=self.now - timedelta(hours=hours_ago))
+        return post
+
+    def explore(self, **params):
+        response = self.client.get(reverse('explore_posts'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ranked_captions(self):
+        explore.refresh()
+        return [post['caption'] for post in self.explore()['results']]
+
+    def test_skips_own_and_followed_posts(self):
+        followed = self.author('friend')
+        Follow.objects.create(follower=self.viewer, followee=followed)
+        self.post(followed, 'friend')
+        self.post(self.viewer, 'mine')
+        self.post(self.author('stranger'), 'stranger')
+        self.assertEqual(self.ranked_captions(), ['stranger'])
+
+    def test_recent_engagement_wins(self):
+        author = self.author('author')
+        self.post(author, 'quiet')
+        busy = self.post(author, 'busy')
+        self.assertEqual(self.ranked_captions(), ['quiet', 'busy'])
+        for i in range(3):
+            Like.objects.create(user=make_user(f'fan{i}'), post=busy)
+        self.assertEqual(self.ranked_captions(), ['busy', 'quiet'])
+        # Toxic comment threads sink the post
+        for i in range(3):
+            Comment.objects.create(user=author, post=busy, content='...', toxic_score=0.99,
+                                   moderation_status=Comment.Status.HIDDEN)
+        self.assertEqual(self.ranked_captions(), ['quiet', 'busy'])
+
+    def test_old_posts_decay(self):
+        author = self.author('author')
+        old = self.post(author, 'old', hours_ago=30)
+        Like.objects.create(user=make_user('fan'), post=old)
+        self.post(author, 'new')
+        self.assertEqual(self.ranked_captions(), ['new', 'old'])
+        Post.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(self.ranked_captions(), ['new'])
+
+    def test_shared_interests_rank_higher(self):
+        self.post(self.author('cook', 'Food'), 'food')
+        self.post(self.author('hiker', 'travel, Hiking'), 'travel')
+        self.assertEqual(self.ranked_captions(), ['food', 'travel'])
+        self.viewer.interests = 'hiking'
+        self.viewer.save()
+        self.assertEqual(self.ranked_captions(), ['travel', 'food'])
+
+    def test_pages_through_ranking(self):
+        author = self.author('author')
+        posts = [self.post(author, f'post {i}') for i in range(5)]
+        explore.refresh()
+        seen, url, params = [], reverse('explore_posts'), {'page_size': 2}
+        while url:
+            data = self.client.get(url, params).data
+            seen += [post['id'] for post in data['results']]
+            url, params = data['next'], {}
+        self.assertEqual(seen, [post.id for post in posts])
+
+    def test_requests_read_the_cached_ranking(self):
+        author = self.author('author')
+        for i in range(3):
+            Post.objects.create(user=author, caption=f'post {i}')
+        explore.refresh()
+        self.explore()
+        # Followed authors, then the viewer's likes and follows for the page
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self.explore()['results']), 3)
+
+    def test_refresh_command(self):
+        self.author('cook', 'food')
+        out = StringIO()
+        call_command('refresh_explore', stdout=out)
+        self.assertIn('2 segments', out.getvalue())
+
+
+class FastSerializerParityTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        variants = {'source': 'x.jpg', 'thumb': {'webp': 'v/thumb.webp', 'jpeg': 'v/thumb.jpg', 'width': 150,
+                                                 'height': 100}}
+        self.viewer = make_user('viewer')
+        self.author = make_user('author')
+        User.objects.filter(pk=self.author.pk).update(
+            bio='Hi "there"\n', profile_picture='profile_pictures/a.jpg', profile_picture_variants=variants)
+        Follow.objects.create(follower=self.viewer, followee=self.author)
+        for i in range(3):
+            post = Post.objects.create(user=self.author, caption=f'caption {i} ✓', image='posts/p.jpg' if i else None,
+                                       image_variants=variants if i else {})
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(minutes=i), likes_count=i)
+            for j, user in enumerate([self.viewer, self.author]):
+                comment = Comment.objects.create(post=post, user=user, content=f'comment {j}',
+                                                 moderation_status=Comment.Status.VISIBLE)
+                Comment.objects.filter(pk=comment.pk).update(created_at=now - timedelta(minutes=i, seconds=j))
+            Comment.objects.create(post=post, user=self.author, content='pending')
+        Like.objects.create(user=self.viewer, post=Post.objects.first())
+        self.request = RequestFactory().get('/')
+        self.request.user = self.viewer
+
+    def assertSameJSON(self, expected, actual):
+        self.assertTrue(expected)
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_posts(self):
+        posts = Post.objects.order_by('-created_at', '-id')
+        expected = PostSerializer(list(feed_queryset(posts)), many=True,
+                                  context=feed_context(self.request, list(feed_queryset(posts)))).data
+        self.assertSameJSON(expected, serialize_posts(list(post_rows(posts)), {'request': self.request}))
+        with timezone.override('America/New_York'):
+            expected = PostSerializer(list(feed_queryset(posts)), many=True).data
+            self.assertSameJSON(expected, serialize_posts(list(post_rows(posts)), {}))
+
+    def test_comments_and_users(self):
+        comments = Comment.objects.filter(post__in=Post.objects.all())
+        self.assertSameJSON(CommentSerializer(comments, many=True).data,
+                            serialize_comments(list(comment_rows(comments)), {}))
+        users = User.objects.order_by('id')
+        self.assertSameJSON(UserSerializer(users, many=True, context={'request': self.request}).data,
+                            serialize_users(list(user_rows(users)), {'request': self.request}))
+        edges = Follow.objects.filter(follower=self.viewer)
+        self.assertSameJSON(UserSerializer([edge.followee for edge in edges], many=True).data,
+                            serialize_users(list(follow_rows(edges, 'followee')), {}, start=2))
+
+
+@override_settings(IMAGE_VARIANT_WORKERS=0, TIMELINE_FANOUT_WORKERS=0)
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = make_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_post(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('posts'), {'caption': 'hi', 'image': image}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.get(id=response.data['id'])
+
+    def test_variants_are_resized_and_stripped(self):
+        post = self.create_post(make_image())
+        variants = post.image_variants
+        self.assertEqual(variants['source'], post.image.name)
+        self.assertEqual(variants['thumb']['width'], 150)
+        self.assertAlmostEqual(variants['thumb']['height'], 112, delta=1)
+        self.assertEqual(variants['feed']['width'], 640)
+        self.assertEqual(variants['full']['width'], 1440)
+        for ext, fmt in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            with post.image.storage.open(variants['feed'][ext]) as f:
+                image = Image.open(f)
+                self.assertEqual(image.format, fmt)
+                self.assertEqual(len(image.getexif()), 0)
+
+        data = self.client.get(reverse('post_detail', args=[post.id])).data
+        self.assertTrue(data['image_variants']['thumb']['webp'].startswith('http://testserver/media/'))
+
+    def test_small_images_are_not_upscaled(self):
+        post = self.create_post(make_image((100, 80), fmt='PNG', mode='RGBA', name='icon.png'))
+        self.assertEqual((post.image_variants['full']['width'], post.image_variants['full']['height']), (100, 80))
+
+    def test_replacing_and_removing_the_image(self):
+        post = self.create_post(make_image())
+        old = post.image_variants['thumb']['webp']
+        storage = post.image.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('post_detail', args=[post.id]), {'image': make_image((800, 800))},
+                            format='multipart')
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants['source'], post.image.name)
+        self.assertEqual(post.image_variants['full']['width'], 800)
+        self.assertFalse(storage.exists(old))
+
+        current = post.image_variants['thumb']['webp']
+        with self.captureOnCommitCallbacks(execute=True):
+            post.image = None
+            post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, {})
+        self.assertFalse(storage.exists(current))
+
+    def test_profile_picture_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('profile'), {'profile_picture': make_image((400, 400))}, format='multipart')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_variants['thumb']['width'], 150)
+        data = self.client.get(reverse('user_profile', args=[self.user.id])).data
+        self.assertIn('thumb', data['user']['profile_picture_variants'])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+        self.author = make_user('alice')
+        self.reader = make_user('bob')
+        self.post = Post.objects.create(user=self.author, caption='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_requires_a_token(self):
+        response = APIClient().get(reverse('posts'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+    def test_rejects_other_methods(self):
+        response = self.client.patch(reverse('post_detail', args=[self.post.id]))
+        self.assertEqual(response.status_code, 405)
+
+    def test_missing_post(self):
+        response = self.client.get(reverse('post_detail', args=[self.post.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_writes_still_work(self):
+        response = self.client.delete(reverse('post_detail', args=[self.post.id]))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(reverse('posts'), {'caption': 'mine'})
+        self.assertEqual(response.status_code, 201)
+
+    async def test_served_by_the_asgi_handler(self):
+        token = str(RefreshToken.for_user(self.reader).access_token)
+        client, headers = AsyncClient(), {'Authorization': f'Bearer {token}'}
+        response = await client.get(reverse('user_profile', args=[self.author.id]), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['username'], 'alice')
+        self.assertFalse(response.json()['user']['is_following'])
+        response = await client.get(reverse('user-stats', args=[self.author.id]), headers=headers)
+        self.assertEqual(response.json(), {'followers': 0, 'following': 0})
+        response = await client.post(reverse('classify_comment'), {'comments': ['nice photo', 'great day']},
+                                     content_type='application/json', headers=headers)
+        self.assertEqual(len(response.json()['results']), 2)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_data(self):
+        call_command('seed_data', users=30, posts=60, likes=300, comments=40, follows_per_user=5,
+                     batch_size=25, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(UserProfile.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertTrue(0 < Like.objects.count() <= 300)
+        # Timestamps are spread out rather than all set to now()
+        self.assertGreater(Post.objects.values('created_at').distinct().count(), 1)
+        # Counters were rebuilt after the bulk inserts
+        post = Post.objects.order_by('-likes_count').first()
+        self.assertEqual(post.likes_count, post.likes.count())
+        profile = UserProfile.objects.order_by('-followers_count').first()
+        self.assertEqual(profile.followers_count, Follow.objects.filter(followee_id=profile.user_id).count())
+
+    def test_bench_api_reports_every_endpoint_and_rolls_back(self):
+        call_command('seed_data', users=10, posts=20, likes=50, comments=10, follows_per_user=3,
+                     stdout=StringIO())
+        likes = Like.objects.count()
+        out = StringIO()
+        call_command('bench_api', requests=3, warmup=1, json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        results = {r['endpoint']: r for r in report['results']}
+        self.assertEqual(set(results), {'posts', 'explore_posts', 'post_detail', 'toggle_like',
+                                        'follow_user', 'get_followers', 'classify_comment'})
+        self.assertEqual(results['posts']['requests'], 3)
+        self.assertEqual(results['posts']['errors'], 0)
+        self.assertGreater(results['posts']['queries_mean'], 0)
+        self.assertEqual(report['dataset']['posts'], 20)
+        self.assertEqual(Like.objects.count(), likes)
+
+    def test_bench_serializers_compares_output_and_rolls_back(self):
+        call_command('seed_data', users=10, posts=20, likes=50, comments=10, follows_per_user=3,
+                     stdout=StringIO())
+        comments = Comment.objects.count()
+        out = StringIO()
+        call_command('bench_serializers', page_size=10, pages=2, comments_per_post=2, rounds=1, json=True,
+                     stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertTrue(report['identical'])
+        self.assertEqual(report['posts'], 20)
+        self.assertGreaterEqual(report['comments'], 40)
+        self.assertEqual(set(report['results']), {'drf', 'fast'})
+        self.assertGreater(report['results']['fast']['objects_per_second'], 0)
+        self.assertEqual(Comment.objects.count(), comments)
+
+
+class ConcurrencyBenchmarkTests(TransactionTestCase):
+    # Worker threads use their own connections, so the data has to be committed
+    def setUp(self):
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+
+    def test_bench_concurrency_runs_both_handlers(self):
+        call_command('seed_data', users=10, posts=20, likes=50, comments=10, follows_per_user=3,
+                     stdout=StringIO())
+        out = StringIO()
+        call_command('bench_concurrency', requests=6, warmup=1, concurrency=3, json=True,
+                     endpoint=['post_detail', 'user_stats'], stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual([(r['endpoint'], r['mode']) for r in report['results']],
+                         [('post_detail', 'wsgi'), ('post_detail', 'asgi'),
+                          ('user_stats', 'wsgi'), ('user_stats', 'asgi')])
+        self.assertTrue(all(r['errors'] == 0 and r['requests'] == 6 for r in report['results']))
+
+    def test_bench_writes_leaves_the_data_as_it_was(self):
+        call_command('seed_data', users=10, posts=20, likes=50, comments=10, follows_per_user=3,
+                     stdout=StringIO())
+        likes, comments = set(Like.objects.values_list('user_id', 'post_id')), Comment.objects.count()
+        out = StringIO()
+        call_command('bench_writes', threads=2, operations=10, json=True, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['operations'], 20)
+        self.assertEqual(report['committed'] + report['errors'], 20)
+        self.assertEqual(set(Like.objects.values_list('user_id', 'post_id')), likes)
+        self.assertEqual(Comment.objects.count(), comments)
@@ -0,0 +1,257 @@
+"""Precomputed home timelines ("posts from people I follow").
+
+New posts are pushed into every follower's timeline when they are created
+(fan-out on write), so reading a home feed page is a single range scan over
+the reader's own entries. Authors with at least ``TIMELINE_CELEBRITY_THRESHOLD``
+followers are not fanned out; their recent posts are merged in at read time
+instead (fan-out on read), which keeps one post from triggering millions of
+writes. The fan-out runs after the post is committed, on a small thread pool
+(``TIMELINE_FANOUT_WORKERS``), so creating a post doesn't wait for it; only
+the author's own timeline is written in the request. A fan-out that fails
+with a database error (e.g. a locked SQLite table) is retried with backoff;
+if it still fails it is logged, and the ``fan_out_posts`` command pushes
+recent posts again (entries are idempotent).
+
+The storage is pluggable through ``TIMELINE_BACKEND``. ``DatabaseTimelineBackend``
+keeps entries in the ``TimelineEntry`` table; ``LocMemTimelineBackend`` keeps
+them in process memory for tests and local development.
+"""
+import bisect
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from accounts.models import UserProfile, Follow
+from .models import Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+
+class BaseTimelineBackend:
+    def __init__(self, max_length):
+        self.max_length = max_length
+
+    def push(self, post, owner_ids):
+        """Add ``post`` to the timeline of every user in ``owner_ids``."""
+        raise NotImplementedError
+
+    def backfill(self, owner_id, posts):
+        """Add existing ``posts`` (e.g. after a new follow) to one timeline."""
+        raise NotImplementedError
+
+    def remove_author(self, owner_id, author_id):
+        """Drop every post by ``author_id`` from one timeline (after an unfollow)."""
+        raise NotImplementedError
+
+    def read(self, owner_id, position=None, limit=10):
+        """Post ids of the newest ``limit`` entries strictly before ``position``.
+
+        ``position`` is a ``(created_at, post_id)`` pair as decoded from a feed
+        cursor, or ``None`` for the first page.
+        """
+        raise NotImplementedError
+
+
+class DatabaseTimelineBackend(BaseTimelineBackend):
+    batch_size = 1000
+
+    def push(self, post, owner_ids):
+        owner_ids = list(owner_ids)
+        for start in range(0, len(owner_ids), self.batch_size):
+            batch = owner_ids[start:start + self.batch_size]
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(owner_id=owner_id, post_id=post.pk, author_id=post.user_id,
+                               created_at=post.created_at) for owner_id in batch],
+                ignore_conflicts=True)
+            self.trim(batch)
+
+    def backfill(self, owner_id, posts):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post.pk, author_id=post.user_id,
+                           created_at=post.created_at) for post in posts],
+            batch_size=self.batch_size, ignore_conflicts=True)
+        self.trim([owner_id])
+
+    def remove_author(self, owner_id, author_id):
+        TimelineEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+
+    def trim(self, owner_ids):
+        # Counting is an index-only scan; the ranking below only runs for timelines that are too long
+        owner_ids = list(TimelineEntry.objects
+                         .filter(owner_id__in=owner_ids)
+                         .values('owner_id')
+                         .annotate(entries=Count('pk'))
+                         .filter(entries__gt=self.max_length)
+                         .values_list('owner_id', flat=True))
+        if not owner_ids:
+            return
+        # One DELETE for all of them: rank entries per owner, drop the overflow
+        overflow = (TimelineEntry.objects
+                    .filter(owner_id__in=owner_ids)
+                    .annotate(rank=Window(RowNumber(), partition_by=F('owner_id'),
+                                          order_by=[F('created_at').desc(), F('post_id').desc()]))
+                    .filter(rank__gt=self.max_length)
+                    .values('pk'))
+        TimelineEntry.objects.filter(pk__in=overflow).delete()
+
+    def read(self, owner_id, position=None, limit=10):
+        entries = TimelineEntry.objects.filter(owner_id=owner_id)
+        if position is not None:
+            created_at, post_id = position
+            entries = entries.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lt=post_id))
+        return list(entries.order_by('-created_at', '-post_id').values_list('post_id', flat=True)[:limit])
+
+
+class LocMemTimelineBackend(BaseTimelineBackend):
+    def __init__(self, max_length):
+        super().__init__(max_length)
+        # owner_id -> entries sorted oldest first as (created_at, post_id, author_id)
+        self._timelines = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._timelines.clear()
+
+    def _insert(self, owner_id, post):
+        timeline = self._timelines.setdefault(owner_id, [])
+        entry = (post.created_at, post.pk, post.user_id)
+        index = bisect.bisect_left(timeline, entry)
+        if index < len(timeline) and timeline[index] == entry:
+            return
+        timeline.insert(index, entry)
+        del timeline[:-self.max_length]
+
+    def push(self, post, owner_ids):
+        with self._lock:
+            for owner_id in owner_ids:
+                self._insert(owner_id, post)
+
+    def backfill(self, owner_id, posts):
+        with self._lock:
+            for post in posts:
+                self._insert(owner_id, post)
+
+    def remove_author(self, owner_id, author_id):
+        with self._lock:
+            timeline = self._timelines.get(owner_id, [])
+            timeline[:] = [entry for entry in timeline if entry[2] != author_id]
+
+    def read(self, owner_id, position=None, limit=10):
+        with self._lock:
+            timeline = self._timelines.get(owner_id, [])
+            end = len(timeline) if position is None else bisect.bisect_left(timeline, position)
+            return [post_id for _, post_id, _ in reversed(timeline[max(end - limit, 0):end])]
+
+
+_backend = None
+
+
+def get_timeline_backend():
+    global _backend
+    if _backend is None:
+        backend_class = import_string(settings.TIMELINE_BACKEND)
+        _backend = backend_class(max_length=settings.TIMELINE_MAX_LENGTH)
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_timeline_backend(setting, **kwargs):
+    global _backend
+    if setting.startswith('TIMELINE_'):
+        _backend = None
+
+
+def is_celebrity(profile):
+    return profile.followers_count >= settings.TIMELINE_CELEBRITY_THRESHOLD
+
+
+def _push_to_followers(post):
+    profile, _ = UserProfile.objects.get_or_create(user_id=post.user_id)
+    if is_celebrity(profile):
+        return
+    follower_ids = Follow.objects.filter(followee_id=post.user_id).values_list('follower_id', flat=True)
+    get_timeline_backend().push(post, follower_ids)
+
+
+def fan_out_post(post):
+    """Push a post to its followers' timelines, retrying ``TIMELINE_FANOUT_ATTEMPTS`` times on database errors."""
+    attempts = settings.TIMELINE_FANOUT_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            # A savepoint, so a failed attempt doesn't break an enclosing transaction
+            with transaction.atomic():
+                _push_to_followers(post)
+            return
+        except DatabaseError:
+            if attempt == attempts:
+                raise
+            logger.warning('Fan-out of post %s failed (attempt %s of %s), retrying', post.pk, attempt, attempts)
+            time.sleep(settings.TIMELINE_FANOUT_RETRY_SECONDS * 2 ** (attempt - 1))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _run(post):
+    try:
+        fan_out_post(post)
+    except Exception:
+        logger.exception('Could not fan out post %s; run fan_out_posts to push it again', post.pk)
+    finally:
+        connection.close()
+
+
+def schedule_fan_out(post):
+    """Run ``fan_out_post`` on the pool, or inline when ``TIMELINE_FANOUT_WORKERS`` is 0."""
+    global _pool
+    if not settings.TIMELINE_FANOUT_WORKERS:
+        fan_out_post(post)
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(settings.TIMELINE_FANOUT_WORKERS, thread_name_prefix='timeline-fanout')
+    _pool.submit(_run, post)
+
+
+def post_created(post):
+    """Add a new post to its author's timeline now and to their followers' once it is committed."""
+    get_timeline_backend().push(post, [post.user_id])
+    transaction.on_commit(lambda: schedule_fan_out(post))
+
+
+def on_follow(follower_id, followee_profile):
+    """Backfill the followee's recent posts unless they are served on read."""
+    if is_celebrity(followee_profile):
+        return
+    recent = (Post.objects.filter(user_id=followee_profile.user_id)
+              .order_by('-created_at', '-id')[:settings.TIMELINE_BACKFILL_SIZE])
+    get_timeline_backend().backfill(follower_id, list(recent))
+
+
+def on_unfollow(follower_id, followee_id):
+    get_timeline_backend().remove_author(follower_id, followee_id)
+
+
+def home_timeline_queryset(user, position=None, limit=10):
+    """Posts for ``user``'s home feed that can come after ``position``.
+
+    Combines the precomputed timeline with the recent posts of followed
+    celebrity accounts. The result still has to be ordered and cut to the
+    page by the caller (``PostPagination`` does both).
+    """
+    timeline_ids = get_timeline_backend().read(user.id, position, limit)
+    threshold = settings.TIMELINE_CELEBRITY_THRESHOLD
+    celebrities = (Follow.objects
+                   .filter(follower_id=user.id, followee__userprofile__followers_count__gte=threshold)
+                   .values('followee_id'))
+    return Post.objects.filter(Q(id__in=timeline_ids) | Q(user_id__in=celebrities))
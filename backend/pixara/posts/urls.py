@@ -3,9 +3,13 @@ from . import views
 
 urlpatterns = [
     path('predict-comment/', views.classify_comment,name='classify_comment'), 
+    path('predict-comment/metrics/', views.toxicity_metrics,name='toxicity_metrics'),
+    path('cache/metrics/', views.cache_metrics,name='cache_metrics'),
     path('posts/',views.posts,name='posts'),
+    path('posts/home/',views.home_feed,name='home_feed'),
     path('posts/<int:post_id>/',views.post_detail,name='post_detail'),
     path('posts/<int:post_id>/like/',views.toggle_like,name='toggle_like'),
+    path('posts/likes/batch/',views.batch_likes,name='batch_likes'),
     path('posts/<int:post_id>/comments/',views.post_comments,name='post_comments'),
     path('posts/user/<int:user_id>/',views.user_posts,name='user_posts'),
     path('posts/explore/',views.explore_posts,name='explore_posts'),
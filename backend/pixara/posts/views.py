@@ -1,50 +1,70 @@
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from asgiref.sync import sync_to_async
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Q
+from django.conf import settings
 from .models import Post, Like, Comment
-from .serializers import PostSerializer, CommentSerializer, LikeSerializer
-from accounts.models import UserProfile
-from .ml_utils import predict_toxicity
+from .serializers import PostSerializer, CommentSerializer, LikeSerializer, LikeBatchSerializer
+from .async_api import async_api_view
+from .feed import viewer_sets
+from .fast_serializers import post_rows, comment_rows, serialize_posts, serialize_comments
+from .fragments import acached_posts, fragment_cache
+from .pagination import PostPagination, CommentPagination, ExplorePagination
+from .explore import aexplore_entries
+from .likes import set_likes
+from .timeline import post_created, home_timeline_queryset
+from accounts.counters import adjust_counter
+from .ml_utils import ascore_comments, inference_service
+from .moderation import comment_created
 from rest_framework.permissions import IsAuthenticated,AllowAny
-class PostPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
 
-@api_view(['GET', 'POST'])
+@async_api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
-def posts(request):
+async def posts(request):
     if request.method == 'GET':
-        posts = Post.objects.all()
         paginator = PostPagination()
-        page = paginator.paginate_queryset(posts, request)
-        if page is not None:
-            serializer = PostSerializer(page, many=True, context={'request': request})
-            return paginator.get_paginated_response(serializer.data)
-        
-        serializer = PostSerializer(posts, many=True, context={'request': request})
-        return Response(serializer.data)
+        page = await paginator.apaginate_queryset(post_rows(Post.objects.all()), request)
+        return paginator.get_paginated_response(await sync_to_async(serialize_posts)(page, {'request': request}))
     
     elif request.method == 'POST':
-        serializer = PostSerializer(data=request.data, context={'request': request})
-        if serializer.is_valid():
-            serializer.save(user=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return await sync_to_async(create_post)(request)
 
-@api_view(['GET', 'PUT', 'DELETE'])
+def create_post(request):
+    serializer = PostSerializer(data=request.data, context={'request': request})
+    if serializer.is_valid():
+        post = serializer.save(user=request.user)
+        post_created(post)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    
+def home_feed(request):
+    paginator = PostPagination()
+    # Ask the timeline for one extra entry so the paginator can tell if there is a next page
+    candidates = home_timeline_queryset(request.user, paginator.decode_cursor(request),
+                                        paginator.get_page_size(request) + 1)
+    page = paginator.paginate_queryset(post_rows(candidates), request)
+    return paginator.get_paginated_response(serialize_posts(page, {'request': request}))
+
+@async_api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+async def post_detail(request, post_id):
     if request.method == 'GET':
-        serializer = PostSerializer(post, context={'request': request})
-        return Response(serializer.data)
-    
-    elif request.method == 'PUT':
-        if post.user != request.user:
+        posts = await acached_posts(request, [post_id])
+        if not posts:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(posts[0])
+    return await sync_to_async(change_post)(request, post_id)
+
+def change_post(request, post_id):
+    post = get_object_or_404(Post, id=post_id)
+
+    if request.method == 'PUT':
+        if post.user_id != request.user.id:
             return Response({'error': 'You can only edit your own posts'}, 
                           status=status.HTTP_403_FORBIDDEN)
         
@@ -55,25 +75,45 @@ def post_detail(request, post_id):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
-        if post.user != request.user:
+        if post.user_id != request.user.id:
             return Response({'error': 'You can only delete your own posts'}, 
                           status=status.HTTP_403_FORBIDDEN)
         
         post.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-@api_view(['POST'])
+@api_view(['PUT', 'DELETE', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
 def toggle_like(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
-    
-    if not created:
-        like.delete()
-        return Response({'message': 'Post unliked'})
-    
-    return Response({'message': 'Post liked'})
+    """PUT likes, DELETE unlikes; both are idempotent. POST toggles (older clients)."""
+    if request.method == 'POST':
+        current, _ = viewer_sets(request.user, [post_id], [])
+        liked = post_id not in current
+    else:
+        liked = request.method == 'PUT'
+    changed = set_likes(request.user, {post_id: liked})
+    # Nothing changed: either a repeat or a post that doesn't exist
+    if not changed and not Post.objects.filter(pk=post_id).exists():
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'liked': liked, 'message': 'Post liked' if liked else 'Post unliked'})
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_likes(request):
+    """Apply queued like/unlike actions; the last action per post wins."""
+    serializer = LikeBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    final = {}
+    for item in serializer.validated_data['actions']:
+        final[item['post']] = item['action']
+    existing = set(Post.objects.filter(pk__in=final).values_list('pk', flat=True))
+    changed = set_likes(request.user, {pk: final[pk] == 'like' for pk in existing})
+    return Response({
+        'results': [{'post': pk, 'liked': action == 'like', 'changed': pk in changed}
+                    for pk, action in final.items() if pk in existing],
+        'not_found': [pk for pk in final if pk not in existing],
+    })
 
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -81,91 +121,108 @@ def post_comments(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     
     if request.method == 'GET':
-        comments = post.comments.all()
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        paginator = CommentPagination()
+        # Pending and hidden comments are only shown to their author
+        comments = post.comments.filter(Q(moderation_status=Comment.Status.VISIBLE) | Q(user=request.user))
+        page = paginator.paginate_queryset(comment_rows(comments), request)
+        return paginator.get_paginated_response(serialize_comments(page, {}))
     
     elif request.method == 'POST':
         serializer = CommentSerializer(data=request.data)
         if serializer.is_valid():
+            # Saved as pending; the moderation worker scores it and bumps comments_count if it's visible
             serializer.save(user=request.user, post=post)
+            transaction.on_commit(comment_created)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def comment_detail(request, comment_id):
-    comment = get_object_or_404(Comment, id=comment_id)
+    # Same visibility as the post_comments listing
+    comment = get_object_or_404(
+        Comment.objects.filter(Q(moderation_status=Comment.Status.VISIBLE) | Q(user_id=request.user.id)),
+        id=comment_id)
     
     if request.method == 'GET':
         serializer = CommentSerializer(comment)
         return Response(serializer.data)
     
     elif request.method == 'PUT':
-        if comment.user != request.user:
+        if comment.user_id != request.user.id:
             return Response({'error': 'You can only edit your own comments'}, 
                           status=status.HTTP_403_FORBIDDEN)
         
         serializer = CommentSerializer(comment, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            if serializer.validated_data.get('content', comment.content) == comment.content:
+                serializer.save()
+                return Response(serializer.data)
+
+            # Edited text has to go through moderation again
+            was_visible = comment.moderation_status == Comment.Status.VISIBLE
+            with transaction.atomic():
+                serializer.save(moderation_status=Comment.Status.PENDING, moderated_at=None,
+                                toxic_score=None, obscene_score=None, insult_score=None)
+                if was_visible:
+                    adjust_counter(Post, comment.post_id, 'comments_count', -1)
+            transaction.on_commit(comment_created)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
-        if comment.user != request.user:
+        if comment.user_id != request.user.id:
             return Response({'error': 'You can only delete your own comments'}, 
                           status=status.HTTP_403_FORBIDDEN)
         
-        comment.delete()
+        with transaction.atomic():
+            deleted, _ = comment.delete()
+            if deleted and comment.moderation_status == Comment.Status.VISIBLE:
+                adjust_counter(Post, comment.post_id, 'comments_count', -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_posts(request, user_id):
-    posts = Post.objects.filter(user_id=user_id)
-    serializer = PostSerializer(posts, many=True, context={'request': request})
-    return Response(serializer.data)
+    paginator = PostPagination()
+    page = paginator.paginate_queryset(post_rows(Post.objects.filter(user_id=user_id)), request)
+    return paginator.get_paginated_response(serialize_posts(page, {'request': request}))
 
-@api_view(['GET'])
+@async_api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-def explore_posts(request):
-    try:
-        # Get users the current user is following
-        following_profiles = UserProfile.objects.filter(followers=request.user)
-        following_users = [profile.user for profile in following_profiles]
+async def explore_posts(request):
+    paginator = ExplorePagination()
+    page = paginator.paginate_ranked(await aexplore_entries(request.user), request)
+    return paginator.get_paginated_response(await acached_posts(request, [entry[1] for entry in page]))
 
-        # Exclude posts from followed users and self
-        #posts = Post.objects.exclude(user__in=following_users).exclude(user=request.user)
-        posts = Post.objects.all()
 
-        paginator = PostPagination()
-        page = paginator.paginate_queryset(posts, request)
-        if page is not None:
-            serializer = PostSerializer(page, many=True, context={'request': request})
-            return paginator.get_paginated_response(serializer.data)
 
-        serializer = PostSerializer(posts, many=True, context={'request': request})
-        return Response(serializer.data)
-
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-
-@api_view(['POST'])
+@async_api_view(['POST'])
 @permission_classes([AllowAny])
-def classify_comment(request):
+async def classify_comment(request):
+    comments = request.data.get('comments')
+    if comments is not None:
+        if not isinstance(comments, list) or not all(isinstance(c, str) and c.strip() for c in comments):
+            return Response({'error': 'comments must be a list of non-empty strings'}, status=400)
+        if len(comments) > settings.TOXICITY_MAX_CLASSIFY_BATCH:
+            return Response({'error': f'At most {settings.TOXICITY_MAX_CLASSIFY_BATCH} comments per request'},
+                            status=400)
+        # All comments are scored in one vectorized pass
+        return Response({'results': await ascore_comments([c.strip() for c in comments])})
+
     comment = request.data.get('comment', '').strip()
     if not comment:
         return Response({'error': 'Empty comment'}, status=400)
 
-    prediction = predict_toxicity(comment)  # {'toxic': 1, 'obscene': 0, 'insult': 1}
+    # {'comment': ..., 'labels': ['toxic', 'insult'], 'scores': {'toxic': 0.91, 'obscene': 0.12, 'insult': 0.77}}
+    return Response((await ascore_comments([comment]))[0])
 
-    triggered = [label for label, v in prediction.items() if v == 1]
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def toxicity_metrics(request):
+    return Response(inference_service.metrics())
 
-    return Response({
-        'comment': comment,
-        'labels': triggered,  
-        'scores': prediction  
-    })
\ No newline at end of file
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_metrics(request):
+    return Response(fragment_cache.metrics())
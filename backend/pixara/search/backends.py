@@ -0,0 +1,83 @@
+"""Ranked full-text queries against the ``SearchDocument`` index.
+
+Both backends return hits ordered by ``score`` ascending (lower is a better
+match), ties broken by document id, starting after an optional ``(score,
+id)`` position, which is what ``SearchPagination`` pages on.
+"""
+import re
+from collections import namedtuple
+from django.db import connection
+
+Hit = namedtuple('Hit', 'id kind object_id score')
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(text, max_terms=8):
+    """Words of the user's query, lowercased; punctuation and operators are dropped."""
+    return [term.lower() for term in TERM_RE.findall(text)][:max_terms]
+
+
+class BaseSearchBackend:
+    def ranked_sql(self):
+        """SQL selecting ``id, kind, object_id, score`` with one placeholder for the query."""
+        raise NotImplementedError
+
+    def match_param(self, terms):
+        raise NotImplementedError
+
+    def search(self, terms, kinds, position, limit):
+        """Up to ``limit`` hits matching every term (the last one as a prefix)."""
+        sql = f'SELECT id, kind, object_id, score FROM ({self.ranked_sql()}) ranked'
+        params = [self.match_param(terms)]
+        where = []
+        if kinds:
+            where.append(f"kind IN ({', '.join(['%s'] * len(kinds))})")
+            params += list(kinds)
+        if position is not None:
+            score, pk = position
+            where.append('(score > %s OR (score = %s AND id > %s))')
+            params += [score, score, pk]
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY score, id LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [Hit(*row) for row in cursor.fetchall()]
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    # bm25() weights per FTS column: a username match outranks a bio match
+    def ranked_sql(self):
+        return ('SELECT d.id, d.kind, d.object_id, bm25(search_fts, 10.0, 1.0) AS score '
+                'FROM search_fts JOIN search_searchdocument d ON d.id = search_fts.rowid '
+                'WHERE search_fts MATCH %s')
+
+    def match_param(self, terms):
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    def ranked_sql(self):
+        return ("SELECT d.id, d.kind, d.object_id, -ts_rank_cd(d.search_vector, q) AS score "
+                "FROM search_searchdocument d, to_tsquery('simple', %s) q "
+                "WHERE d.search_vector @@ q")
+
+    def match_param(self, terms):
+        return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    try:
+        return BACKENDS[connection.vendor]()
+    except KeyError:
+        raise NotImplementedError(f'Full-text search is not supported on {connection.vendor}')
@@ -0,0 +1,78 @@
+"""Keeps ``SearchDocument`` rows in step with posts, comments and users.
+
+Receivers upsert or delete one document per saved or deleted object;
+the database then updates its full-text index for that row only. Writes
+that bypass signals (comment moderation's ``bulk_update``) call
+``index_objects`` themselves, and ``rebuild_search_index`` refills
+everything in batches. Rows that predate search are indexed by migration
+``0002_index_existing_objects``.
+"""
+from django.db.models.signals import post_save, post_delete
+from accounts.models import User
+from posts.models import Post, Comment
+from .models import SearchDocument
+
+Kind = SearchDocument.Kind
+
+
+def post_document(post):
+    return '', post.caption
+
+
+def comment_document(comment):
+    if comment.moderation_status != Comment.Status.VISIBLE:
+        return None
+    return '', comment.content
+
+
+def user_document(user):
+    return user.username, ' '.join(part for part in (user.bio, user.interests) if part)
+
+
+# model -> (kind, document builder returning (title, body) or None to leave it out)
+INDEXED = {
+    Post: (Kind.POST, post_document),
+    Comment: (Kind.COMMENT, comment_document),
+    User: (Kind.USER, user_document),
+}
+
+
+def index_objects(model, objects):
+    """Add or refresh the documents for ``objects``; ones that shouldn't be searchable are removed."""
+    kind, build = INDEXED[model]
+    documents, removed = [], []
+    for obj in objects:
+        document = build(obj)
+        if document is None:
+            removed.append(obj.pk)
+        else:
+            title, body = document
+            documents.append(SearchDocument(kind=kind, object_id=obj.pk, title=title, body=body))
+    if documents:
+        SearchDocument.objects.bulk_create(documents, update_conflicts=True,
+                                           unique_fields=['kind', 'object_id'],
+                                           update_fields=['title', 'body', 'updated_at'])
+    if removed:
+        remove_objects(model, removed)
+
+
+def remove_objects(model, pks):
+    kind, _ = INDEXED[model]
+    SearchDocument.objects.filter(kind=kind, object_id__in=pks).delete()
+
+
+def object_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    index_objects(sender, [instance])
+
+
+def object_deleted(sender, instance, **kwargs):
+    remove_objects(sender, [instance.pk])
+
+
+def connect_signals():
+    for model in INDEXED:
+        uid = f'search_{model._meta.label_lower}'
+        post_save.connect(object_saved, sender=model, dispatch_uid=uid)
+        post_delete.connect(object_deleted, sender=model, dispatch_uid=uid)
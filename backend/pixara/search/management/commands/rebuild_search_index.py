@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from search.index import INDEXED, index_objects
+from search.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from posts, comments and users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            SearchDocument.objects.all().delete()
+            for model in INDEXED:
+                indexed = 0
+                batch = []
+                for obj in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+                    batch.append(obj)
+                    if len(batch) == batch_size:
+                        index_objects(model, batch)
+                        indexed += len(batch)
+                        batch = []
+                if batch:
+                    index_objects(model, batch)
+                    indexed += len(batch)
+                self.stdout.write(f'{model._meta.verbose_name_plural}: {indexed} objects')
+        self.stdout.write(self.style.SUCCESS(f'Indexed {SearchDocument.objects.count()} documents'))
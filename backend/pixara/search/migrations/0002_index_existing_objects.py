@@ -0,0 +1,44 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def index_existing_objects(apps, schema_editor):
+    """Documents for the rows that existed before search did; ``search.index`` keeps them current from here on."""
+    SearchDocument = apps.get_model('search', 'SearchDocument')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    User = apps.get_model('accounts', 'User')
+    db = schema_editor.connection.alias
+
+    # Same documents as search.index builds; historical models can't use its builders
+    sources = [
+        ('post', Post.objects.using(db).values_list('pk', 'caption'),
+         lambda pk, caption: ('', caption)),
+        ('comment', Comment.objects.using(db).filter(moderation_status='visible').values_list('pk', 'content'),
+         lambda pk, content: ('', content)),
+        ('user', User.objects.using(db).values_list('pk', 'username', 'bio', 'interests'),
+         lambda pk, username, bio, interests: (username, ' '.join(part for part in (bio, interests) if part))),
+    ]
+    for kind, rows, build in sources:
+        batch = []
+        for row in rows.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+            title, body = build(*row)
+            batch.append(SearchDocument(kind=kind, object_id=row[0], title=title, body=body))
+            if len(batch) == BATCH_SIZE:
+                SearchDocument.objects.using(db).bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        SearchDocument.objects.using(db).bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('accounts', '0004_image_variants'),
+        ('posts', '0006_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing_objects, migrations.RunPython.noop),
+    ]
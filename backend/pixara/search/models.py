@@ -0,0 +1,29 @@
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """The searchable text of one post, visible comment or user.
+
+    The full-text index lives next to this table and is maintained by the
+    database itself: an FTS5 table kept in sync by triggers on SQLite, a
+    generated ``tsvector`` column with a GIN index on PostgreSQL (see the
+    initial migration). ``title`` is weighted above ``body`` when ranking.
+    """
+    class Kind(models.TextChoices):
+        POST = 'post'
+        COMMENT = 'comment'
+        USER = 'user'
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=150, blank=True)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_unique_object'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,27 @@
+from posts.pagination import KeysetPagination
+
+
+class SearchPagination(KeysetPagination):
+    """Best matches first, keyed on ``(score, document id)``.
+
+    Pages are read straight from the full-text index by the search backend
+    rather than from a queryset; the cursor carries the last hit's exact
+    score (``repr`` round-trips floats) so the next page starts after it.
+    """
+    page_size = 20
+    max_page_size = 50
+
+    def paginate_hits(self, backend, terms, kinds, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        hits = backend.search(terms, kinds, self.decode_cursor(request), self.page_size + 1)
+        self.has_next = len(hits) > self.page_size
+        self.page = hits[:self.page_size]
+        return self.page
+
+    def parse_position(self, raw):
+        score, pk = raw.split('|')
+        return float(score), int(pk)
+
+    def format_position(self, hit):
+        return f'{hit.score!r}|{hit.id}'
@@ -0,0 +1,144 @@
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from accounts.models import User, UserProfile
+from posts.models import Post, Comment
+from .backends import get_search_backend, query_terms
+from .models import SearchDocument
+
+
+def make_user(username, **fields):
+    user = User.objects.create(username=username, email=f'{username}@example.com', **fields)
+    UserProfile.objects.get_or_create(user=user)
+    return user
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def found(self, q, **params):
+        return [(result['type'], result['id']) for result in self.search(q, **params)['results']]
+
+    def test_username_outranks_bio(self):
+        fan = make_user('fan', bio='I love everything sunsetlover posts')
+        star = make_user('sunsetlover')
+        self.assertEqual(self.found('sunsetlover', type='user'), [('user', star.id), ('user', fan.id)])
+
+    def test_prefix_and_every_term(self):
+        author = make_user('author')
+        beach = Post.objects.create(user=author, caption='Golden hour at the beach')
+        Post.objects.create(user=author, caption='Golden retriever')
+        self.assertEqual(self.found('golden bea'), [('post', beach.id)])
+        # Query syntax is treated as text, never as FTS operators
+        self.assertEqual(self.found('"golden" OR beach*'), [])
+
+    def test_results_embed_objects(self):
+        author = make_user('author')
+        post = Post.objects.create(user=author, caption='mountain lake')
+        comment = Comment.objects.create(user=author, post=post, content='what a lake',
+                                         moderation_status=Comment.Status.VISIBLE)
+        results = {(r['type'], r['id']): r['object'] for r in self.search('lake')['results']}
+        self.assertEqual(results['post', post.id]['caption'], 'mountain lake')
+        self.assertEqual(results['comment', comment.id]['post'], post.id)
+        self.assertEqual(results['comment', comment.id]['user']['username'], 'author')
+
+    def test_index_follows_edits_and_deletes(self):
+        author = make_user('author')
+        post = Post.objects.create(user=author, caption='first draft')
+        self.assertEqual(self.found('draft'), [('post', post.id)])
+
+        post.caption = 'final version'
+        post.save()
+        self.assertEqual(self.found('draft'), [])
+        self.assertEqual(self.found('final'), [('post', post.id)])
+
+        post.delete()
+        self.assertEqual(self.found('final'), [])
+        self.assertFalse(SearchDocument.objects.filter(kind='post', object_id=post.id).exists())
+
+    def test_only_visible_comments(self):
+        author = make_user('author')
+        post = Post.objects.create(user=author, caption='')
+        comment = Comment.objects.create(user=author, post=post, content='spoiler alert')
+        self.assertEqual(self.found('spoiler'), [])
+        comment.moderation_status = Comment.Status.VISIBLE
+        comment.save()
+        self.assertEqual(self.found('spoiler'), [('comment', comment.id)])
+        comment.moderation_status = Comment.Status.HIDDEN
+        comment.save()
+        self.assertEqual(self.found('spoiler'), [])
+
+    def test_cursor_pagination(self):
+        author = make_user('author')
+        posts = [Post.objects.create(user=author, caption=f'cat photo {i}') for i in range(5)]
+        seen = []
+        params = {'q': 'cat', 'page_size': 2}
+        url = reverse('search')
+        while url:
+            response = self.client.get(url, params)
+            seen += [result['id'] for result in response.data['results']]
+            url, params = response.data['next'], {}
+        self.assertEqual(sorted(seen), [post.id for post in posts])
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(reverse('search')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('search'), {'q': '!!'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'x', 'type': 'tag'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'x', 'cursor': 'nope'}).status_code, 404)
+
+    def test_rebuild_command(self):
+        author = make_user('author', bio='street photography')
+        Post.objects.create(user=author, caption='street corner')
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.found('street')), 2)
+
+    def test_backend_directly(self):
+        make_user('ocean_view')
+        hits = get_search_backend().search(query_terms('ocean'), None, None, 10)
+        self.assertEqual([hit.kind for hit in hits], ['user'])
+
+
+class IndexMigrationTests(TransactionTestCase):
+    before = [('search', '0001_initial')]
+    after = [('search', '0002_index_existing_objects')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_existing_objects_are_indexed(self):
+        author = make_user('author', bio='street photography')
+        post = Post.objects.create(user=author, caption='street corner')
+        visible = Comment.objects.create(user=author, post=post, content='street art',
+                                         moderation_status=Comment.Status.VISIBLE)
+        # Pending comments stay out, as with search.index
+        Comment.objects.create(user=author, post=post, content='street noise')
+        # As if they had been created before the search app
+        SearchDocument.objects.all().delete()
+        self.migrate(self.before)
+        self.migrate(self.after)
+        documents = SearchDocument.objects.order_by('kind').values_list('kind', 'object_id', 'title', 'body')
+        self.assertEqual(list(documents), [
+            ('comment', visible.pk, '', 'street art'),
+            ('post', post.pk, '', 'street corner'),
+            ('user', author.pk, 'author', 'street photography'),
+        ])
+        self.assertEqual(len(get_search_backend().search(query_terms('street'), None, None, 10)), 3)
@@ -0,0 +1,59 @@
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from accounts.models import User, Follow
+from accounts.serializers import UserSerializer
+from posts.fragments import cached_posts
+from posts.models import Comment
+from posts.serializers import CommentSerializer
+from .backends import get_search_backend, query_terms
+from .models import SearchDocument
+from .pagination import SearchPagination
+
+
+def _load(request, hits):
+    """``{(kind, object_id): serialized object}`` for the hits, one query per kind."""
+    ids = {kind: [hit.object_id for hit in hits if hit.kind == kind] for kind in SearchDocument.Kind.values}
+    objects = {}
+    if ids['post']:
+        for post in cached_posts(request, ids['post']):
+            objects['post', post['id']] = post
+    if ids['user']:
+        users = list(User.objects.filter(id__in=ids['user']))
+        following = set(Follow.objects.filter(follower_id=request.user.id, followee_id__in=ids['user'])
+                        .values_list('followee_id', flat=True))
+        for user in UserSerializer(users, many=True, context={'request': request,
+                                                              'following_user_ids': following}).data:
+            objects['user', user['id']] = user
+    if ids['comment']:
+        comments = list(Comment.objects.filter(id__in=ids['comment'], moderation_status=Comment.Status.VISIBLE)
+                        .select_related('user'))
+        data = CommentSerializer(comments, many=True, context={'request': request,
+                                                               'following_user_ids': frozenset()}).data
+        for comment, serialized in zip(comments, data):
+            objects['comment', comment.id] = {**serialized, 'post': comment.post_id}
+    return objects
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def search(request):
+    """Ranked search over post captions, visible comments and users.
+
+    ``q`` is required; ``type`` (post, comment or user) narrows the results.
+    """
+    terms = query_terms(request.query_params.get('q', ''))
+    if not terms:
+        return Response({'q': ['This parameter is required.']}, status=status.HTTP_400_BAD_REQUEST)
+    kind = request.query_params.get('type')
+    if kind is not None and kind not in SearchDocument.Kind.values:
+        return Response({'type': [f'Must be one of: {", ".join(SearchDocument.Kind.values)}.']},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = SearchPagination()
+    hits = paginator.paginate_hits(get_search_backend(), terms, [kind] if kind else None, request)
+    objects = _load(request, hits)
+    # Hits whose object went away since it was indexed are skipped
+    results = [{'type': hit.kind, 'id': hit.object_id, 'object': objects[hit.kind, hit.object_id]}
+               for hit in hits if (hit.kind, hit.object_id) in objects]
+    return paginator.get_paginated_response(results)
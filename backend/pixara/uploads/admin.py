@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import MediaBlob
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'created_at']
+    search_fields = ['name', 'sha256']
+    readonly_fields = [field.name for field in MediaBlob._meta.fields]
@@ -0,0 +1,11 @@
+"""Cloudinary media storage, deduplicated like local media.
+
+Kept out of ``uploads.storage``: importing ``cloudinary_storage`` fails
+unless Cloudinary credentials are configured.
+"""
+from cloudinary_storage.storage import MediaCloudinaryStorage
+from .storage import DedupStorageMixin
+
+
+class DedupCloudinaryStorage(DedupStorageMixin, MediaCloudinaryStorage):
+    pass
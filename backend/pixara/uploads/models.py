@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class MediaBlob(models.Model):
+    """One stored file, shared by every upload with the same content.
+
+    ``ref_count`` is the number of file fields (and image variants) that
+    point at ``name``; the file is deleted when it drops to zero.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} refs)'
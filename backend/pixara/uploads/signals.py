@@ -0,0 +1,59 @@
+"""Release stored files when the rows that reference them let go.
+
+Django never deletes files by itself. For every file field on a
+deduplicating storage, these receivers drop the reference when the row is
+deleted or when the field is cleared or given a new file.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import FileField
+from django.db.models.signals import pre_save, post_save, post_delete
+from .storage import DedupStorageMixin
+
+
+def dedup_file_fields(model):
+    return [field for field in model._meta.concrete_fields
+            if isinstance(field, FileField) and isinstance(field.storage, DedupStorageMixin)]
+
+
+def release(storage, name):
+    transaction.on_commit(lambda: storage.delete(name))
+
+
+def remember_files(sender, instance, update_fields=None, **kwargs):
+    fields = [field for field in dedup_file_fields(sender)
+              if update_fields is None or field.name in update_fields]
+    if instance._state.adding or not fields:
+        instance._stored_files = {}
+        return
+    # The names currently in the database, to be released if they are replaced
+    old = sender._base_manager.filter(pk=instance.pk).values(*[field.attname for field in fields]).first() or {}
+    instance._stored_files = {
+        field.attname: (old.get(field.attname), not getattr(instance, field.attname)._committed)
+        for field in fields
+    }
+
+
+def release_replaced_files(sender, instance, **kwargs):
+    for field in dedup_file_fields(sender):
+        old_name, uploaded = getattr(instance, '_stored_files', {}).get(field.attname, (None, False))
+        # A new upload took its own reference even if it resolved to the same blob
+        if old_name and (uploaded or getattr(instance, field.attname).name != old_name):
+            release(field.storage, old_name)
+    instance._stored_files = {}
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    for field in dedup_file_fields(sender):
+        file = getattr(instance, field.attname)
+        if file:
+            release(field.storage, file.name)
+
+
+def connect_signals():
+    for model in apps.get_models():
+        if dedup_file_fields(model):
+            uid = f'uploads_{model._meta.label_lower}'
+            pre_save.connect(remember_files, sender=model, dispatch_uid=uid)
+            post_save.connect(release_replaced_files, sender=model, dispatch_uid=uid)
+            post_delete.connect(release_deleted_files, sender=model, dispatch_uid=uid)
@@ -0,0 +1,75 @@
+"""Content-addressed, reference-counted file storage.
+
+``DedupStorageMixin`` goes in front of any Django storage backend. Files are
+stored under their SHA-256 (``posts/3f/3fa9....jpg``) with one ``MediaBlob``
+row each. Saving content that is already stored writes nothing and just
+takes another reference to the existing name; ``delete`` drops a reference
+and only removes the file when the last one is gone.
+
+The digest comes from the upload handlers (``uploads.handlers``) when the
+file was uploaded, so a duplicate costs one indexed lookup; anything else
+is hashed here in chunks.
+"""
+import hashlib
+import os
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import MediaBlob
+
+
+def content_sha256(content):
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+class DedupStorageMixin:
+    def save(self, name, content, max_length=None):
+        digest = content_sha256(content)
+        existing = self._take_reference(digest)
+        if existing is not None:
+            return existing
+
+        directory = os.path.dirname(name)
+        _, ext = os.path.splitext(name)
+        stored = super().save(os.path.join(directory, digest[:2], digest + ext.lower()), content, max_length)
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(sha256=digest, name=stored, size=content.size)
+        except IntegrityError:
+            # Someone stored the same content concurrently; use theirs
+            super().delete(stored)
+            return self._take_reference(digest)
+        return stored
+
+    def _take_reference(self, digest):
+        """Add a reference to the blob with ``digest`` and return its name, or None if there is none."""
+        with transaction.atomic():
+            if not MediaBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1):
+                return None
+            return MediaBlob.objects.filter(sha256=digest).values_list('name', flat=True).get()
+
+    def delete(self, name):
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.ref_count > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            # Files stored before deduplication have no blob and a single owner
+            delete_file = super().delete
+            transaction.on_commit(lambda: delete_file(name))
+
+
+class DedupFileSystemStorage(DedupStorageMixin, FileSystemStorage):
+    pass
@@ -0,0 +1,94 @@
+import hashlib
+import io
+import shutil
+import tempfile
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+from accounts.models import User, UserProfile
+from posts.models import Post
+from .models import MediaBlob
+
+
+def image_bytes(color='red', size=(64, 64)):
+    out = io.BytesIO()
+    Image.new('RGB', size, color).save(out, 'PNG')
+    return out.getvalue()
+
+
+@override_settings(IMAGE_VARIANT_WORKERS=0, TIMELINE_FANOUT_WORKERS=0, IMAGE_VARIANT_SIZES={'thumb': 16})
+class DedupStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create(username='alice', email='alice@example.com')
+        UserProfile.objects.get_or_create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload_post(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('posts'),
+                                        {'image': SimpleUploadedFile('meme.png', data, 'image/png')},
+                                        format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.get(id=response.data['id'])
+
+    def originals(self):
+        return MediaBlob.objects.exclude(name__contains='/variants/')
+
+    def test_duplicate_uploads_share_one_blob(self):
+        data = image_bytes()
+        first = self.upload_post(data)
+        # Hashed by the temporary-file handler this time
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10):
+            second = self.upload_post(data)
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(first.image.name, f'posts/{digest[:2]}/{digest}.png')
+        self.assertEqual(second.image.name, first.image.name)
+        blob = self.originals().get()
+        self.assertEqual((blob.sha256, blob.ref_count, blob.size), (digest, 2, len(data)))
+        # The variants of identical images are identical too
+        self.assertEqual(second.image_variants['thumb'], first.image_variants['thumb'])
+
+    def test_file_is_removed_with_its_last_reference(self):
+        data = image_bytes()
+        first, second = self.upload_post(data), self.upload_post(data)
+        name = first.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.originals().get().ref_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_changing_avatar_releases_the_old_one(self):
+        def set_avatar(data):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(reverse('profile'),
+                                {'profile_picture': SimpleUploadedFile('me.png', data, 'image/png')},
+                                format='multipart')
+            self.user.refresh_from_db()
+            return self.user.profile_picture.name
+
+        old = set_avatar(image_bytes('red'))
+        # Re-uploading the same picture keeps exactly one reference
+        self.assertEqual(set_avatar(image_bytes('red')), old)
+        self.assertEqual(MediaBlob.objects.get(name=old).ref_count, 1)
+        new = set_avatar(image_bytes('blue'))
+        self.assertNotEqual(new, old)
+        self.assertFalse(MediaBlob.objects.filter(name=old).exists())
+        self.assertFalse(default_storage.exists(old))
+
+    def test_files_saved_outside_uploads_are_hashed_too(self):
+        first = default_storage.save('docs/a.txt', ContentFile(b'same'))
+        second = default_storage.save('docs/b.txt', ContentFile(b'same'))
+        self.assertEqual(first, second)
+        self.assertEqual(MediaBlob.objects.get(name=first).ref_count, 2)
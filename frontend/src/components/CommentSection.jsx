@@ -27,7 +27,7 @@ const CommentSection = ({ postId }) => {
       const response = await axios.get(`${API_BASE_URL}/posts/${postId}/comments/`, {
         headers: token ? { Authorization: `Bearer ${token}` } : {},
       });
-      setComments(response.data);
+      setComments(response.data.results ?? response.data);
     } catch (error) {
       console.error('Failed to fetch comments:', error);
     }
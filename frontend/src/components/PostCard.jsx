@@ -20,7 +20,7 @@ const [editedCaption, setEditedCaption] = useState(post.caption);
 
   const handleLike = async () => {
     try {
-      await onLike(post.id);
+      await onLike(post.id, !isLiked);
       setIsLiked(!isLiked);
       setLikesCount(isLiked ? likesCount - 1 : likesCount + 1);
     } catch (error) {
@@ -45,7 +45,7 @@ const [editedCaption, setEditedCaption] = useState(post.caption);
         <div className="w-full h-full rounded-full bg-white dark:bg-spaceBlack flex items-center justify-center">
           {post.user.profile_picture ? (
             <img
-              src={post.user.profile_picture}
+              src={post.user.profile_picture_variants?.thumb?.jpeg ?? post.user.profile_picture}
               alt={post.user.username}
               className="w-full h-full rounded-full object-cover"
             />
@@ -133,11 +133,16 @@ const [editedCaption, setEditedCaption] = useState(post.caption);
       {/* Image */}
       {post.image && (
         <div className="relative overflow-hidden">
-          <img
-            src={post.image}
-            alt="Post content"
-            className="w-full h-auto max-h-96 object-cover"
-          />
+          <picture>
+            {post.image_variants?.feed?.webp && (
+              <source srcSet={post.image_variants.feed.webp} type="image/webp" />
+            )}
+            <img
+              src={post.image_variants?.feed?.jpeg ?? post.image}
+              alt="Post content"
+              className="w-full h-auto max-h-96 object-cover"
+            />
+          </picture>
         </div>
       )}
 
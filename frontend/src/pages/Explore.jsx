@@ -66,9 +66,9 @@ const Explore = () => {
     ]);
   };
 
-  const handleLike = async (postId) => {
+  const handleLike = async (postId, like) => {
     try {
-      await axios.post(`${API_BASE_URL}/posts/${postId}/like/`);
+      await axios({ method: like ? 'put' : 'delete', url: `${API_BASE_URL}/posts/${postId}/like/` });
     } catch (error) {
       console.error('Failed to like post:', error);
     }
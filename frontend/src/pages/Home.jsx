@@ -41,9 +41,10 @@ const Home = () => {
     }
   };
 
-  const handleLike = async (postId) => {
+  const handleLike = async (postId, like) => {
     try {
-      await axios.post(`${API_BASE_URL}/posts/${postId}/like/`);
+      // PUT likes and DELETE unlikes, so a repeated tap can't flip it back
+      await axios({ method: like ? 'put' : 'delete', url: `${API_BASE_URL}/posts/${postId}/like/` });
       fetchPosts(); // Refresh after like
     } catch (error) {
       console.error('Failed to like post:', error);
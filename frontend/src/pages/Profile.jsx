@@ -96,7 +96,7 @@ useEffect(() => {
   const fetchUserPosts = async () => {
     try {
       const response = await axios.get(`${API_BASE_URL}/posts/user/${user?.id}/`);
-      setUserPosts(response.data);
+      setUserPosts(response.data.results ?? response.data);
     } catch (error) {
       console.error('Failed to fetch user posts:', error);
     } finally {